@@ -0,0 +1,152 @@
+#!/usr/bin/python
+# $Id$
+#
+"""
+Benchmark class-level convenience accessors against the old
+per-object lambda injection.
+
+Configures a synthetic project of roughly 20,000 objects both ways,
+and reports the configure time and the memory used by each object's
+instance dictionary, including any injected accessor closures.
+"""
+import sys
+import os.path
+import time
+import optparse
+import gc
+
+from synthetic import make_project_tree, count_objects
+
+from ConfigParser import RawConfigParser, NoOptionError
+
+from docgen.project import Project
+from docgen.base import XMLConfigurable
+from docgen.registry import lookup_factory
+
+import logging
+log = logging.getLogger('docgen')
+
+TESTCONF = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'docgen_test.conf')
+
+#
+# The accessor injection as it used to be done, for comparison.
+# Slotted objects have nowhere to put per-object accessors, so
+# they are left out.
+#
+def legacy_configure_children(self, node, defaults, parent):
+    self.children = {}
+    try:
+        child_tags = defaults.get('tags', '%s_known_children' % self.xmltag).split()
+    except NoOptionError:
+        child_tags = self.child_tags
+
+    for tag in child_tags:
+        self.children[tag] = []
+        funcname = "get_%ss" % tag
+        if funcname not in self.__class__.__dict__ and hasattr(self, '__dict__'):
+            setattr(self, funcname, lambda tag=tag: self.children[tag])
+        child_nodes = node.findall(tag)
+        if len(child_nodes) > 0:
+            create_func = lookup_factory(tag, self)
+            for childnode in child_nodes:
+                child = create_func(childnode, defaults, self)
+                self.children[tag].append(child)
+
+def legacy_configure_mandatory_attributes(self, node, defaults):
+    for attrib in self.mandatory_attribs:
+        if hasattr(self, '__dict__'):
+            setattr(self, "get_%s" % attrib, lambda: getattr(self, attrib) )
+        try:
+            setattr(self, attrib, node.attrib[attrib])
+        except KeyError, e:
+            raise KeyError("'%s' node mandatory attribute '%s' not set" % (self.xmltag, attrib))
+
+def legacy_configure_optional_attributes(self, node, defaults):
+    for attrib in self.optional_attribs:
+        if hasattr(self, '__dict__'):
+            setattr(self, "get_%s" % attrib, lambda: getattr(self, attrib) )
+        try:
+            setattr(self, attrib, node.attrib[attrib])
+        except KeyError:
+            setattr(self, attrib, None)
+
+def instance_bytes(obj):
+    """
+    Bytes used by an object's instance dictionary, and any
+    function objects stored in it.
+    """
+    d = getattr(obj, '__dict__', {})
+    total = sys.getsizeof(d)
+    for value in d.values():
+        if type(value) is type(instance_bytes):
+            total += sys.getsizeof(value)
+            if value.func_closure is not None:
+                total += sys.getsizeof(value.func_closure)
+                total += sum([ sys.getsizeof(cell) for cell in value.func_closure ])
+                pass
+            if value.func_defaults is not None:
+                total += sys.getsizeof(value.func_defaults)
+            pass
+        pass
+    return total
+
+def all_objects(project):
+    objs = []
+    stack = [project]
+    while stack:
+        obj = stack.pop()
+        objs.append(obj)
+        for children in getattr(obj, 'children', {}).values():
+            if type(children) is list:
+                stack.extend([ x for x in children if hasattr(x, 'children') ])
+    return objs
+
+def run(defaults, tree, repeat):
+    best = None
+    for i in range(repeat):
+        gc.collect()
+        start = time.time()
+        project = Project()
+        project.configure_from_node(tree, defaults, None)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    objs = all_objects(project)
+    membytes = sum([ instance_bytes(x) for x in objs ])
+    return best, len(objs), membytes
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-c', '--configfile', dest='configfile', default=TESTCONF)
+    parser.add_option('-v', '--volumes', dest='volumes', type='int', default=1000,
+                      help="volumes per filer")
+    parser.add_option('-q', '--qtrees', dest='qtrees', type='int', default=4,
+                      help="qtrees per volume")
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=3)
+    options, args = parser.parse_args()
+
+    log.setLevel(logging.CRITICAL)
+    defaults = RawConfigParser()
+    defaults.read(options.configfile)
+
+    tree = make_project_tree(sites=2, filers=2, volumes=options.volumes, qtrees=options.qtrees, hosts=2)
+
+    new_time, nobjs, new_bytes = run(defaults, tree, options.repeat)
+
+    saved = (XMLConfigurable.configure_children,
+             XMLConfigurable.configure_mandatory_attributes,
+             XMLConfigurable.configure_optional_attributes)
+    XMLConfigurable.configure_children = legacy_configure_children
+    XMLConfigurable.configure_mandatory_attributes = legacy_configure_mandatory_attributes
+    XMLConfigurable.configure_optional_attributes = legacy_configure_optional_attributes
+    try:
+        old_time, nobjs, old_bytes = run(defaults, tree, options.repeat)
+    finally:
+        (XMLConfigurable.configure_children,
+         XMLConfigurable.configure_mandatory_attributes,
+         XMLConfigurable.configure_optional_attributes) = saved
+
+    print "objects configured:      %d" % nobjs
+    print "%-24s %10s %16s" % ('', 'configure', 'bytes/object')
+    print "%-24s %9.3fs %16.1f" % ('per-object lambdas', old_time, float(old_bytes) / nobjs)
+    print "%-24s %9.3fs %16.1f" % ('class-level accessors', new_time, float(new_bytes) / nobjs)
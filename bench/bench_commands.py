@@ -0,0 +1,82 @@
+#!/usr/bin/python
+# $Id$
+#
+"""
+Measure building the NetApp commands on several processes.
+
+Builds a synthetic project with many filers, and times creating its
+NetApp commands with the commands for each filer built on 1, 2, 4
+and so on worker processes, up to the number of cores. Each output
+is checked against the one built on a single process, which it
+must match exactly.
+"""
+import sys
+import os.path
+import time
+import optparse
+import multiprocessing
+from StringIO import StringIO
+
+from synthetic import make_project_tree
+
+from ConfigParser import RawConfigParser
+
+from docgen.project import Project
+from docgen.docplugins.netapp_commands import NetAppCommandsGenerator
+
+import logging
+log = logging.getLogger('docgen')
+
+TESTCONF = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'docgen_test.conf')
+
+def emit(project, defaults, workers):
+    defaults.set('commands', 'workers', str(workers))
+    outf = StringIO()
+    start = time.time()
+    NetAppCommandsGenerator(project, defaults).emit(outf, ns={})
+    return time.time() - start, outf.getvalue()
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-c', '--configfile', dest='configfile', default=TESTCONF)
+    parser.add_option('-s', '--sites', dest='sites', type='int', default=4)
+    parser.add_option('-f', '--filers', dest='filers', type='int', default=12,
+                      help="filers per site")
+    parser.add_option('-v', '--volumes', dest='volumes', type='int', default=200,
+                      help="volumes per filer")
+    parser.add_option('-w', '--max-workers', dest='max_workers', type='int', default=multiprocessing.cpu_count())
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=3)
+    options, args = parser.parse_args()
+
+    log.setLevel(logging.CRITICAL)
+
+    defaults = RawConfigParser()
+    defaults.read(options.configfile)
+    if not defaults.has_section('commands'):
+        defaults.add_section('commands')
+        pass
+
+    tree = make_project_tree(sites=options.sites, filers=options.filers, volumes=options.volumes,
+                             qtrees=2, luns=1, hosts=10)
+    project = Project()
+    project.configure_from_node(tree, defaults, None)
+
+    counts = [1]
+    while counts[-1] * 2 <= max(options.max_workers, 2):
+        counts.append(counts[-1] * 2)
+        pass
+
+    print "%d filers, %d cores" % (len(project.get_filers()), multiprocessing.cpu_count())
+    print "%-8s %12s %8s %10s" % ('workers', 'emit', 'speedup', 'identical')
+    baseline = None
+    expected = None
+    for workers in counts:
+        results = [ emit(project, defaults, workers) for i in range(options.repeat) ]
+        elapsed = min([ x[0] for x in results ])
+        if baseline is None:
+            baseline = elapsed
+            expected = results[0][1]
+            pass
+        identical = len([ x for x in results if x[1] != expected ]) == 0
+        print "%-8d %11.3fs %7.2fx %10s" % (workers, elapsed, baseline / elapsed, identical and 'yes' or 'NO')
+        pass
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# $Id$
+#
+"""
+Measure the memory used writing out a large design document.
+
+Builds a synthetic project, configures it, and then writes its
+storage design document to a file, reporting how long that took,
+how big the document is, and how much the peak resident size of
+the process grew while it was written. Each mode is run in a fresh
+child process, so the peak sizes don't interfere with each other:
+
+  legacy    - the whole book is built up as one string and
+              substituted into the book template, as emit() used to
+  streaming - the book is built a part at a time, spooled, and
+              written out a piece at a time
+"""
+import sys
+import os
+import os.path
+import time
+import optparse
+import subprocess
+import resource
+import gc
+
+from synthetic import make_project_tree
+
+from ConfigParser import RawConfigParser
+from string import Template
+
+from docgen.project import Project
+from docgen.base import __version__
+from docgen.docplugins.ipsan_storage import IPSANStorageDesignGenerator
+
+import logging
+log = logging.getLogger('docgen')
+
+TESTCONF = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'docgen_test.conf')
+
+def peak_bytes():
+    """
+    The peak resident set size of this process, in bytes.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def legacy_emit(self, outfile=None, ns={}):
+    """
+    emit() as it was before documents were streamed.
+    """
+    ns['copyright_holder'] = self.defaults.get('global', 'copyright_holder')
+    ns['iscsi_prefix'] = self.defaults.get('global', 'iscsi_prefix')
+
+    if not ns.has_key('title'):
+        ns['title'] = 'DocGen Automated Document'
+    ns['docgen_revision'] = __version__
+    ns['project_title'] = getattr(self.project, 'title', '')
+    ns['project_code'] = getattr(self.project, 'code', '')
+    ns['vfiler_name'] = getattr(self.project, 'name', '')
+
+    book_content = ''
+    book_content += self.build_bookinfo(ns)
+    book_content += self.build_preface(ns)
+    book_content += ''.join(self.build_chapters(ns))
+    book_content += ''.join(self.build_appendices(ns))
+    ns['book_content'] = book_content
+    outfile.write(self.bookstr.safe_substitute(ns))
+
+def run_mode(mode, sites, volumes, qtrees, configfile):
+    defaults = RawConfigParser()
+    defaults.read(configfile)
+
+    tree = make_project_tree(sites=sites, filers=2, volumes=volumes, qtrees=qtrees, luns=1, hosts=4)
+    project = Project()
+    project.configure_from_node(tree, defaults, None)
+    del tree
+    gc.collect()
+
+    if mode == 'legacy':
+        IPSANStorageDesignGenerator.emit = legacy_emit
+        pass
+
+    base_peak = peak_bytes()
+    outf = open(os.devnull, 'w')
+    counter = CountingFile(outf)
+    start = time.time()
+    IPSANStorageDesignGenerator(project, defaults).emit(counter, ns={})
+    elapsed = time.time() - start
+    outf.close()
+    print "%s %f %d %d %d" % (mode, elapsed, counter.size, counter.largest, peak_bytes() - base_peak)
+
+class CountingFile:
+    """
+    Count what is written to a file.
+    """
+    def __init__(self, outf):
+        self.outf = outf
+        self.size = 0
+        self.largest = 0
+
+    def write(self, data):
+        self.size += len(data)
+        self.largest = max(self.largest, len(data))
+        self.outf.write(data)
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-c', '--configfile', dest='configfile', default=TESTCONF)
+    parser.add_option('-s', '--sites', dest='sites', type='int', default=2)
+    parser.add_option('-v', '--volumes', dest='volumes', type='int', default=400,
+                      help="volumes per filer")
+    parser.add_option('-q', '--qtrees', dest='qtrees', type='int', default=2,
+                      help="qtrees per volume")
+    parser.add_option('--mode', dest='mode', default=None,
+                      help="run a single mode in this process")
+    options, args = parser.parse_args()
+
+    log.setLevel(logging.CRITICAL)
+
+    if options.mode is not None:
+        run_mode(options.mode, options.sites, options.volumes, options.qtrees, options.configfile)
+        sys.exit(0)
+
+    print "%-10s %10s %12s %14s %16s" % ('mode', 'emit', 'size (MB)', 'largest (MB)', 'peak growth (MB)')
+    for mode in ['legacy', 'streaming']:
+        args = [ sys.executable, os.path.abspath(__file__),
+                 '--mode', mode,
+                 '-s', str(options.sites),
+                 '-v', str(options.volumes),
+                 '-q', str(options.qtrees),
+                 '-c', options.configfile ]
+        output = subprocess.Popen(args, stdout=subprocess.PIPE).communicate()[0]
+        mode, elapsed, size, largest, growth = output.split()[-5:]
+        print "%-10s %9.3fs %12.2f %14.2f %16.1f" % (mode, float(elapsed),
+                                                     float(size) / (1024 * 1024),
+                                                     float(largest) / (1024 * 1024),
+                                                     float(growth) / (1024 * 1024))
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+# $Id$
+#
+"""
+Compare peak memory use of loading a project definition with
+etree.parse() against the streaming loader.
+
+Writes synthetic definitions of increasing numbers of identical
+sites to a temporary file, and loads each one in a fresh child
+process, so that the peak resident size of each run is its own.
+With the streaming loader, peak memory should follow the size
+of a single site, not the size of the whole project.
+"""
+import sys
+import os
+import os.path
+import time
+import optparse
+import subprocess
+import tempfile
+import resource
+
+from synthetic import make_project_xml
+
+from ConfigParser import RawConfigParser
+
+from lxml import etree
+
+from docgen.project import Project
+from docgen.loader import load_project
+
+import logging
+log = logging.getLogger('docgen')
+
+TESTCONF = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'docgen_test.conf')
+
+def peak_resident_bytes():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def run_mode(mode, filename, configfile):
+    defaults = RawConfigParser()
+    defaults.read(configfile)
+
+    start = time.time()
+    if mode == 'stream':
+        project = load_project(filename, defaults)
+    else:
+        tree = etree.parse(filename)
+        project = Project()
+        project.configure_from_node(tree.getroot(), defaults, None)
+    elapsed = time.time() - start
+    print "%s %f %d" % (mode, elapsed, peak_resident_bytes())
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-c', '--configfile', dest='configfile', default=TESTCONF)
+    parser.add_option('-s', '--sites', dest='sites', default='1,10,50',
+                      help="comma separated list of site counts")
+    parser.add_option('-v', '--volumes', dest='volumes', type='int', default=100,
+                      help="volumes per filer")
+    parser.add_option('--mode', dest='mode', default=None,
+                      help="load a single file in this process")
+    options, args = parser.parse_args()
+
+    log.setLevel(logging.CRITICAL)
+
+    if options.mode is not None:
+        run_mode(options.mode, args[0], options.configfile)
+        sys.exit(0)
+
+    print "%6s %10s %10s %14s %14s" % ('sites', 'parse', 'stream', 'parse peak MB', 'stream peak MB')
+    for sites in [ int(x) for x in options.sites.split(',') ]:
+        fd, filename = tempfile.mkstemp(suffix='.xml')
+        try:
+            os.write(fd, make_project_xml(sites=sites, filers=2, volumes=options.volumes, qtrees=2, luns=1, hosts=4))
+            os.close(fd)
+
+            results = {}
+            for mode in ['parse', 'stream']:
+                args = [ sys.executable, os.path.abspath(__file__),
+                         '--mode', mode,
+                         '-c', options.configfile,
+                         filename ]
+                output = subprocess.Popen(args, stdout=subprocess.PIPE).communicate()[0]
+                mode, elapsed, peak = output.split()[-3:]
+                results[mode] = (float(elapsed), int(peak))
+                pass
+        finally:
+            os.unlink(filename)
+
+        print "%6d %9.3fs %9.3fs %14.1f %14.1f" % (sites,
+                                                   results['parse'][0], results['stream'][0],
+                                                   results['parse'][1] / (1024.0 * 1024),
+                                                   results['stream'][1] / (1024.0 * 1024))
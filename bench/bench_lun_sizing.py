@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# $Id$
+#
+"""
+Benchmark sizing LUNs that don't have a size set.
+
+Configures a volume with 1, 100 and 1000 unsized LUNs in it, using
+the container-wide LUN count and the old per-LUN XPath queries,
+checks that both come up with the same sizes, and reports how long
+each took.
+"""
+import sys
+import os.path
+import time
+import optparse
+
+from synthetic import make_project_tree
+
+from ConfigParser import RawConfigParser
+
+from docgen.project import Project
+from docgen.base import DynamicNamedXMLConfigurable
+from docgen.lun import Lun
+
+import logging
+log = logging.getLogger('docgen')
+
+TESTCONF = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'docgen_test.conf')
+
+#
+# LUN sizing as it used to be done, for comparison
+#
+def legacy_configure_optional_attributes(self, node, defaults):
+    DynamicNamedXMLConfigurable.configure_optional_attributes(self, node, defaults)
+    if self.restartnumbering is not None:
+        self.parent.set_current_lunid( int(self.restartnumbering), defaults)
+        pass
+
+    if self.lunid is not None:
+        self.lunid = int(self.lunid)
+    else:
+        self.lunid = self.parent.get_next_lunid(defaults)
+
+    try:
+        self.size = float(self.size)
+    except TypeError:
+        nosize_luns = len(node.xpath("parent::*/descendant-or-self::lun[not(@size)]"))
+        sized_luns = node.xpath("parent::*/descendant-or-self::lun[(@size)]")
+        sized_total = sum([ int(lun.attrib['size']) for lun in sized_luns ])
+        self.size = float(self.parent.get_iscsi_usable() - sized_total) / nosize_luns
+        pass
+
+    self.parent.add_to_lun_total(self.size)
+
+def run(defaults, tree, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        project = Project()
+        project.configure_from_node(tree, defaults, None)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, [ lun.size for lun in project.get_luns() ]
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-c', '--configfile', dest='configfile', default=TESTCONF)
+    parser.add_option('-l', '--luns', dest='luns', default='1,100,1000',
+                      help="comma separated list of LUNs per volume")
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=3)
+    options, args = parser.parse_args()
+
+    log.setLevel(logging.CRITICAL)
+    defaults = RawConfigParser()
+    defaults.read(options.configfile)
+
+    print "%6s %12s %12s %8s" % ('luns', 'per-lun', 'per-volume', 'same')
+    for luns in [ int(x) for x in options.luns.split(',') ]:
+        tree = make_project_tree(volumes=1, qtrees=1, luns=luns)
+
+        new_time, new_sizes = run(defaults, tree, options.repeat)
+
+        saved = Lun.configure_optional_attributes
+        Lun.configure_optional_attributes = legacy_configure_optional_attributes
+        try:
+            old_time, old_sizes = run(defaults, tree, options.repeat)
+        finally:
+            Lun.configure_optional_attributes = saved
+
+        print "%6d %11.4fs %11.4fs %8s" % (luns, old_time, new_time, old_sizes == new_sizes)
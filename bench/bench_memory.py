@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# $Id$
+#
+"""
+Measure the memory used by a configured model of a large project.
+
+Builds a synthetic 50 site project, configures it, and reports the
+number of model objects, the bytes each one uses, and the resident
+size of the process. Each mode is run in a fresh child process, so
+the resident sizes don't interfere with each other:
+
+  full     - the parsed definition is kept alive alongside the model
+  compact  - compact_model is set, and the definition is thrown away
+"""
+import sys
+import os
+import os.path
+import time
+import optparse
+import subprocess
+import gc
+
+from synthetic import make_project_tree
+
+from ConfigParser import RawConfigParser
+
+from lxml import etree
+
+from docgen.project import Project
+
+import logging
+log = logging.getLogger('docgen')
+
+TESTCONF = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'docgen_test.conf')
+
+def resident_bytes():
+    """
+    The resident set size of this process, in bytes.
+    """
+    try:
+        statm = open('/proc/self/statm').read().split()
+        return int(statm[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def model_objects(project):
+    objs = []
+    seen = {}
+    stack = [project]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen[id(obj)] = True
+        objs.append(obj)
+        for children in getattr(obj, 'children', {}).values():
+            if type(children) is list:
+                stack.extend([ x for x in children if hasattr(x, 'children') ])
+    return objs
+
+def attribute_values(obj):
+    d = getattr(obj, '__dict__', None)
+    if d is not None:
+        return d.values()
+    values = []
+    for klass in type(obj).__mro__:
+        for name in klass.__dict__.get('__slots__', ()):
+            try:
+                values.append(getattr(obj, name))
+            except AttributeError:
+                pass
+    return values
+
+def object_bytes(obj, strings):
+    """
+    Bytes used by a model object: the object itself, its instance
+    dictionary if it has one, and its children table.
+    String values are added to the strings table, so that each
+    distinct string object is only counted once.
+    """
+    total = sys.getsizeof(obj)
+    d = getattr(obj, '__dict__', None)
+    if d is not None:
+        total += sys.getsizeof(d)
+    total += sys.getsizeof(obj.children)
+    for value in attribute_values(obj):
+        if type(value) is str:
+            strings[id(value)] = sys.getsizeof(value)
+    return total
+
+def held_nodes(obj):
+    """
+    How many definition nodes an object is keeping alive.
+    """
+    return len([ x for x in attribute_values(obj) if isinstance(x, etree._Element) ])
+
+def run_mode(mode, sites, volumes, qtrees, configfile):
+    defaults = RawConfigParser()
+    defaults.read(configfile)
+    if mode == 'compact':
+        defaults.set('global', 'compact_model', 'yes')
+
+    gc.collect()
+    base_rss = resident_bytes()
+
+    start = time.time()
+    tree = make_project_tree(sites=sites, filers=2, volumes=volumes, qtrees=qtrees, luns=1, hosts=4)
+    project = Project()
+    project.configure_from_node(tree, defaults, None)
+    elapsed = time.time() - start
+    if mode == 'compact':
+        del tree
+        pass
+    gc.collect()
+    rss = resident_bytes() - base_rss
+
+    objs = model_objects(project)
+    strings = {}
+    membytes = sum([ object_bytes(x, strings) for x in objs ])
+    membytes += sum(strings.values())
+    nodes = sum([ held_nodes(x) for x in objs ])
+    print "%s %d %f %d %d %d" % (mode, len(objs), elapsed, membytes, rss, nodes)
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-c', '--configfile', dest='configfile', default=TESTCONF)
+    parser.add_option('-s', '--sites', dest='sites', type='int', default=50)
+    parser.add_option('-v', '--volumes', dest='volumes', type='int', default=50,
+                      help="volumes per filer")
+    parser.add_option('-q', '--qtrees', dest='qtrees', type='int', default=2,
+                      help="qtrees per volume")
+    parser.add_option('--mode', dest='mode', default=None,
+                      help="run a single mode in this process")
+    options, args = parser.parse_args()
+
+    log.setLevel(logging.CRITICAL)
+
+    if options.mode is not None:
+        run_mode(options.mode, options.sites, options.volumes, options.qtrees, options.configfile)
+        sys.exit(0)
+
+    print "%-10s %8s %10s %14s %12s %12s" % ('mode', 'objects', 'configure', 'bytes/object', 'rss (MB)', 'nodes held')
+    for mode in ['full', 'compact']:
+        args = [ sys.executable, os.path.abspath(__file__),
+                 '--mode', mode,
+                 '-s', str(options.sites),
+                 '-v', str(options.volumes),
+                 '-q', str(options.qtrees),
+                 '-c', options.configfile ]
+        output = subprocess.Popen(args, stdout=subprocess.PIPE).communicate()[0]
+        mode, nobjs, elapsed, membytes, rss, nodes = output.split()[-6:]
+        print "%-10s %8s %9.3fs %14.1f %12.1f %12s" % (mode, nobjs, float(elapsed),
+                                                        float(membytes) / int(nobjs),
+                                                        float(rss) / (1024 * 1024),
+                                                        nodes)
@@ -0,0 +1,95 @@
+#!/usr/bin/python
+# $Id$
+#
+"""
+Measure looking up the manually defined mountoptions for every
+host and qtree pair of a project.
+
+Builds synthetic projects over a grid of host and volume counts,
+with every volume exported, with mountoptions, to a few hosts. For
+each host and qtree it then finds the mountoptions twice: with
+the XPath that used to be run for every pair, and from the table
+each qtree is given from its ancestor context when it is configured.
+The answers must be the same for every pair.
+"""
+import sys
+import os.path
+import time
+import optparse
+
+from synthetic import make_project_tree
+
+from ConfigParser import RawConfigParser
+
+from docgen.project import Project
+
+import logging
+log = logging.getLogger('docgen')
+
+TESTCONF = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'docgen_test.conf')
+
+def xpath_lookup(pairs):
+    results = []
+    for host, qtree in pairs:
+        nodes = qtree.qtreenode.xpath("ancestor-or-self::*/export[@to = '%s']/mountoption" % host.name)
+        results.append([ x.text for x in nodes ])
+        pass
+    return results
+
+def table_lookup(pairs):
+    results = []
+    for host, qtree in pairs:
+        results.append(qtree.export_mountoptions.get(host.name, []))
+        pass
+    return results
+
+def best_time(func, pairs, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        results = func(pairs)
+        times.append(time.time() - start)
+        pass
+    return min(times), results
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-c', '--configfile', dest='configfile', default=TESTCONF)
+    parser.add_option('-H', '--hosts', dest='hosts', default='10,50,100',
+                      help="comma separated list of host counts")
+    parser.add_option('-v', '--volumes', dest='volumes', default='10,50,100',
+                      help="comma separated list of volume counts")
+    parser.add_option('-q', '--qtrees', dest='qtrees', type='int', default=2,
+                      help="qtrees per volume")
+    parser.add_option('-e', '--exports', dest='exports', type='int', default=4,
+                      help="hosts each volume is exported to")
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=3)
+    options, args = parser.parse_args()
+
+    log.setLevel(logging.CRITICAL)
+
+    defaults = RawConfigParser()
+    defaults.read(options.configfile)
+
+    print "%6s %8s %8s %12s %12s %9s %10s" % ('hosts', 'qtrees', 'pairs', 'xpath', 'table', 'speedup', 'identical')
+    for hosts in [ int(x) for x in options.hosts.split(',') ]:
+        for volumes in [ int(x) for x in options.volumes.split(',') ]:
+            tree = make_project_tree(sites=1, filers=1, volumes=volumes, qtrees=options.qtrees,
+                                     hosts=hosts, exports=options.exports, mountoptions=2)
+            project = Project()
+            project.configure_from_node(tree, defaults, None)
+
+            qtrees = []
+            for vol in project.get_volumes():
+                qtrees.extend(vol.get_qtrees())
+                pass
+            pairs = [ (host, qtree) for host in project.get_hosts() for qtree in qtrees ]
+
+            xpath_time, expected = best_time(xpath_lookup, pairs, options.repeat)
+            table_time, results = best_time(table_lookup, pairs, options.repeat)
+            print "%6d %8d %8d %11.2fms %11.2fms %8.1fx %10s" % (hosts, len(qtrees), len(pairs),
+                                                                xpath_time * 1000, table_time * 1000,
+                                                                xpath_time / max(table_time, 1e-9),
+                                                                results == expected and 'yes' or 'NO')
+            pass
+        pass
@@ -0,0 +1,193 @@
+#!/usr/bin/python
+# $Id$
+#
+"""
+Time each phase of creating documents for a synthetic project.
+
+Writes a synthetic project definition to a temporary file, and then
+times, separately:
+
+  parse     - parsing the definition with etree.parse()
+  configure - configure_from_node(), not counting the setup passes
+  setup_*   - each of the setup passes Project.setup() runs
+  emit:*    - each document generator's emit(), to /dev/null
+
+Each phase is run several times, and the best time is kept. The
+results are printed as a table, and written out as JSON with the
+parameters of the synthetic project, so runs can be compared
+between releases to spot regressions.
+"""
+import sys
+import os
+import os.path
+import time
+import optparse
+import tempfile
+import platform
+
+import json
+
+from synthetic import make_project_xml, count_objects
+
+from ConfigParser import RawConfigParser
+
+from lxml import etree
+
+from docgen.base import __version__
+from docgen.project import Project
+from docgen.util import load_doc_plugins
+
+import logging
+log = logging.getLogger('docgen')
+
+TESTCONF = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'docgen_test.conf')
+
+SETUP_PASSES = [ 'setup_drhosts',
+                 'setup_exports',
+                 'setup_igroups',
+                 'setup_snapmirrors',
+                 'setup_snapvaults',
+                 ]
+
+PARAMETERS = [ ('sites', 2, "number of sites"),
+               ('filers', 2, "filers per site"),
+               ('vfilers', 1, "vfilers per filer"),
+               ('volumes', 50, "volumes per vfiler"),
+               ('qtrees', 2, "qtrees per volume"),
+               ('luns', 1, "LUNs per qtree"),
+               ('hosts', 10, "hosts per site"),
+               ('exports', 2, "hosts each volume is exported to"),
+               ('snapvaults', 2, "snapvaultsets per site"),
+               ('snapmirrors', 1, "snapmirrorsets per site"),
+               ]
+
+class PhaseTimer:
+    """
+    Time the setup passes of a Project by wrapping them.
+    """
+    def __init__(self):
+        self.times = {}
+        self.originals = {}
+
+    def install(self):
+        for name in SETUP_PASSES:
+            self.originals[name] = Project.__dict__[name]
+            setattr(Project, name, self.wrap(name, self.originals[name]))
+            pass
+
+    def uninstall(self):
+        for name, func in self.originals.items():
+            setattr(Project, name, func)
+            pass
+        self.originals = {}
+
+    def wrap(self, name, func):
+        def timed(*args, **kwargs):
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.times[name] = self.times.get(name, 0) + time.time() - start
+        return timed
+
+def run_once(filename, defaults, doctypes):
+    """
+    Load the definition and emit each document once.
+    @returns: a dictionary of the time each phase took, in seconds,
+    and the configured project
+    """
+    results = {}
+    start = time.time()
+    tree = etree.parse(filename)
+    results['parse'] = time.time() - start
+
+    timer = PhaseTimer()
+    timer.install()
+    try:
+        project = Project()
+        start = time.time()
+        project.configure_from_node(tree.getroot(), defaults, None)
+        elapsed = time.time() - start
+    finally:
+        timer.uninstall()
+    results.update(timer.times)
+    results['configure'] = elapsed - sum(timer.times.values())
+
+    plugins = load_doc_plugins(defaults)
+    for doctype in doctypes:
+        outf = open(os.devnull, 'w')
+        start = time.time()
+        plugins[doctype](project, defaults).emit(outf, ns={})
+        results['emit:%s' % doctype] = time.time() - start
+        outf.close()
+        pass
+    return results, project
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-c', '--configfile', dest='configfile', default=TESTCONF)
+    for name, default, helptext in PARAMETERS:
+        parser.add_option('--%s' % name, dest=name, type='int', default=default, help=helptext)
+        pass
+    parser.add_option('-d', '--doctypes', dest='doctypes', default=None,
+                      help="comma separated document types to emit [default: all configured]")
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=3)
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help="write the results to this JSON file")
+    options, args = parser.parse_args()
+
+    log.setLevel(logging.CRITICAL)
+
+    defaults = RawConfigParser()
+    defaults.read(options.configfile)
+    if options.doctypes is None:
+        doctypes = sorted([ x[0] for x in defaults.items('document_plugins') ])
+    else:
+        doctypes = options.doctypes.split(',')
+        pass
+
+    parameters = {}
+    for name, default, helptext in PARAMETERS:
+        parameters[name] = getattr(options, name)
+        pass
+
+    fd, filename = tempfile.mkstemp(suffix='.xml')
+    try:
+        os.write(fd, make_project_xml(**parameters))
+        os.close(fd)
+        size = os.path.getsize(filename)
+
+        phases = {}
+        for i in range(options.repeat):
+            results, project = run_once(filename, defaults, doctypes)
+            for name, elapsed in results.items():
+                phases[name] = min(phases.get(name, elapsed), elapsed)
+                pass
+            pass
+    finally:
+        os.unlink(filename)
+
+    order = [ 'parse', 'configure' ] + SETUP_PASSES + [ 'emit:%s' % x for x in doctypes ]
+    print "%d bytes of definition, %d model objects, %d volumes" % (size, count_objects(project), len(project.get_volumes()))
+    print "%-32s %12s" % ('phase', 'time')
+    for name in order:
+        print "%-32s %11.2fms" % (name, phases[name] * 1000)
+        pass
+    print "%-32s %11.2fms" % ('total', sum(phases.values()) * 1000)
+
+    if options.output is not None:
+        report = { 'docgen_version': __version__,
+                   'python_version': platform.python_version(),
+                   'platform': platform.platform(),
+                   'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'repeat': options.repeat,
+                   'parameters': parameters,
+                   'definition_bytes': size,
+                   'model_objects': count_objects(project),
+                   'phases': phases,
+                   }
+        outf = open(options.output, 'w')
+        json.dump(report, outf, indent=2, sort_keys=True, separators=(',', ': '))
+        outf.write('\n')
+        outf.close()
+        pass
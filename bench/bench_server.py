@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# $Id$
+#
+"""
+Compare how long it takes to get a document from the resident
+server with running create_document.py for it.
+
+Writes a synthetic project definition, then times a number of
+cold create_document.py runs, with and without the model cache,
+against requests to a docgen_server.py started for the benchmark,
+first one at a time and then from several concurrent clients.
+"""
+import sys
+import os
+import os.path
+import time
+import socket
+import optparse
+import subprocess
+import tempfile
+import threading
+import httplib
+import urllib
+
+from synthetic import make_project_xml
+
+TOPDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+TESTCONF = os.path.join(TOPDIR, 'test', 'docgen_test.conf')
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def report(label, latencies, failures=0):
+    print "%-24s %6d %10.4fs %10.4fs %10.4fs %8d" % (label, len(latencies),
+                                                     sum(latencies) / len(latencies),
+                                                     percentile(latencies, 0.5),
+                                                     percentile(latencies, 0.95),
+                                                     failures)
+
+def cli_latencies(args, requests, env):
+    latencies = []
+    for i in range(requests):
+        start = time.time()
+        subprocess.call(args, env=env, stdout=open(os.devnull, 'w'), stderr=subprocess.STDOUT)
+        latencies.append(time.time() - start)
+        pass
+    return latencies
+
+def request(port, path):
+    conn = httplib.HTTPConnection('127.0.0.1', port)
+    conn.request('GET', path)
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    return response.status
+
+def server_latencies(port, path, clients, requests):
+    """
+    Have some clients each make a number of requests at once.
+    @returns: the latency of each successful request, and how many failed
+    """
+    latencies = []
+    failures = []
+    def client():
+        for i in range(requests):
+            start = time.time()
+            status = request(port, path)
+            if status == 200:
+                latencies.append(time.time() - start)
+            else:
+                failures.append(status)
+                pass
+            pass
+    threads = [ threading.Thread(target=client) for x in range(clients) ]
+    for thread in threads:
+        thread.start()
+        pass
+    for thread in threads:
+        thread.join()
+        pass
+    return latencies, len(failures)
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-c', '--configfile', dest='configfile', default=TESTCONF)
+    parser.add_option('-d', '--doctype', dest='doctype', default='netapp-commands')
+    parser.add_option('-v', '--volumes', dest='volumes', type='int', default=50,
+                      help="volumes per filer")
+    parser.add_option('-n', '--requests', dest='requests', type='int', default=10,
+                      help="requests per client")
+    parser.add_option('--clients', dest='clients', default='1,4,16',
+                      help="comma separated list of concurrent client counts")
+    parser.add_option('--max-active', dest='max_active', type='int', default=4)
+    parser.add_option('--max-waiting', dest='max_waiting', type='int', default=16)
+    options, args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.path.join(TOPDIR, 'lib')
+    # Keep the benchmark's cached projects out of the real cache
+    env['HOME'] = tempfile.mkdtemp()
+
+    fd, definition = tempfile.mkstemp(suffix='.xml')
+    os.write(fd, make_project_xml(sites=1, filers=2, volumes=options.volumes, qtrees=2, luns=1, hosts=4))
+    os.close(fd)
+
+    port = free_port()
+    server = subprocess.Popen([ sys.executable, os.path.join(TOPDIR, 'bin', 'docgen_server.py'),
+                                '-c', options.configfile, '-p', str(port), '--debug=critical',
+                                '--max-active', str(options.max_active),
+                                '--max-waiting', str(options.max_waiting) ], env=env)
+    try:
+        cli = [ sys.executable, os.path.join(TOPDIR, 'bin', 'create_document.py'),
+                '-c', options.configfile, '-d', options.doctype, '--debug=critical', definition ]
+
+        print "%-24s %6s %11s %11s %11s %8s" % ('', 'count', 'mean', 'median', '95%', 'failed')
+        report('cli, no cache', cli_latencies(cli + ['--no-cache'], options.requests, env))
+        report('cli, cached', cli_latencies(cli, options.requests, env))
+
+        # Wait for the server to start
+        path = '/document?' + urllib.urlencode({'doctype': options.doctype, 'definition': definition})
+        while True:
+            try:
+                request(port, '/status')
+                break
+            except socket.error:
+                time.sleep(0.1)
+                pass
+            pass
+
+        latencies, failures = server_latencies(port, path, 1, 1)
+        report('server, first request', latencies, failures)
+        for clients in [ int(x) for x in options.clients.split(',') ]:
+            latencies, failures = server_latencies(port, path, clients, options.requests)
+            report('server, %d clients' % clients, latencies, failures)
+            pass
+    finally:
+        server.terminate()
+        server.wait()
+        os.unlink(definition)
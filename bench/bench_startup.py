@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# $Id$
+#
+"""
+Measure how long create_document.py takes to start up.
+
+Runs create_document.py for each doctype a number of times, in a
+fresh process each time, with DOCGEN_IMPORTTIME set, and reports the
+time spent importing docgen and its direct imports, and the wall
+clock time of the whole run. For comparison, each doctype is also
+run with every configured document plugin imported up front, as
+load_doc_plugins() used to do.
+
+Use --json to append the results to a file, to follow the startup
+cost from one version to the next.
+"""
+import sys
+import os
+import os.path
+import re
+import time
+import optparse
+import subprocess
+
+# Puts this tree's lib directory on the path
+import synthetic
+
+TOPDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+TESTCONF = os.path.join(TOPDIR, 'test', 'docgen_test.conf')
+DEFINITION = os.path.join(TOPDIR, 'test', 'xml', 'simple_single_site.xml')
+
+TOTAL_RE = re.compile(r'import time:\s+\|\s+(\d+) \| total for docgen')
+
+# Run create_document.py with all the plugins imported when they are loaded
+EAGER_SCRIPT = """
+import sys
+import docgen.util
+lazy_load_doc_plugins = docgen.util.load_doc_plugins
+def load_doc_plugins(defaults):
+    plugins = lazy_load_doc_plugins(defaults)
+    for name in plugins.keys():
+        plugins[name]
+    return plugins
+docgen.util.load_doc_plugins = load_doc_plugins
+sys.argv = sys.argv[1:]
+__name__ = '__main__'
+execfile(sys.argv[0])
+"""
+
+def run(args, env):
+    """
+    Run a program with import profiling on.
+    @returns: the wall clock time, and the docgen import time, in seconds
+    """
+    start = time.time()
+    proc = subprocess.Popen(args, env=env, stdout=open(os.devnull, 'w'), stderr=subprocess.PIPE)
+    stderr = proc.communicate()[1]
+    elapsed = time.time() - start
+    match = TOTAL_RE.search(stderr)
+    if match is None:
+        raise ValueError("No import time report from: %s\n%s" % (' '.join(args), stderr))
+    return elapsed, int(match.group(1)) / 1e6
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) / 2]
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-c', '--configfile', dest='configfile', default=TESTCONF)
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=5)
+    parser.add_option('--json', dest='json', help="append the results to this file")
+    options, args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.path.join(TOPDIR, 'lib')
+    env['DOCGEN_IMPORTTIME'] = '1'
+
+    from ConfigParser import RawConfigParser
+    defaults = RawConfigParser()
+    defaults.read(options.configfile)
+    doctypes = [ x[0] for x in defaults.items('document_plugins') ]
+
+    results = {}
+    print "%-28s %12s %12s %12s %12s" % ('', 'imports', 'wall clock', 'eager imp.', 'eager wall')
+    for doctype in doctypes:
+        args = [ os.path.join(TOPDIR, 'bin', 'create_document.py'),
+                 '-c', options.configfile, '-d', doctype, '--no-cache', '--debug=critical', DEFINITION ]
+        runs = [ run([ sys.executable ] + args, env) for i in range(options.repeat) ]
+        eager_runs = [ run([ sys.executable, '-c', EAGER_SCRIPT ] + args, env) for i in range(options.repeat) ]
+        results[doctype] = (median([ x[1] for x in runs ]), median([ x[0] for x in runs ]),
+                            median([ x[1] for x in eager_runs ]), median([ x[0] for x in eager_runs ]))
+        print "%-28s %11.1fms %11.1fms %11.1fms %11.1fms" % ((doctype,) + tuple([ x * 1000 for x in results[doctype] ]))
+        pass
+
+    if options.json is not None:
+        f = open(options.json, 'a')
+        f.write('{"time": %d, %s}\n' % (time.time(), ', '.join([ '"%s": {"imports": %f, "wall": %f, "eager_imports": %f, "eager_wall": %f}' % ((k,) + v)
+                                                                 for k, v in sorted(results.items()) ])))
+        f.close()
+        pass
@@ -0,0 +1,120 @@
+#!/usr/bin/python
+# $Id$
+#
+"""
+Measure how long each section of the storage design takes to render.
+
+Builds a synthetic project, and times each section builder of the
+storage design document, first with its templates compiled once,
+the way the design generator uses them, and then with a new
+string.Template created and substituted every time one is used,
+the way the sections used to be built.
+"""
+import sys
+import os.path
+import time
+import optparse
+from string import Template
+
+from synthetic import make_project_tree
+
+from ConfigParser import RawConfigParser
+
+from docgen.project import Project
+from docgen.template import SectionTemplate
+from docgen.docplugins.ipsan_storage import IPSANStorageDesignGenerator
+
+import logging
+log = logging.getLogger('docgen')
+
+TESTCONF = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'docgen_test.conf')
+
+SECTIONS = [ 'introduction',
+             'project_hosts_section',
+             'topology_section',
+             'vfiler_section',
+             'volume_section',
+             'nfs_config_section',
+             'iscsi_config_section',
+             'snapvault_config_section',
+             'snapmirror_config_section',
+             ]
+
+class PerCallTemplate:
+    """
+    A string.Template that is created anew each time it is used.
+    """
+    def __init__(self, template):
+        self.template = template
+
+    def safe_substitute(self, *args, **kws):
+        return Template(self.template).safe_substitute(*args, **kws)
+
+    def render(self, write, mapping={}, **kws):
+        write(self.safe_substitute(mapping, **kws))
+
+def use_per_call_templates():
+    """
+    Replace the design generator's compiled templates.
+    """
+    for name, value in IPSANStorageDesignGenerator.__dict__.items():
+        if isinstance(value, SectionTemplate):
+            setattr(IPSANStorageDesignGenerator, name, PerCallTemplate(value.template))
+            pass
+        pass
+
+def time_sections(generator, repeat):
+    """
+    @returns: the best time to build each section, in seconds
+    """
+    results = {}
+    for section in SECTIONS:
+        builder = getattr(generator, 'build_%s' % section)
+        times = []
+        for i in range(repeat):
+            ns = generator.make_ns()
+            start = time.time()
+            builder(ns)
+            times.append(time.time() - start)
+            pass
+        results[section] = min(times)
+        pass
+    return results
+
+class BenchGenerator(IPSANStorageDesignGenerator):
+
+    def make_ns(self):
+        ns = {}
+        ns['copyright_holder'] = self.defaults.get('global', 'copyright_holder')
+        ns['iscsi_prefix'] = self.defaults.get('global', 'iscsi_prefix')
+        ns['title'] = 'Benchmark'
+        return ns
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-c', '--configfile', dest='configfile', default=TESTCONF)
+    parser.add_option('-s', '--sites', dest='sites', type='int', default=2)
+    parser.add_option('-v', '--volumes', dest='volumes', type='int', default=200,
+                      help="volumes per filer")
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=5)
+    options, args = parser.parse_args()
+
+    log.setLevel(logging.CRITICAL)
+
+    defaults = RawConfigParser()
+    defaults.read(options.configfile)
+    tree = make_project_tree(sites=options.sites, filers=2, volumes=options.volumes, qtrees=2, luns=1, hosts=20)
+    project = Project()
+    project.configure_from_node(tree, defaults, None)
+
+    generator = BenchGenerator(project, defaults)
+    compiled = time_sections(generator, options.repeat)
+    use_per_call_templates()
+    per_call = time_sections(generator, options.repeat)
+
+    print "%-28s %12s %12s %8s" % ('section', 'per call', 'compiled', 'speedup')
+    for section in SECTIONS:
+        print "%-28s %11.2fms %11.2fms %7.2fx" % (section, per_call[section] * 1000, compiled[section] * 1000,
+                                                 per_call[section] / max(compiled[section], 1e-9))
+        pass
+    print "%-28s %11.2fms %11.2fms" % ('total', sum(per_call.values()) * 1000, sum(compiled.values()) * 1000)
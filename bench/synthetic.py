@@ -0,0 +1,162 @@
+# $Id$
+#
+
+"""
+Synthetic project definitions for benchmarking.
+
+Builds project definition XML of arbitrary size, so we can see
+how DocGen scales with the number of sites, filers, volumes, etc.
+"""
+import sys
+import os.path
+
+# Use the docgen in this source tree, not an installed one
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from lxml import etree
+
+def make_project_xml(sites=1,
+                     filers=1,
+                     volumes=10,
+                     qtrees=1,
+                     luns=0,
+                     hosts=1,
+                     vfilers=1,
+                     exports=0,
+                     snapvaults=0,
+                     snapmirrors=0,
+                     mountoptions=0,
+                     name='bench'):
+    """
+    Return the XML text of a synthetic project definition.
+    @param sites: number of sites
+    @param filers: number of filers per site
+    @param volumes: number of volumes per vfiler
+    @param qtrees: number of qtrees per volume
+    @param luns: number of LUNs per qtree
+    @param hosts: number of hosts per site
+    @param vfilers: number of vfilers per filer
+    @param exports: number of hosts each volume is exported to
+    @param snapvaults: number of snapvaultsets per site, backing up
+    to a nearstore at the same site. Each volume refers to one.
+    @param snapmirrors: number of snapmirrorsets per site, mirroring
+    to the first filer at the next site. Each volume refers to one.
+    @param mountoptions: number of mountoptions given to each export
+    """
+    lines = []
+    lines.append('<project name="%s" code="01">' % name)
+    lines.append('  <revision majornumber="1" minornumber="0" date="1 January 2010" author="bench"/>')
+
+    for sitenum in range(sites):
+        if sitenum == 0:
+            sitetype = 'primary'
+        else:
+            sitetype = 'secondary'
+        lines.append('  <site name="site%02d" type="%s" location="site%02d">' % (sitenum, sitetype, sitenum))
+        lines.append('    <vlan type="project" number="%d">' % (3000 + sitenum))
+        lines.append('      <network number="10.%d.0.0/16" gateway="10.%d.255.254"/>' % (sitenum, sitenum))
+        lines.append('    </vlan>')
+
+        for hostnum in range(hosts):
+            lines.append('    <host name="s%02dhost%03d" operatingsystem="Solaris 10" platform="Sun"/>' % (sitenum, hostnum))
+            pass
+
+        for filernum in range(filers):
+            lines.append('    <filer name="s%02dfiler%02d" type="filer">' % (sitenum, filernum))
+            for vfilernum in range(vfilers):
+                if vfilernum == 0:
+                    lines.append('      <vfiler>')
+                else:
+                    lines.append('      <vfiler name="%s%02d">' % (name, vfilernum))
+                    pass
+                lines.append('        <ipaddress type="primary" ip="10.%d.%d.%d"/>' % (sitenum, filernum, vfilernum + 1))
+                lines.append('        <aggregate type="root" name="aggr0"/>')
+                lines.append('        <aggregate name="aggr%02d">' % (vfilernum + 1))
+                for volnum in range(volumes):
+                    lines.append('          <volume usable="%d">' % (10 + volnum % 10))
+                    for qtreenum in range(qtrees):
+                        lines.append('            <qtree name="q%03d">' % qtreenum)
+                        for lunnum in range(luns):
+                            lines.append('              <lun/>')
+                            pass
+                        lines.append('            </qtree>')
+                        pass
+                    for exportnum in range(min(exports, hosts)):
+                        hostname = 's%02dhost%03d' % (sitenum, (volnum + exportnum) % hosts)
+                        if mountoptions:
+                            lines.append('            <export to="%s">' % hostname)
+                            for optnum in range(mountoptions):
+                                lines.append('              <mountoption>opt%d</mountoption>' % optnum)
+                                pass
+                            lines.append('            </export>')
+                        else:
+                            lines.append('            <export to="%s"/>' % hostname)
+                            pass
+                        pass
+                    if snapvaults:
+                        lines.append('            <setref type="snapvault" name="s%02dsv%02d"/>' % (sitenum, volnum % snapvaults))
+                        pass
+                    if snapmirrors:
+                        lines.append('            <setref type="snapmirror" name="s%02dsm%02d"/>' % (sitenum, volnum % snapmirrors))
+                        pass
+                    lines.append('          </volume>')
+                    pass
+                lines.append('        </aggregate>')
+                lines.append('      </vfiler>')
+                pass
+            lines.append('    </filer>')
+            pass
+
+        if snapvaults:
+            lines.append('    <filer name="s%02dnearstore" type="nearstore">' % sitenum)
+            lines.append('      <vfiler>')
+            lines.append('        <ipaddress type="primary" ip="10.%d.255.1"/>' % sitenum)
+            lines.append('        <aggregate type="root" name="aggr0"/>')
+            lines.append('      </vfiler>')
+            lines.append('    </filer>')
+            pass
+        lines.append('  </site>')
+        pass
+
+    for sitenum in range(sites):
+        for setnum in range(snapvaults):
+            lines.append('  <snapvaultset name="s%02dsv%02d" targetfiler="s%02dnearstore" targetaggregate="aggr01">' % (sitenum, setnum, sitenum))
+            lines.append('    <snapvaultdef basename="sv_daily" snapschedule="1@1" snapvaultschedule="8@2"/>')
+            lines.append('    <snapvaultdef basename="sv_weekly" snapvaultschedule="13@sun@3"/>')
+            lines.append('  </snapvaultset>')
+            pass
+        for setnum in range(snapmirrors):
+            lines.append('  <snapmirrorset name="s%02dsm%02d" targetfiler="s%02dfiler00" targetaggregate="aggr02">' % (sitenum, setnum, (sitenum + 1) % sites))
+            lines.append('    <snapmirrorschedule minute="%d" hour="6" dayofmonth="*" dayofweek="*"/>' % setnum)
+            lines.append('  </snapmirrorset>')
+            pass
+        pass
+    lines.append('</project>')
+    return '\n'.join(lines)
+
+def make_project_tree(**kwargs):
+    """
+    Return a synthetic project definition as a parsed lxml root node.
+    """
+    return etree.fromstring(make_project_xml(**kwargs))
+
+def count_objects(project):
+    """
+    Count the number of configured model objects in a project.
+    """
+    count = 0
+    seen = {}
+    stack = [project]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen[id(obj)] = True
+        count += 1
+        for children in getattr(obj, 'children', {}).values():
+            if type(children) is list:
+                stack.extend([ x for x in children if hasattr(x, 'children') ])
+                pass
+            pass
+        pass
+    return count
@@ -0,0 +1,47 @@
+#!/usr/bin/python
+# $Id$
+# Build the documents for a directory full of project definitions
+#
+import sys
+import time
+
+from ConfigParser import RawConfigParser
+
+from docgen.util import load_doc_plugins
+from docgen.batch import find_definitions, build_projects, format_summary
+from docgen.options import BatchOptions
+
+import logging
+import docgen.debug
+
+log = logging.getLogger('docgen')
+
+if __name__ == '__main__':
+
+    usage = "batch_build.py [options] <directory|definition_file.xml|glob> ..."
+
+    optparser = BatchOptions(usage=usage)
+    optparser.parseOptions()
+
+    # Check the configuration and doctypes before starting any workers
+    defaults = RawConfigParser()
+    parsedfiles = defaults.read(optparser.options.configfile)
+    if len(parsedfiles) == 0:
+        raise ValueError("Cannot load configuration file: %s" % optparser.options.configfile)
+    doctypes = optparser.get_doctypes(load_doc_plugins(defaults).keys())
+
+    definitions = find_definitions(optparser.args)
+    if len(definitions) == 0:
+        log.critical("No project definitions found in: %s", ' '.join(optparser.args))
+        sys.exit(1)
+    log.info("Building %d projects", len(definitions))
+
+    start = time.time()
+    results = build_projects(definitions, optparser.options.configfile, doctypes,
+                             processes=optparser.options.jobs,
+                             streaming=optparser.options.streaming,
+                             use_cache=not optparser.options.no_cache)
+    print format_summary(results, doctypes, time.time() - start)
+
+    if len([ x for x in results if x.failed() ]) > 0:
+        sys.exit(1)
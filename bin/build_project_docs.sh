@@ -37,9 +37,13 @@ basedir=`dirname $project_defn`
 filename=`basename $project_defn`
 
 echo "Creating DocBook source for storage design: $basedir/$project_name.$STORAGE_DESIGN_SUFFIX"
-$CREATE_DOC_BIN -d ipsan-storage-design -o $basedir/$project_name.$STORAGE_DESIGN_SUFFIX $basedir/$filename
+echo "Creating storage provisioning commands file: $basedir/$project_name.$STORAGE_COMMANDS_SUFFIX"
+# Both documents are created from a single load of the project definition
+$CREATE_DOC_BIN -d ipsan-storage-design:$basedir/$project_name.$STORAGE_DESIGN_SUFFIX \
+    -d netapp-commands:$basedir/$project_name.$STORAGE_COMMANDS_SUFFIX \
+    $basedir/$filename
 if [ $? -ne 0 ]; then
-    echo "Failed to create storage design."
+    echo "Failed to create documents."
     exit 1
 else
     echo "Compiling storage design..."
@@ -55,6 +59,3 @@ fi
 #     echo "Compiling network design..."
 #     $COMPILE_DOC_BIN $basedir/$project_name.$NETWORK_DESIGN_SUFFIX
 # fi
-
-echo "Creating storage provisioning commands file: $basedir/$project_name.$STORAGE_COMMANDS_SUFFIX"
-$CREATE_DOC_BIN -d netapp-commands -o $basedir/$project_name.$STORAGE_COMMANDS_SUFFIX $basedir/$filename
@@ -3,16 +3,11 @@
 # Create a document for the IP-SAN
 #
 import sys
-import textwrap
 
-from datetime import datetime
-from zope.interface import Interface
-from string import Template
-from lxml import etree
 from ConfigParser import RawConfigParser
 
-from docgen.util import load_doc_plugins
-from docgen.project import Project
+from docgen.util import load_doc_plugins, set_command_workers
+from docgen.loader import load_definition
 
 #from docgen.config import ProjectConfig, ConfigInvalid
 from docgen.options import BaseOptions
@@ -29,24 +24,41 @@ if __name__ == '__main__':
     optparser = BaseOptions(usage=usage)
     optparser.parseOptions()
 
-    # Dynamic namespace information that is passed into document generators
-    ns = {}
-
     # Load configuration file
     defaults = RawConfigParser()
     parsedfiles = defaults.read(optparser.options.configfile)
     if len(parsedfiles) == 0:
         raise ValueError("Cannot load configuration file: %s" % optparser.options.configfile)
 
+    if optparser.options.workers is not None:
+        set_command_workers(defaults, optparser.options.workers)
+        pass
+
     # Load the document generation plugins
     doc_plugins = load_doc_plugins(defaults)
+    documents = optparser.get_documents(doc_plugins.keys())
 
-    try:
-        # load the configuration from a config file
-        proj = Project()
-        tree = etree.parse(optparser.options.definitionfile)
-        proj.configure_from_node(tree.getroot(), defaults, None)
+    if optparser.options.watch:
+        from docgen.watch import DocumentWatcher
+        if None in [ x[1] for x in documents ]:
+            optparser.error("--watch needs an output file for each document")
+        if optparser.options.shard:
+            optparser.error("--shard can't be used with --watch")
+        watcher = DocumentWatcher(optparser.options.definitionfile, optparser.options.configfile,
+                                  [ x[0] for x in documents ], [ x[1] for x in documents ],
+                                  streaming=optparser.options.streaming,
+                                  use_cache=not optparser.options.no_cache,
+                                  workers=optparser.options.workers)
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
 
+    try:
+        proj = load_definition(optparser.options.definitionfile, defaults, parsedfiles,
+                               streaming=optparser.options.streaming,
+                               use_cache=not optparser.options.no_cache)
     except:
         log.critical("Cannot load configuration. Unhandled error condition:")
         import traceback
@@ -54,12 +66,22 @@ if __name__ == '__main__':
         sys.exit(1)
         pass
 
-    # Use the '-d' option to determine which document to generate
-    docgen = doc_plugins[optparser.options.doctype](proj, defaults)
-    #raise NotImplementedError("DocType of '%s' is not handled yet." % optparser.options.doctype)
-    if optparser.options.outfile is not None:
-        outf = open(optparser.options.outfile, "w")
-        docgen.emit(outf, ns=ns)
-        outf.close()
-    else:
-        docgen.emit(ns=ns)
+    # Use the '-d' options to determine which documents to generate,
+    # all from the same project.
+    for doctype, outfile in documents:
+        log.debug("Creating %s document", doctype)
+        docgen = doc_plugins[doctype](proj, defaults)
+        # Dynamic namespace information that is passed into document generators
+        ns = {}
+        if optparser.options.shard and hasattr(docgen, 'emit_shards'):
+            if outfile is None:
+                optparser.error("--shard needs an output directory for %s" % doctype)
+            docgen.emit_shards(outfile, optparser.options.shard, ns=ns)
+        elif outfile is not None:
+            outf = open(outfile, "w")
+            docgen.emit(outf, ns=ns)
+            outf.close()
+        else:
+            docgen.emit(ns=ns)
+            pass
+        pass
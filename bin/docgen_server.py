@@ -0,0 +1,49 @@
+#!/usr/bin/python
+# $Id$
+# Run a resident document server, to create documents
+# without starting a new process each time.
+#
+import sys
+
+from ConfigParser import RawConfigParser
+
+from docgen.server import DocumentService, RequestLimiter, DocumentServer, UnixDocumentServer
+from docgen.options import ServerOptions
+
+import logging
+import docgen.debug
+
+log = logging.getLogger('docgen')
+
+if __name__ == '__main__':
+
+    usage = "docgen_server.py [options]"
+
+    optparser = ServerOptions(usage=usage)
+    optparser.parseOptions()
+
+    # Load configuration file
+    defaults = RawConfigParser()
+    parsedfiles = defaults.read(optparser.options.configfile)
+    if len(parsedfiles) == 0:
+        raise ValueError("Cannot load configuration file: %s" % optparser.options.configfile)
+
+    service = DocumentService(defaults, parsedfiles,
+                              use_cache=not optparser.options.no_cache,
+                              max_projects=optparser.options.max_projects,
+                              definition_root=optparser.options.definition_root,
+                              max_definition_size=optparser.options.max_definition_size)
+    limiter = RequestLimiter(optparser.options.max_active, optparser.options.max_waiting)
+
+    if optparser.options.socket is not None:
+        server = UnixDocumentServer(optparser.options.socket, service, limiter)
+        log.info("Serving documents on %s", optparser.options.socket)
+    else:
+        server = DocumentServer((optparser.options.address, optparser.options.port), service, limiter)
+        log.info("Serving documents on %s:%d", optparser.options.address, optparser.options.port)
+        pass
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,4 +1,8 @@
 ##
 ## $Id$
 ##COPYRIGHT##
-## This file turns this directory into a python package
\ No newline at end of file
+## This file turns this directory into a python package
+# Profile imports, if asked to, before anything else is imported
+import os
+import importprofile
+importprofile.install_from_environment(os.environ)
@@ -34,22 +34,22 @@ class Aggregate(DynamicNamedXMLConfigurable, LunNumbering):
     known_types = [ 'root', 'data' ]
 
     def __init__(self):
-        self.current_lunid = 0
+        self.lunid_allocator = None
 
     def __repr__(self):
         return "<Aggregate: %s/%s>" % (self.parent.name, self.name)
 
     def configure_optional_attributes(self, node, defaults):
         DynamicNamedXMLConfigurable.configure_optional_attributes(self, node, defaults)
+        self.configure_defaults(defaults)
 
+    def configure_defaults(self, defaults):
         # Aggregate type defaults to 'data'
         if self.type is None:
             self.type = 'data'
         
-    def populate_namespace(self, ns={}):
-        ns = self.parent.populate_namespace(ns)
-        ns['aggr_name'] = self.name
-        return ns
+    def get_namespace_frame(self):
+        return { 'aggr_name': self.name }
 
     def get_filer(self):
         return self.parent.get_filer()
@@ -61,3 +61,13 @@ def create_aggregate_from_node(node, defaults, parent):
     aggr = Aggregate()
     aggr.configure_from_node(node, defaults, parent)
     return aggr
+
+def create_aggregate(defaults, parent, **attribs):
+    """
+    Create an aggregate directly, without a definition node.
+    The keyword arguments are its attributes, as they would
+    be given in a node.
+    """
+    aggr = Aggregate()
+    aggr.configure_from_attributes(attribs, defaults, parent)
+    return aggr
@@ -25,12 +25,23 @@ class Background(XMLConfigurable, DynamicNaming):
 
     def configure_from_node(self, node, defaults, parent):
         self.node = node
+        self.docbook = None
         pass
 
+    def release_source_node(self):
+        """
+        Keep the rendered DocBook, rather than the node it came from.
+        """
+        if self.node is not None:
+            self.docbook = self.get_docbook()
+            self.node = None
+
     def get_docbook(self):
         """
         Return the contents of the node children.
         """
+        if self.node is None:
+            return self.docbook
         retstr = ''
         for node in self.node.getchildren():
             retstr += etree.tostring(node, pretty_print=True)
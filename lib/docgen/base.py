@@ -7,12 +7,16 @@ Base definitions
 import sys
 import os.path
 from string import Template
+from tempfile import SpooledTemporaryFile
 from datetime import datetime
 from ConfigParser import NoSectionError, NoOptionError
 from zope.interface import implements
 
 from docgen.interfaces import IXMLConfigurable, IDocumentGenerator
-from docgen.util import import_module
+from docgen.registry import lookup_factory
+from docgen.context import get_ancestor_context
+from docgen.defaults import get_defaults
+from docgen.lunid import LunIdAllocator, get_manual_lunids
 
 import logging
 import debug
@@ -20,9 +24,149 @@ log = logging.getLogger('docgen')
 
 __version__ = '$Revision$'
 
+def attribute_accessor(attrib):
+    """
+    Build a get_<attrib>() convenience accessor for an attribute.
+    """
+    def accessor(self):
+        return getattr(self, attrib)
+    accessor.__name__ = 'get_%s' % attrib
+    return accessor
+
+def children_accessor(tag):
+    """
+    Build a get_<tag>s() convenience accessor for a list of children.
+    """
+    def accessor(self):
+        return self.children[tag]
+    accessor.__name__ = 'get_%ss' % tag
+    return accessor
+
+def add_child_accessor(cls, tag):
+    """
+    Add a get_<tag>s() accessor to a class, unless the class
+    already defines its own.
+    """
+    funcname = 'get_%ss' % tag
+    if not hasattr(cls, funcname):
+        setattr(cls, funcname, children_accessor(tag))
+
+def add_attribute_accessor(cls, attrib):
+    """
+    Add a get_<attrib>() accessor to a class, unless the class
+    already defines its own.
+    """
+    funcname = 'get_%s' % attrib
+    if not hasattr(cls, funcname):
+        setattr(cls, funcname, attribute_accessor(attrib))
+
+def intern_value(value):
+    """
+    Intern attribute strings, so that the many objects that share
+    values like 'fs', 'nfs' or 'rw' share a single copy of them.
+    """
+    if type(value) is str:
+        return intern(value)
+    return value
+
+# How many times each cached view has been built, keyed by 'Class.method'
+view_builds = {}
+
+def cached_view(method):
+    """
+    Wrap a method that builds a view of the objects found below
+    an object, such as get_volumes(), so that the view is only built
+    once. Views are returned as tuples, so they can't be changed by
+    accident, and are thrown away whenever objects are added below
+    the object they belong to.
+    """
+    name = method.__name__
+    def view(self):
+        views = getattr(self, 'views', None)
+        if views is None:
+            views = self.views = {}
+        try:
+            return views[name]
+        except KeyError:
+            result = views[name] = tuple(method(self))
+            key = '%s.%s' % (self.__class__.__name__, name)
+            view_builds[key] = view_builds.get(key, 0) + 1
+            return result
+    view.__name__ = name
+    view.__doc__ = method.__doc__
+    return view
+
+def get_view_builds():
+    """
+    Return how many times each cached view has been built.
+    """
+    return view_builds.copy()
+
+def reset_view_builds():
+    view_builds.clear()
+
+class XMLConfigurableType(type):
+    """
+    Metaclass for XMLConfigurable objects.
+    Convenience accessors for attributes and children are
+    generated once, when the class is defined, from its
+    mandatory_attribs, optional_attribs and child_tags, rather
+    than for every object when it is configured.
+
+    A class that lists the rest of its instance attributes in
+    slotted_attribs is given a compact __slots__ layout, with
+    no per-object __dict__.
+    """
+    def __new__(meta, name, bases, dict):
+        if 'slotted_attribs' in dict:
+            dict['__slots__'] = meta.build_slots(bases, dict)
+        return type.__new__(meta, name, bases, dict)
+
+    def build_slots(meta, bases, dict):
+        """
+        Figure out the slots a class needs that its bases don't already have.
+        """
+        def lookup(attr):
+            if attr in dict:
+                return dict[attr]
+            for base in bases:
+                if hasattr(base, attr):
+                    return getattr(base, attr)
+            return []
+
+        have = {}
+        for base in bases:
+            for klass in getattr(base, '__mro__', [base]):
+                for slot in getattr(klass, '__slots__', ()):
+                    have[slot] = True
+
+        slots = []
+        for attrib in [ 'parent', 'children', 'views', 'ancestor_context', 'namespace' ] + lookup('mandatory_attribs') + lookup('optional_attribs') + dict['slotted_attribs']:
+            if attrib not in have and attrib not in dict:
+                have[attrib] = True
+                slots.append(attrib)
+                pass
+            pass
+        return tuple(slots)
+    build_slots = classmethod(build_slots)
+
+    def __init__(cls, name, bases, dict):
+        type.__init__(cls, name, bases, dict)
+        for attrib in cls.mandatory_attribs + cls.optional_attribs:
+            add_attribute_accessor(cls, attrib)
+            pass
+        for tag in cls.child_tags:
+            add_child_accessor(cls, tag)
+            pass
+        pass
+
 class XMLConfigurable:
+    __metaclass__ = XMLConfigurableType
     implements(IXMLConfigurable)
 
+    # Subclasses get a __dict__ unless they ask for slots
+    __slots__ = ()
+
     # A list of child tags that I have. Can be overridden by
     # a configuration file.
     child_tags = []
@@ -47,19 +191,40 @@ class XMLConfigurable:
         self.configure_mandatory_attributes(node, defaults)
         self.configure_optional_attributes(node, defaults)
         self.configure_children(node, defaults, parent)
+
+    def configure_from_attributes(self, attribs, defaults, parent):
+        """
+        Configure an object directly from a dictionary of attributes,
+        as if from a node with those attributes and no children,
+        but without building the node.
+        """
+        self.parent = parent
+        self.set_attributes(attribs)
+        self.configure_defaults(defaults)
+        self.configure_no_children(defaults)
         
-    def configure_children(self, node, defaults, parent):
-        
-        self.children = {}
+    def get_child_tags(self, defaults):
+        """
+        Find the child tags I should look for.
+        """
         # See if my child tags are set in the config file. If so,
         # they override my default set of tags.
-        #log.debug("Configuring %s", self.__class__.__name__)
         try:
-            child_tags = defaults.get('tags', '%s_known_children' % self.xmltag).split()
+            return defaults.get('tags', '%s_known_children' % self.xmltag).split()
         except NoOptionError:
             # The option isn't set in the config file, so we use
             # my default set.
-            child_tags = self.child_tags
+            return self.child_tags
+
+    def configure_children(self, node, defaults, parent):
+        
+        self.children = {}
+        #log.debug("Configuring %s", self.__class__.__name__)
+        child_tags = self.get_child_tags(defaults)
+
+        # My children find what they inherit from the nodes
+        # above them through my context while they are configured.
+        self.ancestor_context = get_ancestor_context(node, parent)
 
         # For each child tag that I know of, find the module that
         # defines it and load it in. Create the object, and then
@@ -69,37 +234,15 @@ class XMLConfigurable:
             #log.debug("adding '%s:%s' children...", self.__class__.__name__, tag)
             self.children[tag] = []
 
-            # Add convenience accessors for the children, if there isn't one
-            # already defined for the class
-            funcname = "get_%ss" % tag
-            if not hasattr(self, funcname):
-                #log.debug("Adding convenience accessor: %s", funcname)
-                # FIXME: This first version doesn't work, but the second
-                # version does. Not sure why. It seems the second one
-                # isn't actually evaluated at runtime for some reason.
-                # I don't actually want you to be able to pass in a value, though.
-                #setattr(self, funcname, lambda: self.children[tag])
-                setattr(self, funcname, lambda tag=tag: self.children[tag])
-            
+            # Child tags set in the config file may not have had
+            # an accessor added when my class was defined.
+            add_child_accessor(self.__class__, tag)
+
             # See if we have any of these child nodes defined
             child_nodes = node.findall(tag)
             if len(child_nodes) > 0:
                 #log.debug("Adding children: %s", tag)
-                module_name = 'docgen.plugins.%s' % tag
-                # Try loading it from plugin modules first
-                try:
-                    module = import_module(module_name)
-                except (AttributeError, ImportError), e:
-                    #log.debug("Plugin module load failed: %s, trying core modules...", e)
-                    # If it didn't work, try the core area
-                    module_name = 'docgen.%s' % tag
-                    try:
-                        module = import_module(module_name)
-                    except (AttributeError, ImportError):
-                        raise ImportError("Can't find module %s for %s child tag '%s'" % ( module_name, self.__class__.__name__, tag) )
-                    pass
-
-                create_func = getattr(module, 'create_%s_from_node' % tag)
+                create_func = lookup_factory(tag, self)
                 for childnode in child_nodes:
                     child = create_func(childnode, defaults, self)
                     self.children[tag].append(child)
@@ -107,7 +250,24 @@ class XMLConfigurable:
 
                 pass
             pass
-        pass
+
+        # Any views of my children built while they were
+        # being configured are out of date.
+        self.views = None
+        self.ancestor_context = None
+
+    def configure_no_children(self, defaults):
+        """
+        Set up empty lists of children, for an object that
+        isn't configured from a node.
+        """
+        self.children = {}
+        for tag in self.get_child_tags(defaults):
+            self.children[tag] = []
+            add_child_accessor(self.__class__, tag)
+            pass
+        self.views = None
+        self.ancestor_context = None
 
     def configure_mandatory_attributes(self, node, defaults):
         """
@@ -116,13 +276,8 @@ class XMLConfigurable:
         accessing them.
         """
         for attrib in self.mandatory_attribs:
-            # Add convenience accessors
-            funcname = "get_%s" % attrib
-            #log.debug("Adding convenience accessor: %s", funcname)
-            setattr(self, funcname, lambda: getattr(self, attrib) )
-
             try:
-                setattr(self, attrib, node.attrib[attrib])
+                setattr(self, attrib, intern_value(node.attrib[attrib]))
             except KeyError, e:
                 raise KeyError("'%s' node mandatory attribute '%s' not set" % (self.xmltag, attrib))
 
@@ -133,17 +288,36 @@ class XMLConfigurable:
         accessing them.
         """
         for attrib in self.optional_attribs:
-            # Add convenience accessors
-            funcname = "get_%s" % attrib
-            #log.debug("Adding convenience accessor: %s", funcname)
-            setattr(self, funcname, lambda: getattr(self, attrib) )
-
             try:
-                setattr(self, attrib, node.attrib[attrib])
+                setattr(self, attrib, intern_value(node.attrib[attrib]))
             except KeyError:
                 setattr(self, attrib, None)
                 pass
 
+    def set_attributes(self, attribs):
+        """
+        Set my attributes from a dictionary, rather than
+        from the attributes of a node.
+        """
+        for attrib in self.mandatory_attribs:
+            if attribs.get(attrib) is None:
+                raise KeyError("'%s' mandatory attribute '%s' not set" % (self.xmltag, attrib))
+            pass
+        for attrib in attribs:
+            if attrib not in self.mandatory_attribs and attrib not in self.optional_attribs:
+                raise KeyError("'%s' has no attribute '%s'" % (self.xmltag, attrib))
+            pass
+        for attrib in self.mandatory_attribs + self.optional_attribs:
+            setattr(self, attrib, intern_value(attribs.get(attrib)))
+            pass
+
+    def configure_defaults(self, defaults):
+        """
+        Work out the attributes that weren't set, once the others
+        have been, from either a node or a dictionary.
+        """
+        pass
+
     def add_child(self, obj):
         """
         Add a child object to myself.
@@ -153,24 +327,107 @@ class XMLConfigurable:
             raise ValueError("%s is not a valid child of %s" % (obj, self) )
 
         self.children[obj.xmltag].append(obj)
+        self.child_added(obj)
+
+    def child_added(self, obj):
+        """
+        Let my ancestors know that an object has been added
+        somewhere underneath me, so their views are out of date.
+        """
+        self.views = None
+        parent = getattr(self, 'parent', None)
+        if parent is not None:
+            parent.child_added(obj)
+
+    def clear_views(self):
+        """
+        Throw away the cached views of myself and everything below me.
+        """
+        self.views = None
+        for children in getattr(self, 'children', {}).values():
+            if type(children) is not list:
+                continue
+            for child in children:
+                # Only descend into my own children, not objects
+                # I merely refer to, like drhosts.
+                if getattr(child, 'parent', None) is self:
+                    child.clear_views()
+                    pass
+                pass
+            pass
     
-class DynamicNaming:
+class DynamicNaming(object):
     """
     A Mixin class used for doing dynamic naming
     using naming conventions loaded in from a
     defaults configuration file.
+
+    Each object keeps its namespace, with the names from all the
+    objects above it, once it has been built. An object only adds
+    its own names, from get_namespace_frame(), to a copy of its
+    parent's, so it doesn't have to walk all the way up every time
+    something below it is named. Everyone who asks for a namespace
+    gets their own copy of it to add to.
     """
-    def populate_namespace(self, ns={}):
+    __slots__ = ()
+
+    def populate_namespace(self, ns=None):
+        """
+        Get a namespace with the names to be found at this
+        level and all those above it, and any names in the
+        namespace passed in that those don't already have.
+        The namespace returned is a copy, so it can be added
+        to without changing anyone else's.
+        """
+        namespace = self.get_namespace()
+        if ns:
+            ns = dict(ns)
+            ns.update(namespace)
+            return ns
+        return dict(namespace)
+
+    def get_namespace(self):
+        """
+        Get my cached namespace, building it if need be.
+        It must not be changed.
+        """
+        namespace = getattr(self, 'namespace', None)
+        if namespace is None:
+            if self.parent is not None:
+                namespace = dict(self.parent.get_namespace())
+            else:
+                namespace = {}
+                pass
+            namespace.update(self.get_namespace_frame())
+
+            # Until I'm named, my names may still change
+            if getattr(self, 'name', None) is not None:
+                self.namespace = namespace
+                pass
+            pass
+        return namespace
+
+    def get_namespace_frame(self):
+        """
+        The names I add to my parent's namespace.
         """
-        Take a namespace passed in (or a blank one)
-        and add any extra bits to be found at this
-        level to the namespace.
+        return {}
+
+    def clear_namespace(self):
+        """
+        Throw away the cached namespaces of myself and everything
+        below me, after something they are built from has changed.
         """
-        if self.parent is not None:
-            log.debug("my parent is: %s", self.parent)
-            ns = self.parent.populate_namespace(ns)
+        self.namespace = None
+        for children in getattr(self, 'children', {}).values():
+            if type(children) is not list:
+                continue
+            for child in children:
+                if getattr(child, 'parent', None) is self and hasattr(child, 'clear_namespace'):
+                    child.clear_namespace()
+                    pass
+                pass
             pass
-        return ns
 
     def name_dynamically(self, defaults):
         """
@@ -195,6 +452,8 @@ class DynamicNamedXMLConfigurable(XMLConfigurable, DynamicNaming):
     """
     A combined class that is XMLConfigurable, and can do DynamicNaming
     """
+    __slots__ = ()
+
     def configure_from_node(self, node, defaults, parent):
         """
         Configure an object from its XML node
@@ -209,9 +468,25 @@ class DynamicNamedXMLConfigurable(XMLConfigurable, DynamicNaming):
         self.configure_optional_attributes(node, defaults)
 
         self.name_dynamically(defaults)
-        
+        # Anything cached while I was being named is out of date
+        self.namespace = None
+
         self.configure_children(node, defaults, parent)
 
+    def configure_from_attributes(self, attribs, defaults, parent):
+        """
+        Configure an object directly from a dictionary of attributes,
+        naming it if it isn't given a name.
+        """
+        self.parent = parent
+        self.set_attributes(attribs)
+        self.configure_defaults(defaults)
+
+        self.name_dynamically(defaults)
+        self.namespace = None
+
+        self.configure_no_children(defaults)
+
 
 class FileOutputMixin:
     """
@@ -534,28 +809,50 @@ ${abstract}
   </preface>
 ''')
     
+    # How much of the book content to hold in memory before
+    # spooling it to disk, and how much to write out at a time.
+    spool_size = 1024 * 1024
+    spool_chunk_size = 64 * 1024
+
     def __init__(self, project, defaults):
         self.project = project
-        self.defaults = defaults
+        self.defaults = get_defaults(defaults)
 
     def emit(self, outfile=None, ns={}):
         """
         Write out the book XML to a File object, defaulting to STDOUT.
         """
-        ns['copyright_holder'] = self.defaults.get('global', 'copyright_holder')
-        ns['iscsi_prefix'] = self.defaults.get('global', 'iscsi_prefix')
+        ns['copyright_holder'] = self.defaults.global_.copyright_holder
+        ns['iscsi_prefix'] = self.defaults.global_.iscsi_prefix
 
-        book = self.build_book(ns)
         if outfile is None:
-            sys.stdout.write(book)
+            outfile = sys.stdout
+            pass
+
+        # The book is written out a piece at a time, so the
+        # whole book is never held in memory at once.
+        for fragment in self.iter_book(ns):
+            outfile.write(fragment)
             pass
-        else:
-            outfile.write(book)
 
     def build_book(self, ns={}):
         """
         Build up a book from its component elements.
         """
+        return ''.join(self.iter_book(ns))
+
+    def iter_book(self, ns={}):
+        """
+        Build up a book from its component elements, yielding
+        each part of it in turn.
+
+        The head of the book declares entities for values, such as
+        the primary project VLAN, that builders may only add to the
+        namespace while building the content. So the content is built
+        first and spooled, in memory while it is small and on disk
+        after that, and the head is only filled in once every builder
+        has run.
+        """
         if not ns.has_key('title'):
             ns['title'] = 'DocGen Automated Document'
             
@@ -564,8 +861,37 @@ ${abstract}
         ns['project_code'] = getattr(self.project, 'code', '')
         ns['vfiler_name'] = getattr(self.project, 'name', '')
 
-        ns['book_content'] = self.build_book_content(ns)
-        return self.bookstr.safe_substitute( ns )
+        head, tail = self.bookstr.template.split('$book_content', 1)
+        spool = SpooledTemporaryFile(max_size=self.spool_size)
+        try:
+            for fragment in self.iter_book_content(ns):
+                spool.write(fragment)
+                pass
+
+            yield Template(head).safe_substitute(ns)
+            spool.seek(0)
+            while True:
+                fragment = spool.read(self.spool_chunk_size)
+                if not fragment:
+                    break
+                yield fragment
+                pass
+            yield Template(tail).safe_substitute(ns)
+        finally:
+            spool.close()
+
+    def iter_fragments(self, content):
+        """
+        Builders may return their content as a single string,
+        or yield it a piece at a time.
+        """
+        if isinstance(content, basestring):
+            yield content
+        else:
+            for fragment in content:
+                yield fragment
+                pass
+            pass
 
     def build_bookinfo(self, ns={}):
         """
@@ -619,13 +945,18 @@ ${abstract}
         return "<abstract><para>This is a computer generated document.</para></abstract>"
 
     def build_book_content(self, ns={}):
-        book_content = ''
-        book_content += self.build_bookinfo(ns)
-        book_content += self.build_preface(ns)
-        book_content += self.build_chapters(ns)
-        book_content += self.build_appendices(ns)
-
-        return book_content
+        return ''.join(self.iter_book_content(ns))
+
+    def iter_book_content(self, ns={}):
+        for builder in [ self.build_bookinfo,
+                         self.build_preface,
+                         self.build_chapters,
+                         self.build_appendices,
+                         ]:
+            for fragment in self.iter_fragments(builder(ns)):
+                yield fragment
+                pass
+            pass
 
     def build_preface(self, ns={}):
         content = self.build_document_control(ns)
@@ -658,37 +989,48 @@ ${abstract}
 
         return self.doc_control.safe_substitute(ns)
     
-class LunNumbering:
+class LunNumbering(object):
     """
-    A Mixin class that is used to implement an upwards cascade of
-    LUN numbering grouping, so that LUNs can be numbered sequentially
-    within a whole project, or by site, filer, aggregate, or volume.
+    A Mixin class for the objects that LUNs can be numbered within,
+    so that LUNs can be numbered sequentially within a whole project,
+    or by site, filer, aggregate, or volume.
+    Each one keeps the L{LunIdAllocator} for the LUNs below it.
     """
-    def get_next_lunid(self, defaults):
+    __slots__ = ()
+
+    def get_lunid_allocator(self, defaults):
         """
-        Get the next available lunid for the volume
+        Get the allocator that numbers the LUNs below me, working
+        out whether it is my own or one from above me the first
+        time I'm asked.
         """
-        try:
-            numberby = defaults.get('lun', 'lun_numbering')
-            log.debug("numbering LUNs by: %s", numberby)
-            if numberby == self.xmltag:
-                value = self.current_lunid
-                self.current_lunid += 1
-                return value
+        if self.lunid_allocator is None:
+            if get_defaults(defaults).lun.lun_numbering == self.xmltag:
+                self.lunid_allocator = self.make_lunid_allocator()
             else:
-                return self.parent.get_next_lunid(defaults)
-            
-        except (NoSectionError, NoOptionError):
-            return self.parent.get_next_lunid(defaults)
+                self.lunid_allocator = self.parent.get_lunid_allocator(defaults)
+                pass
+            pass
+        return self.lunid_allocator
+
+    def make_lunid_allocator(self):
+        """
+        Make an allocator for the LUNs below me, reserving the ids
+        of those numbered by hand if I'm being configured from a node.
+        """
+        allocator = LunIdAllocator(self)
+        context = getattr(self, 'ancestor_context', None)
+        if context is not None:
+            allocator.reserve(get_manual_lunids(context.node))
+            pass
+        return allocator
+
+    def get_next_lunid(self, defaults):
+        """
+        Get the next available lunid for a LUN below me
+        """
+        return self.get_lunid_allocator(defaults).allocate()
                 
     def set_current_lunid(self, value, defaults):
-        try:
-            numberby = defaults.get('lun', 'lun_numbering')
-            if numberby == self.xmltag:
-                self.current_lunid = value
-            else:
-                self.parent.set_current_lunid(value, defaults)
-                pass
-        except (NoSectionError, NoOptionError):
-            return self.parent.get_next_lunid(defaults)
+        self.get_lunid_allocator(defaults).restart(value)
 
@@ -0,0 +1,197 @@
+# $Id$
+#
+
+"""
+Build the documents for many project definitions at once.
+
+Each project definition is loaded, and its documents created, in a
+worker process from a pool, so a directory full of definitions is
+built using all the processors available. A failure in one project
+is reported in its result, and doesn't stop the rest being built.
+Documents are written next to their definition, named the same way
+build_project_docs.sh names them.
+"""
+import os
+import os.path
+import sys
+import glob
+import time
+import traceback
+from ConfigParser import RawConfigParser
+
+from docgen.util import load_doc_plugins
+from docgen.loader import load_definition
+
+import debug
+import logging
+log = logging.getLogger('docgen')
+
+DEFINITION_SUFFIX = '.project-definition.xml'
+
+# The file name endings build_project_docs.sh uses for each doctype.
+# Other doctypes just have the doctype added to the project name.
+OUTPUT_SUFFIXES = {
+    'ipsan-storage-design': 'IPSAN-storage-design.xml',
+    'ipsan-network-design': 'IPSAN-network-design.xml',
+    'netapp-commands': 'IPSAN-storage-commands.txt',
+    }
+
+# The phases of loading a project that are timed, before creating each document
+LOAD_PHASES = [ 'cache', 'parse', 'configure', 'setup' ]
+
+def find_definitions(paths):
+    """
+    Find the project definition files to build.
+    @param paths: directories, which are searched for *.project-definition.xml
+    files, and filenames or glob patterns
+    @returns: a list of definition files, in the order they were found
+    """
+    definitions = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = glob.glob(os.path.join(path, '*' + DEFINITION_SUFFIX))
+        else:
+            found = glob.glob(path)
+            pass
+        for filename in sorted(found):
+            if filename not in definitions:
+                definitions.append(filename)
+                pass
+            pass
+        pass
+    return definitions
+
+def get_outfile(definitionfile, doctype):
+    """
+    Where to write a document created from a definition file.
+    """
+    basedir = os.path.dirname(definitionfile)
+    filename = os.path.basename(definitionfile)
+    if filename.endswith(DEFINITION_SUFFIX):
+        project_name = filename[:-len(DEFINITION_SUFFIX)]
+    else:
+        project_name = os.path.splitext(filename)[0]
+        pass
+    suffix = OUTPUT_SUFFIXES.get(doctype, doctype)
+    return os.path.join(basedir, '%s.%s' % (project_name, suffix))
+
+class BuildResult:
+    """
+    What happened when one project was built.
+    """
+    def __init__(self, definitionfile):
+        self.definitionfile = definitionfile
+        # A list of (phase, seconds) tuples, in the order they were run
+        self.timings = []
+        self.outfiles = []
+        self.error = None
+
+    def failed(self):
+        return self.error is not None
+
+    def get_total(self):
+        return sum([ x[1] for x in self.timings ])
+
+def build_project(job):
+    """
+    Load a project definition and create its documents.
+    This is run in the worker processes, so it never raises
+    an exception; errors are recorded in the result instead.
+    @param job: a (definitionfile, configfile, doctypes, streaming, use_cache) tuple
+    @returns: a L{BuildResult}
+    """
+    definitionfile, configfile, doctypes, streaming, use_cache = job
+    result = BuildResult(definitionfile)
+    phase = 'load'
+    try:
+        defaults = RawConfigParser()
+        parsedfiles = defaults.read(configfile)
+        if len(parsedfiles) == 0:
+            raise ValueError("Cannot load configuration file: %s" % configfile)
+        doc_plugins = load_doc_plugins(defaults)
+        proj = load_definition(definitionfile, defaults, parsedfiles, streaming=streaming,
+                               use_cache=use_cache, timings=result.timings)
+
+        for phase in doctypes:
+            start = time.time()
+            outfile = get_outfile(definitionfile, phase)
+            docgen = doc_plugins[phase](proj, defaults)
+            outf = open(outfile, 'w')
+            try:
+                docgen.emit(outf, ns={})
+            finally:
+                outf.close()
+            result.outfiles.append(outfile)
+            result.timings.append( (phase, time.time() - start) )
+            pass
+
+    except Exception, e:
+        result.error = "%s failed:\n%s" % (phase, traceback.format_exc())
+        pass
+    return result
+
+def build_projects(definitions, configfile, doctypes, processes=None, streaming=False, use_cache=True):
+    """
+    Build a set of project definitions using a pool of processes.
+    @param processes: how many worker processes to use. The default
+    is one for each processor. With a single process, projects
+    are built one after another, without a pool.
+    @returns: a list of L{BuildResult}s, in the same order as the definitions
+    """
+    jobs = [ (x, configfile, doctypes, streaming, use_cache) for x in definitions ]
+    if processes == 1 or len(jobs) <= 1:
+        return [ build_project(x) for x in jobs ]
+
+    import multiprocessing
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(build_project, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+def format_summary(results, doctypes, elapsed):
+    """
+    A table of how long each project, and each phase of building
+    it, took, with totals and any failures at the end.
+    @param elapsed: how long the whole batch took
+    """
+    phases = LOAD_PHASES + list(doctypes)
+    width = max([ len(os.path.basename(x.definitionfile)) for x in results ] + [ len('project') ])
+    lines = []
+    columns = [ '%-*s' % (width, 'project') ] + [ ' %12s' % x[:12] for x in phases ] + [ ' %10s' % 'total', ' status' ]
+    lines.append(''.join(columns))
+
+    phase_totals = dict([ (x, 0.0) for x in phases ])
+    for result in results:
+        timings = dict(result.timings)
+        columns = [ '%-*s' % (width, os.path.basename(result.definitionfile)) ]
+        for phase in phases:
+            if phase in timings:
+                phase_totals[phase] += timings[phase]
+                columns.append(' %11.3fs' % timings[phase])
+            else:
+                columns.append(' %12s' % '-')
+                pass
+            pass
+        columns.append(' %9.3fs' % result.get_total())
+        if result.failed():
+            columns.append(' FAILED')
+        else:
+            columns.append(' ok')
+            pass
+        lines.append(''.join(columns))
+        pass
+
+    columns = [ '%-*s' % (width, 'total') ] + [ ' %11.3fs' % phase_totals[x] for x in phases ]
+    columns.append(' %9.3fs' % sum(phase_totals.values()))
+    lines.append(''.join(columns))
+
+    failures = [ x for x in results if x.failed() ]
+    lines.append("%d projects built, %d failed, in %.3fs" % (len(results) - len(failures), len(failures), elapsed))
+    for result in failures:
+        lines.append('')
+        lines.append("%s: %s" % (result.definitionfile, result.error))
+        pass
+    return '\n'.join(lines)
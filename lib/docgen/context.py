@@ -0,0 +1,275 @@
+# $Id$
+#
+
+"""
+What a node inherits from the nodes above it in a definition.
+
+Some settings are found by looking back up the definition tree from
+the node being configured. Volumes without a protocol of their own
+take the first one given to a vfiler above them, as in:
+
+  ancestor::*/vfiler/protocol/text()
+
+and the mountoptions a host uses for a qtree are those given to
+exports to that host on the qtree or any node above it:
+
+  ancestor-or-self::*/export[@to = $host]/mountoption
+
+Running XPath like this for every volume, and for every host and
+qtree pair, gets slow for large projects. Instead, an AncestorContext
+is handed down while configure_children() descends the tree. Each
+one knows its parent's context, and the vfilers and exports among the
+children of a node are found once, the first time they are needed,
+so the answers come from a few short lists and dictionaries.
+
+The answers are the same as the XPath ones, including the document
+order of the results: things that come before the path down to the
+node come first, outermost first, and things that come after it
+come last, innermost first.
+"""
+import debug
+import logging
+log = logging.getLogger('docgen')
+
+class ChildLayout:
+    """
+    The protocols and mountoptions among the children of a
+    node, and where they are.
+
+    Each one has the position of the child it is in, so it can be
+    put before or after the path down to a node. Those found in
+    the node itself, rather than in its children, are also kept
+    apart, because they are only counted when the node is itself
+    one that is being looked for, such as a vfiler of an ancestor.
+    """
+    def __init__(self, node=None):
+        self.positions = {}
+        # (position, protocol text)
+        self.protocols = []
+        self.inner_protocols = []
+        # (position, hostname, mountoptions)
+        self.exports = []
+        if node is None:
+            return
+
+        parent = node.getparent()
+        # A vfiler of an ancestor, whose protocols count
+        is_vfiler = node.tag == 'vfiler' and parent is not None
+        # A protocol of such a vfiler, whose text counts
+        is_protocol = node.tag == 'protocol' and parent is not None \
+                      and parent.tag == 'vfiler' and parent.getparent() is not None
+        # An export of an ancestor, whose mountoptions count
+        is_export = node.tag == 'export' and 'to' in node.attrib and parent is not None
+
+        if is_protocol and node.text is not None:
+            self.add_inner_protocol(-1, node.text)
+            pass
+
+        for position, child in enumerate(node):
+            self.positions[child] = position
+            if child.tag == 'vfiler':
+                text = get_first_protocol(child)
+                if text is not None:
+                    self.protocols.append( (position, text) )
+                    pass
+
+            elif child.tag == 'protocol' and is_vfiler:
+                text = get_first_text(child)
+                if text is not None:
+                    self.add_inner_protocol(position, text)
+                    pass
+
+            elif child.tag == 'export' and 'to' in child.attrib:
+                mountoptions = [ x.text for x in child.iterchildren('mountoption') ]
+                if len(mountoptions) > 0:
+                    self.exports.append( (position, child.attrib['to'], mountoptions) )
+                    pass
+
+            elif child.tag == 'mountoption' and is_export:
+                # The mountoption comes before anything inside it
+                self.exports.append( (position - 0.5, node.attrib['to'], [ child.text ]) )
+                pass
+
+            # Text after a child of a protocol is still its text
+            if is_protocol and child.tail is not None:
+                self.add_inner_protocol(position + 0.5, child.tail)
+                pass
+            pass
+
+    def add_inner_protocol(self, position, text):
+        self.protocols.append( (position, text) )
+        self.inner_protocols.append( (position, text) )
+
+def get_first_text(node):
+    """
+    Find the first text in a node, as text()[0] would.
+    """
+    if node.text is not None:
+        return node.text
+    # Text after a comment or other child is still text of the node
+    for child in node:
+        if child.tail is not None:
+            return child.tail
+        pass
+    return None
+
+def get_first_protocol(vfilernode):
+    """
+    Find the first protocol text in a vfiler, as
+    vfiler/protocol/text()[0] would.
+    """
+    for protocol in vfilernode.iterchildren('protocol'):
+        text = get_first_text(protocol)
+        if text is not None:
+            return text
+        pass
+    return None
+
+class AncestorContext:
+    """
+    The context of a node in the definition.
+    """
+    def __init__(self, node, parent=None):
+        """
+        @param node: the definition node
+        @param parent: the context of the node's parent, if it has one
+        """
+        self.node = node
+        self.parent = parent
+        self.layout = None
+
+    def child_context(self, childnode):
+        """
+        Make the context for one of my node's children.
+        """
+        return AncestorContext(childnode, self)
+
+    def get_layout(self):
+        """
+        Find the protocols and mountoptions among my node's children.
+        Most nodes have none, so they share an empty layout.
+        """
+        if self.layout is None:
+            self.layout = EMPTY_LAYOUT
+            if self.node.tag in LAYOUT_TAGS:
+                self.layout = ChildLayout(self.node)
+            else:
+                for child in self.node.iterchildren(*LAYOUT_TAGS):
+                    self.layout = ChildLayout(self.node)
+                    break
+                pass
+            pass
+        return self.layout
+
+    def get_ancestors(self):
+        """
+        @returns: a (layout, position) pair for each ancestor of my node,
+        outermost first. The position is that of the child on the
+        way down to my node.
+        """
+        ancestors = []
+        context = self
+        while context.parent is not None:
+            layout = context.parent.get_layout()
+            if layout is not EMPTY_LAYOUT:
+                ancestors.append( (layout, layout.positions[context.node]) )
+                pass
+            context = context.parent
+            pass
+        ancestors.reverse()
+        return ancestors
+
+    def get_vfiler_protocol(self):
+        """
+        Find the protocol a volume at my node inherits from the
+        vfilers above it, as ancestor::*/vfiler/protocol/text()[0]
+        would, or None if there isn't one.
+        """
+        ancestors = self.get_ancestors()
+        for layout, position in ancestors:
+            for protocol_position, text in layout.protocols:
+                if protocol_position < position:
+                    return text
+                break
+            pass
+
+        # Protocols inside my node come after those before it
+        for protocol_position, text in self.get_layout().inner_protocols:
+            return text
+
+        ancestors.reverse()
+        for layout, position in ancestors:
+            for protocol_position, text in layout.protocols:
+                if protocol_position > position:
+                    return text
+                pass
+            pass
+        return None
+
+    def get_export_mountoptions(self):
+        """
+        Find the mountoptions given to each host at or above my
+        node, as ancestor-or-self::*/export[@to]/mountoption would.
+        @returns: a dictionary of lists of mountoptions, keyed by hostname
+        """
+        ancestors = self.get_ancestors()
+        exports = []
+        for layout, position in ancestors:
+            exports.extend([ x for x in layout.exports if x[0] < position ])
+            pass
+
+        exports.extend(self.get_layout().exports)
+
+        ancestors.reverse()
+        for layout, position in ancestors:
+            exports.extend([ x for x in layout.exports if x[0] > position ])
+            pass
+
+        table = {}
+        for position, hostname, mountoptions in exports:
+            table.setdefault(hostname, []).extend(mountoptions)
+            pass
+        return table
+
+EMPTY_LAYOUT = ChildLayout()
+LAYOUT_TAGS = ( 'vfiler', 'protocol', 'export' )
+
+def get_tree_context(node):
+    """
+    Make the context for a node from the tree it is in.
+    """
+    path = [ node ]
+    path.extend(node.iterancestors())
+    path.reverse()
+    context = None
+    for pathnode in path:
+        context = AncestorContext(pathnode, context)
+        pass
+    return context
+
+def get_streamed_context(node, exports):
+    """
+    Make the context for the root of a definition that is read
+    one child at a time, so its children are never all in the tree
+    at once. The exports among them are found beforehand, and the
+    position of each child has to be added to the layout's positions
+    while the child is being configured.
+    @param exports: a list of (position, hostname, mountoptions)
+    """
+    context = AncestorContext(node)
+    context.layout = ChildLayout()
+    context.layout.exports = exports
+    return context
+
+def get_ancestor_context(node, parent):
+    """
+    Find the context for a node being configured.
+    If the parent object is configuring its children, the context
+    comes from the parent's, otherwise it is found from the tree.
+    @param node: the definition node
+    @param parent: the object the node's object belongs to, or None
+    """
+    context = getattr(parent, 'ancestor_context', None)
+    if context is not None and context.node is node.getparent():
+        return context.child_context(node)
+    return get_tree_context(node)
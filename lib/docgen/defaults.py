@@ -0,0 +1,199 @@
+# $Id$
+#
+
+"""
+The defaults from docgen.conf, read once.
+
+Configuring a project looks up the same options from the defaults
+over and over again: several for every volume, and one for every
+level of the parent chain for every LUN. Each lookup goes through
+RawConfigParser, converting the value from text every time, and
+many of them catch NoSectionError or NoOptionError as a normal way
+of finding out that an optional setting isn't there.
+
+A Defaults object reads the options for the sections the model uses
+once, when it is built, and keeps them as typed attributes of an
+object for each section, such as:
+
+  defaults.volume.default_size
+  defaults.lun.lun_numbering
+
+The [global] section is global_, because global is a Python keyword.
+
+Looking these up never raises. If an option that should be set
+isn't, a warning is logged when the defaults are loaded and a
+sensible value is used instead, rather than failing part way
+through configuring the project. A value that can't be converted
+raises a ValueError when the defaults are loaded.
+
+Everything else, such as the document plugins or the site sections,
+is still looked up from the RawConfigParser the Defaults was built
+from, through the usual get(), getint(), items() and so on.
+
+The Defaults is a snapshot, so build a new one if the configuration
+is changed after it has been read.
+"""
+from keyword import iskeyword
+from ConfigParser import NoSectionError, NoOptionError
+
+import debug
+import logging
+log = logging.getLogger('docgen')
+
+# For each section, the options the model uses, as
+# (option, RawConfigParser getter, fallback value, required)
+# Required options are documented in docgen.conf.example, and a
+# warning is logged if one is missing. The others are optional,
+# and quietly take the fallback value.
+DEFAULTS_SPEC = {
+    'global': [
+        ('copyright_holder', 'get', '', True),
+        ('iscsi_prefix', 'get', 'docgen', True),
+        ('compact_model', 'getboolean', False, False),
+        ],
+
+    'volume': [
+        ('volume_name', 'get', '%(filer_name)s_%(vfiler_name)s_%(voltype)s_%(volnum)02d', True),
+        ('default_vol_type', 'get', 'fs', True),
+        ('default_size', 'getfloat', 100.0, True),
+        ('default_snapreserve', 'getint', 20, True),
+        ('default_highdelta_snapreserve', 'getint', 50, True),
+        ('default_iscsi_snapspace', 'getint', 30, True),
+        ('filer_space_guarantee_default', 'get', 'volume', True),
+        ('nearstore_space_guarantee_default', 'get', 'none', True),
+        ('default_options', 'get', 'nvfail=on,create_ucode=on,convert_ucode=on', True),
+        ('high_delta_types', 'get', '', False),
+        ('iscsi_snapspace', 'getint', 0, False),
+        ('allow_volume_export', 'getboolean', False, False),
+        ],
+
+    'vfiler': [
+        ('vfiler_name', 'get', 'vf%(project_name)s', True),
+        ('root_volume_usable', 'getfloat', 0.02, True),
+        ('root_volume_snapreserve', 'getint', 20, True),
+        ('backup_root_volume', 'getboolean', False, True),
+        ('default_root_aggregate', 'get', None, False),
+        ('root_volume_name', 'get', None, False),
+        ('default_dns_domain', 'get', None, False),
+        ],
+
+    'lun': [
+        ('lun_name', 'get', '%(vfiler_name)s.lun%(lunid)02d', True),
+        # If not set, LUNs are numbered across the whole project
+        ('lun_numbering', 'get', None, False),
+        ],
+
+    'igroup': [
+        ('igroup_name', 'get', '%(project_name)s%(igroup_number)02d', True),
+        ],
+
+    'nfs': [
+        ('export_security', 'getboolean', True, False),
+        ('subnet_exports', 'getboolean', False, False),
+        ('netgroup_exports', 'getboolean', False, False),
+        ],
+
+    'snapvault': [
+        ('multiplier', 'getfloat', 2.5, False),
+        ('volsuffix', 'get', 'b', False),
+        ('source_name', 'get', None, False),
+        ],
+
+    'snapmirror': [
+        ('multiplier', 'getfloat', 2.5, False),
+        ('volsuffix', 'get', 'b', False),
+        ('source_name', 'get', None, False),
+        ],
+    }
+
+class DefaultsSection:
+    """
+    The typed options of one section of the defaults.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return '<DefaultsSection: %s>' % self.name
+
+class Defaults:
+    """
+    A typed snapshot of the defaults.
+    """
+    def __init__(self, config):
+        """
+        @param config: the RawConfigParser the defaults were read into
+        """
+        self.config = config
+        self.missing = []
+        for section, options in sorted(DEFAULTS_SPEC.items()):
+            if iskeyword(section):
+                setattr(self, section + '_', self.read_section(section, options))
+            else:
+                setattr(self, section, self.read_section(section, options))
+                pass
+            pass
+
+        # Parse the default volume options now, so a bad one
+        # is found when the defaults are loaded.
+        self.volume.default_options = parse_volume_options(self.volume.default_options)
+        self.volume.high_delta_types = parse_list(self.volume.high_delta_types)
+
+    def read_section(self, section, options):
+        """
+        Read the options for a section, converting each one.
+        """
+        sectobj = DefaultsSection(section)
+        for option, getter, fallback, required in options:
+            try:
+                value = getattr(self.config, getter)(section, option)
+            except (NoSectionError, NoOptionError):
+                if required:
+                    log.warn("Option '%s' not set in section [%s] of the defaults. Using '%s'.", option, section, fallback)
+                    self.missing.append( (section, option) )
+                    pass
+                value = fallback
+            except ValueError, e:
+                raise ValueError("Option '%s' in section [%s] of the defaults is not valid: %s" % (option, section, e))
+            setattr(sectobj, option, value)
+            pass
+        return sectobj
+
+    def __getattr__(self, name):
+        """
+        Anything else is looked up from the RawConfigParser.
+        """
+        if name == 'config' or name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.config, name)
+
+def parse_volume_options(text):
+    """
+    Split a comma separated list of volume options.
+    @returns: a list of (name, value) pairs
+    """
+    options = []
+    for opt in text.split(','):
+        try:
+            name, value = opt.split('=')
+        except ValueError:
+            raise ValueError("Volume option '%s' is not of the form name=value" % opt)
+        options.append( (name, value) )
+        pass
+    return options
+
+def parse_list(text):
+    """
+    Split a comma separated list of names.
+    @returns: a list of the names, without any blank ones
+    """
+    return [ x.strip() for x in text.split(',') if x.strip() ]
+
+def get_defaults(config):
+    """
+    Get the Defaults for a configuration.
+    @param config: a Defaults, or a RawConfigParser to build one from
+    """
+    if isinstance(config, Defaults):
+        return config
+    return Defaults(config)
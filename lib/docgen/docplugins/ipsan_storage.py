@@ -8,10 +8,10 @@ import textwrap
 
 from datetime import datetime
 from zope.interface import Interface
-from string import Template
 from lxml import etree
 
 from docgen.base import DocBookGenerator
+from docgen.template import SectionTemplate, Loop, row_template
 from netapp_commands import NetAppCommandsGenerator
 
 import logging
@@ -26,7 +26,7 @@ class IPSANStorageDesignGenerator(DocBookGenerator):
     document for the IP-SAN.
     """
 
-    introduction = Template('''
+    introduction = SectionTemplate('''
   <chapter>
     <title>Introduction</title>
     <para>This document provides an IP-SAN design for the project &project.title;.</para>
@@ -64,7 +64,7 @@ class IPSANStorageDesignGenerator(DocBookGenerator):
  </chapter>
 ''')
 
-    assumptions = Template('''<section>
+    assumptions = SectionTemplate('''<section>
     <title>Assumptions</title>
   <para>This storage design assumes the following:</para>
   <para>
@@ -85,7 +85,7 @@ class IPSANStorageDesignGenerator(DocBookGenerator):
   </para>
 </section>''')
 
-    scope = Template('''<section>
+    scope = SectionTemplate('''<section>
     <title>Scope</title>
     <para>This document is limited to the NFS, CIFS and iSCSI based storage
     needs for the &project.title; project, and this document provides
@@ -115,7 +115,7 @@ class IPSANStorageDesignGenerator(DocBookGenerator):
   </section>
 ''')
 
-    how_to_use = Template('''
+    how_to_use = SectionTemplate('''
     <section>
       <title>How To Use This Document</title>
       <para>This document assumes the existence of an associated Customer Network Storage
@@ -136,7 +136,7 @@ the host activation guides.
   </section>
   ''')
 
-    typographical_conventions = Template('''
+    typographical_conventions = SectionTemplate('''
     <section>
       <title>Typographical Conventions</title>
       <para>The following typographical conventions are used within this document:
@@ -177,22 +177,22 @@ the host activation guides.
 
     def __init__(self, project, defaults):
         DocBookGenerator.__init__(self, project, defaults)
-        self.command_gen = NetAppCommandsGenerator(project, defaults)
+        self.command_gen = NetAppCommandsGenerator(project, self.defaults)
     
     def build_chapters(self, ns={}):
-        book_content = ''
-        book_content += self.build_introduction(ns)
-        book_content += self.build_design_chapter(ns)
-
-        return book_content
+        yield self.build_introduction(ns)
+        for fragment in self.iter_design_chapter(ns):
+            yield fragment
+            pass
 
     def build_appendices(self, ns={}):
         """
         Return some appendix information
         """
-        content = self.build_activation_section(ns)
+        for fragment in self.iter_activation_section(ns):
+            yield fragment
+            pass
         #content += self.build_document_control(ns)
-        return content
 
     def build_introduction(self, ns={}):
 
@@ -234,44 +234,46 @@ the host activation guides.
         """
         The design chapter is where the bulk of the design goes.
         """
-        chapter = Template('''
-  <chapter>
-    <title>Storage Design and Configuration</title>
-    $topology_section
-    $resource_sharing_section
-    $operational_maintenance_section
-    $connectivity_section
-    $vfiler_section
-    $project_hosts_section
-    $volume_section
-    $nfs_config_section
-    $iscsi_config_section
-    $cifs_config_section
-    $snapvault_config_section
-    $snapmirror_config_section
-  </chapter>
-''')
+        return ''.join(self.iter_design_chapter(ns))
 
-        ns['project_hosts_section'] = self.build_project_hosts_section(ns)
-        ns['topology_section'] = self.build_topology_section(ns)
-        ns['resource_sharing_section'] = self.build_resource_sharing_section(ns)
-        ns['operational_maintenance_section'] = self.build_operational_maintenance_section(ns)
-        ns['connectivity_section'] = self.build_connectivity_section(ns)
-        ns['vfiler_section'] = self.build_vfiler_section(ns)
-        ns['volume_section'] = self.build_volume_section(ns)
-        ns['nfs_config_section'] = self.build_nfs_config_section(ns)
-        ns['iscsi_config_section'] = self.build_iscsi_config_section(ns)
-        ns['cifs_config_section'] = self.build_cifs_config_section(ns)
-        ns['snapvault_config_section'] = self.build_snapvault_config_section(ns)
-        ns['snapmirror_config_section'] = self.build_snapmirror_config_section(ns)
-        
-        return chapter.safe_substitute(ns)
-
-    def build_project_hosts_section(self, ns):
+    def iter_design_chapter(self, ns):
         """
-        Build the project hosts listing section
+        Build the design chapter one section at a time, yielding
+        each section as soon as it is built.
         """
-        section = Template('''
+        # The hosts section has always been built first, ahead of
+        # where it goes in the chapter, so keep it that way.
+        project_hosts_section = self.build_project_hosts_section(ns)
+
+        yield '''
+  <chapter>
+    <title>Storage Design and Configuration</title>'''
+        for builder in [ self.build_topology_section,
+                         self.build_resource_sharing_section,
+                         self.build_operational_maintenance_section,
+                         self.build_connectivity_section,
+                         self.build_vfiler_section,
+                         None,
+                         self.build_volume_section,
+                         self.build_nfs_config_section,
+                         self.build_iscsi_config_section,
+                         self.build_cifs_config_section,
+                         self.build_snapvault_config_section,
+                         self.build_snapmirror_config_section,
+                         ]:
+            yield '\n    '
+            if builder is None:
+                yield project_hosts_section
+                project_hosts_section = None
+            else:
+                yield builder(ns)
+                pass
+            pass
+        yield '''
+  </chapter>
+'''
+
+    project_hosts_section = SectionTemplate('''
         <section>
           <title>Project Hosts For Storage Connectivity</title>
           <para>The following hosts will require access to the storage:</para>
@@ -281,7 +283,7 @@ the host activation guides.
         </section>
  ''')
 
-        hosttable = Template('''
+    project_hosts_table = SectionTemplate('''
         <table tabstyle="techtable-01">
           <title>List of project hosts</title>
             <tgroup cols="4">
@@ -313,43 +315,50 @@ the host activation guides.
         </table>
 ''')
 
+    project_hosts_row = SectionTemplate('''
+            <row>
+              <entry>$name</entry>
+              <entry>$platform $operatingsystem</entry>
+              <entry>$location</entry>
+              <entry>$storage_ips</entry>
+            </row>
+            ''')
+
+    def build_project_hosts_section(self, ns):
+        """
+        Build the project hosts listing section
+        """
         rowlist = []
 
-        # Sort the list of hosts by site, then ipaddress
-        hostlist = [ (host.location, host.get_storage_ips(), host) for host in self.project.get_hosts() ]
-        hostlist.sort()
+        # Sort the list of hosts by site, then ipaddress, then name.
+        # Hosts and their addresses compare by where they are in
+        # memory, which isn't the same for a project from the cache,
+        # so only compare them by what they contain.
+        hostlist = []
+        for host in self.project.get_hosts():
+            storage_ips = host.get_storage_ips()
+            hostlist.append( (host.location, [ x.ip for x in storage_ips ], host.name, storage_ips, host) )
+            pass
+        hostlist.sort(key=lambda x: x[:3])
 
-        for location, storage_ips, host in hostlist:
+        for location, ips, name, storage_ips, host in hostlist:
 
             iplist = ''.join([ '<para>%s</para>' % ipaddr.ip for ipaddr in storage_ips ])
             
-            row = '''
-            <row>
-              <entry>%s</entry>
-              <entry>%s %s</entry>
-              <entry>%s</entry>
-              <entry>%s</entry>
-            </row>
-            ''' % ( host.name,
-                    host.platform,
-                    host.operatingsystem,
-                    host.location,
-                    iplist,
-                    )
-            rowlist.append( row )
+            rowlist.append( { 'name': host.name,
+                              'platform': host.platform,
+                              'operatingsystem': host.operatingsystem,
+                              'location': host.location,
+                              'storage_ips': iplist,
+                              } )
             pass
 
-        # Now that we've built the rowlist, join them together as a string
-        tablerows = '\n'.join(rowlist)
-        table = hosttable.safe_substitute(hosttable_rows=tablerows)
+        tablerows = Loop(self.project_hosts_row, rowlist, '\n')
+        table = self.project_hosts_table.safe_substitute(hosttable_rows=tablerows)
 
-        return section.safe_substitute(hosts_table=table)
+        return self.project_hosts_section.safe_substitute(hosts_table=table)
 
-    def build_topology_section(self, ns):
-        """
-        Build the section describing the project's Topology and Storage Model.
-        """
-        section = Template('''
+    topology_section = SectionTemplate('''
         <section>
           <title>Topology and Storage Model</title>
           <para>The fundamental design of the storage solution is described by the following statements:</para>
@@ -400,6 +409,10 @@ the host activation guides.
           </section>
  ''')
 
+    def build_topology_section(self, ns):
+        """
+        Build the section describing the project's Topology and Storage Model.
+        """
         if len(self.project.get_services_vlans()) > 0:
             services_vlan = '''
               <listitem>
@@ -411,15 +424,11 @@ the host activation guides.
         else:
             services_vlan = ''
 
-        retstr = section.safe_substitute(services_vlan_item=services_vlan, oracle_database_item='')
+        retstr = self.topology_section.safe_substitute(services_vlan_item=services_vlan, oracle_database_item='')
         return retstr
 
 
-    def build_resource_sharing_section(self, ns):
-        """
-        Build the section describing the project's Topology and Storage Model.
-        """
-        section = Template('''
+    resource_sharing_section = SectionTemplate('''
           <section>
             <title>Resource Sharing</title>
             <para>The following components of the design may be shared with other projects:
@@ -470,14 +479,15 @@ the host activation guides.
 
           </section>
  ''')
-        retstr = section.safe_substitute()
-        return retstr
-    
-    def build_operational_maintenance_section(self, ns):
+
+    def build_resource_sharing_section(self, ns):
         """
-        Build the section informing the reader of the operational maintenance schedule.
+        Build the section describing the project's Topology and Storage Model.
         """
-        section = Template('''
+        retstr = self.resource_sharing_section.safe_substitute()
+        return retstr
+    
+    operational_maintenance_section = SectionTemplate('''
           <section>
             <title>Operational Maintenance</title>
             <para>A regularly scheduled maintenance window exists for the environment, from 09:00 - 17:00 every Saturday.
@@ -512,14 +522,15 @@ the host activation guides.
             
           </section>
  ''')
-        retstr = section.safe_substitute()
-        return retstr
-    
-    def build_connectivity_section(self, ns):
+
+    def build_operational_maintenance_section(self, ns):
         """
-        This section describes how the connectivity to the IP-SAN works.
+        Build the section informing the reader of the operational maintenance schedule.
         """
-        section = Template('''
+        retstr = self.operational_maintenance_section.safe_substitute()
+        return retstr
+    
+    connectivity_section = SectionTemplate('''
         <section>
           <title>IP-SAN Connectivity</title>
           <para>The IP-SAN configuration designs for this project are provided in the project's IP-SAN
@@ -585,15 +596,14 @@ the host activation guides.
         </section>
           ''')
 
-
-        return section.safe_substitute()
-
-    def build_vfiler_section(self, ns):
+    def build_connectivity_section(self, ns):
         """
-        The vFiler design section.
+        This section describes how the connectivity to the IP-SAN works.
         """
 
-        section = Template('''
+        return self.connectivity_section.safe_substitute()
+
+    vfiler_section = SectionTemplate('''
           <section id="vfiler-design">
           <title>vFiler Design</title>
             <para>The following tables provide the vFiler device configuration information.</para>
@@ -605,7 +615,7 @@ the host activation guides.
           </section>
             ''')
 
-        vfiler_section_template = Template('''
+    vfiler_section_template = SectionTemplate('''
           <section>
           <title>$sitetype Site Filer Configuration</title>
 
@@ -614,7 +624,7 @@ the host activation guides.
           </section>
         ''')
 
-        vfiler_configuration_template = Template('''
+    vfiler_configuration_template = SectionTemplate('''
             <table tabstyle="techtable-01">
               <title>$filername Filer Configuration Information</title>
               <tgroup cols="3">
@@ -635,13 +645,13 @@ the host activation guides.
             </table>
         ''')
 
-        vfiler_config_row_template = Template('''
+    vfiler_config_row_template = SectionTemplate('''
                     <entry><para>$attrib</para></entry>
                     <entry><para>$value</para></entry>
                     <entry><para>$comment</para></entry>
         ''')
 
-        services_vlans_config_template = Template('''
+    services_vlans_config_template = SectionTemplate('''
             <table tabstyle="techtable-01">
               <title>$filername Service VLANs</title>
               <tgroup cols="5">
@@ -666,6 +676,19 @@ the host activation guides.
             </table>
         ''')
 
+    vfiler_attribute_row = SectionTemplate("""<row><entry><para>$attrib</para></entry>
+                        <entry><para>$value</para></entry>
+                        <entry><para>$comment</para></entry></row>
+                        """)
+
+    services_vlans_row = row_template([ 'vlan', 'interface', 'ip', 'netmask', 'gateway' ],
+                                      entry='<entry><para>%s</para></entry>\n')
+
+    def build_vfiler_section(self, ns):
+        """
+        The vFiler design section.
+        """
+
         # Add a section for each vFiler defined on a primary filer
         log.debug("Building vFiler section...")
         sites = [ (site.type, site) for site in self.project.get_sites() ]
@@ -716,44 +739,37 @@ the host activation guides.
 
                     vfiler_attributes.append( ('Storage Protocols', self.storage_protocol_cell(), '') )
 
-                    rows = []
-                    for attribname, attribval, attribcomment in vfiler_attributes:
-                        rows.append("""<row><entry><para>%s</para></entry>
-                        <entry><para>%s</para></entry>
-                        <entry><para>%s</para></entry></row>
-                        """ % (attribname, attribval, attribcomment) )
-                        pass
-
-                    template_ns['rows'] = '\n'.join(rows)
+                    rows = [ { 'attrib': attribname, 'value': attribval, 'comment': attribcomment }
+                             for attribname, attribval, attribcomment in vfiler_attributes ]
+                    template_ns['rows'] = Loop(self.vfiler_attribute_row, rows, '\n')
 
-                    vfiler_config_tables.append( vfiler_configuration_template.safe_substitute( template_ns ))
+                    vfiler_config_tables.append( self.vfiler_configuration_template.safe_substitute( template_ns ))
 
                     # Add services VLAN information
                     services_rows = []
                     for ipaddr in vfiler.get_service_ips():
                         for network in ipaddr.vlan.networks:
-                            entries = "<entry><para>%s</para></entry>\n" % ipaddr.vlan.number
-                            entries += "<entry><para>svif0-%s</para></entry>\n" % ipaddr.vlan.number
-                            entries += "<entry><para>%s</para></entry>\n" % ipaddr.ip
-                            entries += "<entry><para>%s</para></entry>\n" % network.netmask
-                            entries += "<entry><para>%s</para></entry>\n" % network.gateway
-                            row = "<row>%s</row>" % entries
-                            services_rows.append(row)
+                            services_rows.append( { 'vlan': ipaddr.vlan.number,
+                                                    'interface': 'svif0-%s' % ipaddr.vlan.number,
+                                                    'ip': ipaddr.ip,
+                                                    'netmask': network.netmask,
+                                                    'gateway': network.gateway,
+                                                    } )
                             pass
                         pass
 
                     services_ns = {}
                     services_ns['filername'] = filer.name
-                    services_ns['rows'] = '\n'.join(services_rows)
+                    services_ns['rows'] = Loop(self.services_vlans_row, services_rows, '\n')
 
                     if len(services_rows) > 0:
-                        vfiler_config_tables.append( services_vlans_config_template.safe_substitute(services_ns) )
+                        vfiler_config_tables.append( self.services_vlans_config_template.safe_substitute(services_ns) )
                         pass
                     pass
                 pass
         
             filer_ns['vfiler_configuration_tables'] = '\n'.join(vfiler_config_tables)
-            vfiler_sections.append( vfiler_section_template.safe_substitute(filer_ns) )
+            vfiler_sections.append( self.vfiler_section_template.safe_substitute(filer_ns) )
             pass
 
         ns['vfiler_section'] = '\n'.join( vfiler_sections )
@@ -776,7 +792,7 @@ the host activation guides.
         else:
             ns['vfiler_routes_section'] = ''
         
-        return section.safe_substitute(ns)
+        return self.vfiler_section.safe_substitute(ns)
 
     def get_services_rows(self, ns, type='primary'):
         # add services vlans
@@ -814,12 +830,7 @@ the host activation guides.
 
         return '\n'.join(paras)
 
-    def build_volume_section(self, ns):
-        """
-        Build the volume design section
-        """
-
-        section = Template("""
+    volume_section = SectionTemplate("""
         <section>
           <title>Filer Volume Design</title>
           <para>The NAS devices represent groups of storage as volumes. Usable
@@ -837,14 +848,14 @@ the host activation guides.
         </section>
         """)
 
-        volume_allocation_template = Template("""
+    volume_allocation_template = SectionTemplate("""
           <section>
             <title>$filer_name Volume Allocation</title>
 
             $volume_allocation_table
 """)
 
-        volume_allocation_table_template = Template("""
+    volume_allocation_table_template = SectionTemplate("""
             <informaltable tabstyle="techtable-01">
               <tgroup cols="6" align="left">
                 <colspec colnum="1" colname="c1" align="center" colwidth="0.3*"/>
@@ -876,6 +887,11 @@ the host activation guides.
           </section>
           """)
 
+    def build_volume_section(self, ns):
+        """
+        Build the volume design section
+        """
+
         # FIXME:
         # Create a separate table for each Filer, in case we have
         # projects that span multiple Filers/NearStores.
@@ -909,8 +925,8 @@ the host activation guides.
                         <entry><para>%.1f</para></entry>
                       </row>""" % (total_raw, total_usable)
 
-                    tblns['volume_allocation_table'] = volume_allocation_table_template.safe_substitute(tblns)
-                    vol_allocations.append( volume_allocation_template.safe_substitute(tblns) )
+                    tblns['volume_allocation_table'] = self.volume_allocation_table_template.safe_substitute(tblns)
+                    vol_allocations.append( self.volume_allocation_template.safe_substitute(tblns) )
                     pass
                 pass
             pass
@@ -920,7 +936,9 @@ the host activation guides.
         ns['volume_config_subsection'] = self.build_volume_config_section(ns)
         ns['qtree_config_subsection'] = self.build_qtree_config_section(ns)
 
-        return section.safe_substitute(ns)
+        return self.volume_section.safe_substitute(ns)
+
+    volume_row = row_template([ 'aggregate', 'name', 'type', 'snapreserve', 'raw', 'usable' ])
 
     def build_vol_rows(self, vol_list):
         """
@@ -929,19 +947,18 @@ the host activation guides.
         """
         volume_rows = []
         for vol in vol_list:
-            entries = ''
-            entries += "<entry><para>%s</para></entry>" % vol.parent.name
-            for attr in [ 'name', 'type' ]:
-                entries += "<entry><para>%s</para></entry>" % getattr(vol, attr)
-                pass
+            row = { 'aggregate': vol.parent.name,
+                    'name': vol.name,
+                    'type': vol.type,
+                    }
 
             # Round raw and usable values to 1 decimal place.
             for attr in [ 'snapreserve', 'raw', 'usable']:
-                entries += "<entry><para>%.1f</para></entry>" % getattr(vol, attr)
+                row[attr] = "%.1f" % getattr(vol, attr)
                 
-            volume_rows.append("<row>%s</row>" % entries)
+            volume_rows.append(row)
             pass
-        return '\n'.join(volume_rows)
+        return Loop(self.volume_row, volume_rows, '\n')
 
     def get_volume_totals(self, vol_list):
         """
@@ -954,12 +971,7 @@ the host activation guides.
     def build_vol_totals(self, total_usable, total_raw):
         pass
 
-    def build_volume_config_section(self, ns):
-        """
-        The volume configuration section defines the volume options for each volume.
-        """
-        
-        filer_volume_config = Template("""
+    filer_volume_config_template = SectionTemplate("""
           <section>
             <title>$filer_name Volume Configuration</title>
             <para>The following table details the volume configuration options
@@ -987,6 +999,11 @@ the host activation guides.
             </section>
             """)
 
+    def build_volume_config_section(self, ns):
+        """
+        The volume configuration section defines the volume options for each volume.
+        """
+        
         volume_configs = ''
 
         for site in self.project.get_sites():
@@ -996,13 +1013,18 @@ the host activation guides.
                 config_rows = self.get_volume_options_rows(filer)
                 if len(config_rows) > 0:
                     config_ns['config_rows'] = config_rows
-                    volume_configs += filer_volume_config.safe_substitute(config_ns)
+                    volume_configs += self.filer_volume_config_template.safe_substitute(config_ns)
                     pass
                 pass
             pass
             
         return volume_configs
 
+    volume_options_row = SectionTemplate("""<row valign='middle'><entry><para>$name</para></entry>
+<entry><para>$space_guarantee</para></entry>
+<entry>$options</entry>
+</row>""")
+
     def get_volume_options_rows(self, filer):
         """
         Build the volume options rows for the previously defined volumes
@@ -1010,8 +1032,6 @@ the host activation guides.
         """
         rows = []
         for volume in filer.get_volumes():
-            row_detail = "<entry><para>%s</para></entry>\n" % volume.name
-            row_detail += "<entry><para>%s</para></entry>\n" % volume.space_guarantee
             option_str = ''
             for key,value in volume.get_options().items():
                 option_str += "<para>%s=%s</para>" % (key, value)
@@ -1029,16 +1049,12 @@ the host activation guides.
                 for key in settings:
                     option_str += "<para>autodelete %s=%s</para>" % (key, settings[key])
             
-            row_detail += "<entry>%s</entry>\n" % option_str
-
-            # comment column. No longer used.
-            #row_detail += "<entry/>\n"
+            rows.append( { 'name': volume.name,
+                           'space_guarantee': volume.space_guarantee,
+                           'options': option_str,
+                           } )
 
-            row = "<row valign='middle'>%s</row>" % row_detail
-
-            rows.append(row)
-
-        return '\n'.join(rows)
+        return Loop(self.volume_options_row, rows, '\n')
 
     def get_volume_options_entry(self, ns, volume_name):
         """
@@ -1046,11 +1062,7 @@ the host activation guides.
         """
         options = self.project.get_volume_options(volume_name)
 
-    def build_qtree_config_section(self, ns):
-        """
-        Qtree layout and definitions.
-        """
-        section = Template("""
+    qtree_config_section = SectionTemplate("""
         <section>
           <title>Volume Qtree Structure</title>
 
@@ -1069,7 +1081,7 @@ the host activation guides.
         </section>
         """)
 
-        qtrees_table_template = Template("""
+    qtrees_table_template = SectionTemplate("""
         <table tabstyle="techtable-01">
           <title>Qtree Configuration For $filer_name</title>
           <tgroup cols="4" align="left">
@@ -1094,6 +1106,10 @@ the host activation guides.
 
       """)
 
+    def build_qtree_config_section(self, ns):
+        """
+        Qtree layout and definitions.
+        """
 
         qtree_tables = []
         for site in self.project.get_sites():
@@ -1105,7 +1121,7 @@ the host activation guides.
                 tblns['qtree_rows'] = filer_qtree_rows
                 if len(filer_qtree_rows) > 0:
                     log.debug("Adding qtree table for filer %s", filer.name)
-                    qtree_tables.append( qtrees_table_template.safe_substitute(tblns) )
+                    qtree_tables.append( self.qtrees_table_template.safe_substitute(tblns) )
                     pass
                 pass
             pass
@@ -1113,7 +1129,16 @@ the host activation guides.
 
 
         ns['filer_qtrees'] = '\n'.join(qtree_tables)
-        return section.safe_substitute(ns)
+        return self.qtree_config_section.safe_substitute(ns)
+
+    qtree_row = SectionTemplate("""
+            <row valign='middle'>
+            <entry><para>/vol/$volume_name/$qtree_name</para></entry>
+            <entry><para>Reporting Only</para></entry>
+            <entry><para>$security</para></entry>
+            <entry><para>$comment</para></entry>
+            </row>
+            """)
 
     def get_filer_qtree_rows(self, filer):
         """
@@ -1127,21 +1152,15 @@ the host activation guides.
             qtree_list.extend(vol.get_qtrees())
 
         for qtree in qtree_list:
-            row = """
-            <row valign='middle'>
-            <entry><para>/vol/%s/%s</para></entry>
-            <entry><para>Reporting Only</para></entry>
-            <entry><para>%s</para></entry>
-            <entry><para>%s</para></entry>
-            </row>
-            """ % ( qtree.volume.name, qtree.name, qtree.security, qtree.comment )
-            rows.append(row)
+            rows.append( { 'volume_name': qtree.volume.name,
+                           'qtree_name': qtree.name,
+                           'security': qtree.security,
+                           'comment': qtree.comment,
+                           } )
             pass
-        return '\n'.join(rows)
-
-    def build_nfs_config_section(self, ns):
+        return Loop(self.qtree_row, rows, '\n')
 
-        section = Template("""
+    nfs_config_section = SectionTemplate("""
         <section>
           <title>NFS Storage Configuration</title>
           <para>This section provides the NFS configuration for &project.title;.</para>
@@ -1174,8 +1193,8 @@ the host activation guides.
         </section>
 
             """)
-            
-        nfs_table_template = Template("""<para>
+
+    nfs_table_template = SectionTemplate("""<para>
             <table tabstyle="techtable-01">
               <title>NFS Exports for $sitetype Site</title>
               <tgroup cols="3">
@@ -1199,29 +1218,37 @@ the host activation guides.
             </para>
         """)
 
+    def build_nfs_config_section(self, ns):
+
         nfs_tables = []
         for sitetype in ['primary', 'secondary']:
             tblns = {}
             # Only include the NFS qtree section if there are NFS qtrees
-            nfs_qtree_rows = '\n'.join(self.get_nfs_qtree_rows(ns, sitetype))
+            nfs_qtree_rows = self.get_nfs_qtree_rows(ns, sitetype)
             if len(nfs_qtree_rows) > 0:
                 #log.debug("Found NFS qtrees: '%s'", nfs_qtree_rows)
                 tblns['sitetype'] = sitetype.capitalize()
                 tblns['nfs_qtree_rows'] = nfs_qtree_rows
-                nfs_tables.append( nfs_table_template.safe_substitute(tblns))
+                nfs_tables.append( self.nfs_table_template.safe_substitute(tblns))
                 pass
             pass
 
         if len(nfs_tables) > 0:
             ns['nfs_exports_tables'] = '\n'.join(nfs_tables)
-            return section.safe_substitute(ns)
+            return self.nfs_config_section.safe_substitute(ns)
         else:
             return ''
 
+    nfs_qtree_row = SectionTemplate("""<row valign='middle'>
+                    <entry><para>$filerip:/vol/$volume_name/$qtree_name</para></entry>
+                    <entry><para>$hostname</para>$toip</entry>
+                    <entry>$mountoptions</entry>
+                    </row>""")
+
     def get_nfs_qtree_rows(self, ns, site):
         """
         Get the qtree level NFS configuration information for a site.
-        @returns rows: an XML string of the rows data.
+        @returns rows: a Loop that renders the rows.
         """
         # FIXME: Group this by host after building the rows, and make the left
         # column the host.
@@ -1256,13 +1283,13 @@ the host activation guides.
                 else:
                     toip_string = ""
                     
-                entries = """
-                    <entry><para>%s:/vol/%s/%s</para></entry>
-                    <entry><para>%s</para>%s</entry>
-                    <entry>%s</entry>
-                    """ % ( filerip, qtree.volume.name, qtree.name, export.tohost.name, toip_string, mountoptions )
-                row = "<row valign='middle'>%s</row>" % entries
-                rows.append(row)
+                rows.append( { 'filerip': filerip,
+                               'volume_name': qtree.volume.name,
+                               'qtree_name': qtree.name,
+                               'hostname': export.tohost.name,
+                               'toip': toip_string,
+                               'mountoptions': mountoptions,
+                               } )
                 pass
 
             # Read Only mounts
@@ -1280,24 +1307,20 @@ the host activation guides.
                 else:
                     toip_string = ""
                     
-                entries = """
-                    <entry><para>%s:/vol/%s/%s</para></entry>
-                    <entry><para>%s</para>%s</entry>
-                    <entry>%s</entry>
-                    """ % ( filerip, qtree.volume.name, qtree.name, export.tohost.name, toip_string, mountoptions )
-                row = "<row valign='middle'>%s</row>" % entries
-                rows.append(row)
+                rows.append( { 'filerip': filerip,
+                               'volume_name': qtree.volume.name,
+                               'qtree_name': qtree.name,
+                               'hostname': export.tohost.name,
+                               'toip': toip_string,
+                               'mountoptions': mountoptions,
+                               } )
                 log.debug("Added ro host/qtree: %s/%s", export.tohost.name, qtree.name)
                 pass
 
             pass
-        return rows
+        return Loop(self.nfs_qtree_row, rows, '\n')
 
-    def build_iscsi_config_section(self, ns):
-        """
-        iSCSI configuration section
-        """
-        section = Template("""
+    iscsi_config_section = SectionTemplate("""
         <section>
           <title>iSCSI Storage Configuration</title>
           <para>This section provides the iSCSI configuration for &project.title;.</para>
@@ -1365,7 +1388,7 @@ the host activation guides.
       </section>
       """)
 
-        igroup_table_template = Template("""
+    igroup_table_template = SectionTemplate("""
             <table tabstyle="techtable-01">
               <title>iSCSI iGroup Configuration on $filer_name</title>
               <tgroup cols="4">
@@ -1388,8 +1411,8 @@ the host activation guides.
               </tgroup>
             </table>
             """)
-        
-        lun_table_template = Template("""
+
+    lun_table_template = SectionTemplate("""
             <table tabstyle="techtable-01">
               <title>iSCSI LUN Configuration on $filer_name</title>
               <tgroup cols="4">
@@ -1413,6 +1436,10 @@ the host activation guides.
             </table>
             """)
 
+    def build_iscsi_config_section(self, ns):
+        """
+        iSCSI configuration section
+        """
         ns['iscsi_chap_username'] = self.project.title
         ns['iscsi_chap_password'] = self.project.get_iscsi_chap_password(ns['iscsi_prefix'])
 
@@ -1427,24 +1454,32 @@ the host activation guides.
                 igroup_rows = self.get_iscsi_igroup_rows(filer)
                 if len(igroup_rows) > 0:
                     tblns['iscsi_igroup_rows'] = igroup_rows
-                    igroup_tables.append(igroup_table_template.safe_substitute(tblns))
+                    igroup_tables.append(self.igroup_table_template.safe_substitute(tblns))
                     log.debug("added table for filer: %s", filer.name)
                     pass
                 
                 lun_rows = self.get_iscsi_lun_rows(filer)
                 if len(lun_rows) > 0:
                     tblns['iscsi_lun_rows'] = lun_rows
-                    lun_tables.append(lun_table_template.safe_substitute(tblns))
+                    lun_tables.append(self.lun_table_template.safe_substitute(tblns))
                     pass
                 pass
 
             ns['igroup_tables'] = '\n'.join(igroup_tables)
             ns['lun_tables'] = '\n'.join(lun_tables)
 
-            return section.safe_substitute(ns)
+            return self.iscsi_config_section.safe_substitute(ns)
         else:
             return ''
 
+    iscsi_igroup_row = row_template([ 'name', 'initiators', 'protocol', 'type' ],
+                                    row="<row valign='middle'>%s</row>\n",
+                                    entry='<entry><para>%s</para></entry>\n')
+
+    iscsi_lun_row = row_template([ 'path', 'size', 'ostype', 'igroup' ],
+                                 row="<row valign='middle'>%s</row>\n",
+                                 entry='<entry><para>%s</para></entry>\n')
+
     def get_iscsi_igroup_rows(self, filer):
         """
         Find a list of iSCSI iGroups for the project, and convert
@@ -1455,30 +1490,26 @@ the host activation guides.
         igroup_list = filer.get_igroups()
 
         for igroup in igroup_list:
-            entries = "<entry><para>%s</para></entry>\n" % igroup.name
-            entries += "<entry><para>%s</para></entry>\n" % ''.join( [ "<para>%s</para>" % export.tohost.iscsi_initiator for export in igroup.get_exports() ] )
-            entries += "<entry><para>iSCSI</para></entry>\n"
-            entries += "<entry><para>%s</para></entry>\n" % igroup.type            
-
-            rows.append("<row valign='middle'>%s</row>\n" % entries)
-        return '\n'.join(rows)
+            rows.append( { 'name': igroup.name,
+                           'initiators': ''.join( [ "<para>%s</para>" % export.tohost.iscsi_initiator for export in igroup.get_exports() ] ),
+                           'protocol': 'iSCSI',
+                           'type': igroup.type,
+                           } )
+        return Loop(self.iscsi_igroup_row, rows, '\n')
 
     def get_iscsi_lun_rows(self, filer):
         rows = []
         lunlist = filer.get_luns()
         for lun in lunlist:
             log.debug("lun is: %s", lun)
-            entries = "<entry><para>%s</para></entry>\n" % lun.full_path()
-            entries += "<entry><para>%.2f</para></entry>\n" % lun.size
-            entries += "<entry><para>%s</para></entry>\n" % lun.ostype
-            entries += "<entry><para>%s</para></entry>\n" % lun.igroup.name
-            
-            rows.append("<row valign='middle'>%s</row>\n" % entries)
-        return '\n'.join(rows)
+            rows.append( { 'path': lun.full_path(),
+                           'size': "%.2f" % lun.size,
+                           'ostype': lun.ostype,
+                           'igroup': lun.igroup.name,
+                           } )
+        return Loop(self.iscsi_lun_row, rows, '\n')
         
-    def build_cifs_config_section(self, ns):
-
-        section = Template("""
+    cifs_config_section = SectionTemplate("""
         <section>
           <title>CIFS Storage Configuration</title>
           <para/>
@@ -1491,6 +1522,9 @@ the host activation guides.
           
         </section>
         """)
+
+    def build_cifs_config_section(self, ns):
+
         if 'cifs' in self.project.get_allowed_protocols():
             log.debug("Configuring CIFS...")
             ns['cifs_ad_section'] = self.build_cifs_active_directory_section(ns)
@@ -1499,17 +1533,11 @@ the host activation guides.
 
             ns['cifs_hosts_config_section'] = self.build_cifs_hosts_config_section(ns)
             
-            return section.safe_substitute(ns)
+            return self.cifs_config_section.safe_substitute(ns)
         else:
             return ''
 
-    def build_cifs_active_directory_section(self, ns):
-        """
-        Set up any CIFS active directory configuration information
-        """
-        # FIXME: This is purely static for now, if CIFS is enabled.
-        log.debug("Setting up AD authentication for CIFS...")
-        section = Template("""
+    cifs_active_directory_section = SectionTemplate("""
         <section>
           <title>CIFS Active Directory Configuration</title>
           <para>The following table provides the CIFS active directory
@@ -1520,7 +1548,7 @@ the host activation guides.
         </section>
         """)
 
-        table_template = Template("""
+    cifs_active_directory_table_template = SectionTemplate("""
         <table tabstyle='techtable-03'>
           <title>Active Directory Configuration for $filer_name:$vfiler_name</title>
             <tgroup cols='2'>
@@ -1583,6 +1611,12 @@ the host activation guides.
         </table>
         """)
 
+    def build_cifs_active_directory_section(self, ns):
+        """
+        Set up any CIFS active directory configuration information
+        """
+        # FIXME: This is purely static for now, if CIFS is enabled.
+        log.debug("Setting up AD authentication for CIFS...")
         tables = []
 
         for filer in [ x for x in self.project.filers.values() if x.type in ['primary', 'nearstore',] ]:
@@ -1605,18 +1639,13 @@ the host activation guides.
                 tabns['ad_domain_name'] = vfiler.fqdn()
                 tabns['vfiler_ad_account_location'] = vfiler.ad_account_location
                 
-                tables.append( table_template.safe_substitute(tabns) )
+                tables.append( self.cifs_active_directory_table_template.safe_substitute(tabns) )
 
         ns['cifs_ad_filer_tables'] = '\n'.join(tables)
                 
-        return section.safe_substitute(ns)
+        return self.cifs_active_directory_section.safe_substitute(ns)
 
-    def build_cifs_shares_section(self, ns):
-        """
-        Build the CIFS sharing section for the hosts.
-        """
-
-        section = Template("""
+    cifs_shares_section = SectionTemplate("""
         <section>
           <title>CIFS Share Configuration</title>
           <para/>
@@ -1625,8 +1654,8 @@ the host activation guides.
           
         </section>
         """)
-        
-        cifs_shares_table_template = Template("""
+
+    cifs_shares_table_template = SectionTemplate("""
         <table tabstyle='techtable-01'>
           <title>CIFS Share Configuration for $filer_name</title>
           <tgroup cols='3'>
@@ -1650,6 +1679,11 @@ the host activation guides.
         </table>
         """)
 
+    def build_cifs_shares_section(self, ns):
+        """
+        Build the CIFS sharing section for the hosts.
+        """
+
         tables = []
 
         for filer in [ x for x in self.project.filers.values() if x.type == 'primary' ]:
@@ -1693,18 +1727,14 @@ the host activation guides.
                     pass
 
                 tabns['table_rows'] = '\n'.join(rows)
-                tables.append( cifs_shares_table_template.safe_substitute(tabns) )
+                tables.append( self.cifs_shares_table_template.safe_substitute(tabns) )
                 pass
             pass
                 
         ns['cifs_shares_tables'] = '\n'.join(tables)
-        return section.safe_substitute(ns)
+        return self.cifs_shares_section.safe_substitute(ns)
 
-    def build_cifs_hosts_config_section(self, ns):
-        """
-        Information how to configure CIFS shares on hosts.
-        """
-        section = Template("""
+    cifs_hosts_config_section = SectionTemplate("""
         <section>
           <title>Host Configurations For CIFS Mounts</title>
           <para>Use the following steps to turn on the 'Client for Microsoft Networks'
@@ -1739,11 +1769,14 @@ the host activation guides.
           </procedure>
         </section>
         """)
-        return section.safe_substitute(ns)
-    
-    def build_snapvault_config_section(self, ns):
 
-        section = Template("""
+    def build_cifs_hosts_config_section(self, ns):
+        """
+        Information how to configure CIFS shares on hosts.
+        """
+        return self.cifs_hosts_config_section.safe_substitute(ns)
+    
+    snapvault_config_section = SectionTemplate("""
         <section>
           <title>SnapVault Configuration</title>
           <para>The following SnapVault configuration will be configured for &project.title;:
@@ -1779,13 +1812,19 @@ the host activation guides.
         </section>
         """)
 
+    def build_snapvault_config_section(self, ns):
+
         snapvault_rows = self.get_snapvault_rows(ns)
         if len(snapvault_rows) > 0:
             ns['snapvault_rows'] = snapvault_rows
-            return section.safe_substitute(ns)
+            return self.snapvault_config_section.safe_substitute(ns)
         else:
             return ''
 
+    snapvault_row = row_template([ 'source', 'target', 'basename', 'src_schedule', 'dst_schedule' ],
+                                 row="<row>%s</row>\n",
+                                 entry='<entry><para>%s</para></entry>\n')
+
     def get_snapvault_rows(self, ns):
         """
         Build a list of snapvault rows based on the snapvault relationships
@@ -1794,22 +1833,18 @@ the host activation guides.
         snapvaults = self.project.get_snapvaults()
         rows = []
         for sv in snapvaults:
-            entries = ''
-            entries += "<entry><para>%s</para></entry>\n" % sv.sourcevol.namepath()
-            entries += "<entry><para>%s</para></entry>\n" % sv.targetvol.namepath()
-            entries += "<entry><para>%s</para></entry>\n" % sv.basename
-            entries += "<entry><para>%s</para></entry>\n" % sv.src_schedule
-            entries += "<entry><para>%s</para></entry>\n" % sv.dst_schedule
-            row = "<row>%s</row>\n" % entries
-            rows.append(row)
+            rows.append( { 'source': sv.sourcevol.namepath(),
+                           'target': sv.targetvol.namepath(),
+                           'basename': sv.basename,
+                           'src_schedule': sv.src_schedule,
+                           'dst_schedule': sv.dst_schedule,
+                           } )
             pass
 
-        return ''.join(rows)
+        return Loop(self.snapvault_row, rows)
 
     
-    def build_snapmirror_config_section(self, ns):
-
-        section = Template("""
+    snapmirror_config_section = SectionTemplate("""
         <section>
           <title>SnapMirror Configuration</title>
           <para>The following SnapMirror configuration will be configured for &project.title;:
@@ -1840,13 +1875,17 @@ the host activation guides.
         </section>
         """)
 
+    def build_snapmirror_config_section(self, ns):
+
         snapmirror_rows = self.get_snapmirror_rows(ns)
         if len(snapmirror_rows) > 0:
             ns['snapmirror_rows'] = snapmirror_rows
-            return section.safe_substitute(ns)
+            return self.snapmirror_config_section.safe_substitute(ns)
         else:
             return ''
 
+    snapmirror_row = row_template([ 'source', 'target', 'schedule' ])
+
     def get_snapmirror_rows(self, ns):
         """
         Build a list of snapmirror rows based on the snapmirror relationships
@@ -1855,17 +1894,18 @@ the host activation guides.
         snapmirrors = self.project.get_snapmirrors()
         rows = []
         for sm in snapmirrors:
-            entries = ''
-            entries += "<entry><para>%s</para></entry>" % sm.sourcevol.namepath()
-            entries += "<entry><para>%s</para></entry>" % sm.targetvol.namepath()
-            entries += "<entry><para>%s</para></entry>" % sm.etc_snapmirror_conf_schedule()
-            row = "<row>%s</row>" % entries
-            rows.append(row)
+            rows.append( { 'source': sm.sourcevol.namepath(),
+                           'target': sm.targetvol.namepath(),
+                           'schedule': sm.etc_snapmirror_conf_schedule(),
+                           } )
             pass
 
-        return ''.join(rows)
+        return Loop(self.snapmirror_row, rows)
 
     def build_activation_section(self, ns):
+        return ''.join(self.iter_activation_section(ns))
+
+    def iter_activation_section(self, ns):
         log.debug("Adding activation instructions...")
 
         # Old version with subsections
@@ -1879,21 +1919,24 @@ the host activation guides.
 ##         """)
 
         # new version where each filer is a separate appendix.
-        section = Template("""
-          $activation_commands
-        """)
-
-        ns['activation_commands'] = self.build_activation_commands(ns)
-        return section.safe_substitute(ns)
+        # The commands for each filer are written out as they are built.
+        yield """
+          """
+        for fragment in self.iter_activation_commands(ns):
+            yield fragment
+            pass
+        yield """
+        """
     
     def build_activation_commands(self, ns):
+        return ''.join(self.iter_activation_commands(ns))
 
-        activation_commands = ''
+    def iter_activation_commands(self, ns):
 
         for filer in self.project.get_filers():
             for vfiler in filer.get_vfilers():
                 log.debug("Building activation commands for %s:%s", filer, vfiler)
-                activation_commands += self.build_filer_activation_commands(filer, vfiler, ns)
+                yield self.build_filer_activation_commands(filer, vfiler, ns)
                 
         # Build the commands for all primary filers
 #         for filer in [ x for x in self.project.get_filers() if x.site.type == 'primary' and x.type == 'primary' ]:
@@ -1925,7 +1968,11 @@ the host activation guides.
 #             vfiler = filer.get_vfilers()[0]
 #             activation_commands += self.build_filer_activation_commands(filer, vfiler, ns)
 
-        return activation_commands
+    filer_activation_section = SectionTemplate("""<appendix>
+          <title>Activation commands for $filer_name</title>
+          $commands
+        </appendix>
+        """)
 
     def build_filer_activation_commands(self, filer, vfiler, ns):
         """
@@ -1933,142 +1980,137 @@ the host activation guides.
         """
         log.debug("Adding activation commands for %s", filer.name)
         cmd_ns = {}
-        cmd_ns['commands'] = ''
-        
-        section = Template("""<appendix>
-          <title>Activation commands for %s</title>
-          $commands
-        </appendix>
-        """ % filer.name)
+        cmd_ns['filer_name'] = filer.name
+        commands = []
 
         # Volumes are not created on secondary filers
         if filer.is_active_node:
             cmds = '\n'.join( self.command_gen.filer_vol_create_commands(filer) )
-            cmd_ns['commands'] += """<section>
+            commands.append("""<section>
             <title>Volume Creation</title>
             <screen>%s</screen>
-            </section>""" % cmds
+            </section>""" % cmds)
 
         #
         # Create qtrees
         #
         cmds = self.command_gen.filer_qtree_create_commands(filer)
         if len(cmds) > 0:
-            cmd_ns['commands'] += """<section>
+            commands.append("""<section>
             <title>Qtree Creation</title>
             <screen>%s</screen>
-            </section>""" % '\n'.join(cmds)
+            </section>""" % '\n'.join(cmds))
 
         # Create the vfiler VLAN
         cmds = '\n'.join( self.command_gen.vlan_create_commands(filer, vfiler) )
-        cmd_ns['commands'] += """<section>
+        commands.append("""<section>
         <title>VLAN Creation</title>
         <screen>%s</screen>
-        </section>""" % cmds
+        </section>""" % cmds)
 
         # Create the vfiler IPspace
         cmds = '\n'.join( self.command_gen.ipspace_create_commands(filer) )
-        cmd_ns['commands'] += """<section>
+        commands.append("""<section>
         <title>IP Space Creation</title>
         <screen>%s</screen>
-        </section>""" % cmds
+        </section>""" % cmds)
 
         # Only create the vfiler on primary and nearstore filers
         if filer.is_active_node:
             cmds = '\n'.join( self.command_gen.vfiler_create_commands(filer, vfiler) )
-            cmd_ns['commands'] += """<section>
+            commands.append("""<section>
             <title>vFiler Creation</title>
             <screen>%s</screen>
-            </section>""" % cmds
+            </section>""" % cmds)
 
         # Don't add volumes on secondary filers
         if filer.is_active_node:
             cmds = '\n'.join( self.command_gen.vfiler_add_volume_commands(filer, vfiler) )
             if len(cmds) > 0:
-                cmd_ns['commands'] += """<section>
+                commands.append("""<section>
                 <title>vFiler Volume Addition</title>
                 <screen>%s</screen>
-                </section>""" % cmds
+                </section>""" % cmds)
 
         # Add interfaces
         cmds = '\n'.join( self.command_gen.vfiler_add_storage_interface_commands(filer, vfiler) )
-        cmd_ns['commands'] += """<section>
+        commands.append("""<section>
         <title>Interface Configuration</title>
         <screen>%s</screen>
-        </section>""" % cmds
+        </section>""" % cmds)
 
         # Configure secureadmin
         if filer.is_active_node:
             cmds = '\n'.join( self.command_gen.vfiler_setup_secureadmin_ssh_commands(vfiler) )
-            cmd_ns['commands'] += """<section>
+            commands.append("""<section>
             <title>SecureAdmin Configuration</title>
             <para>Run the following commands to enable secureadmin within the vFiler:</para>
             <screen>%s</screen>
-            </section>""" % cmds
+            </section>""" % cmds)
 
         # Inter-project routing
 ##         cmds = '\n'.join( self.command_gen.vfiler_add_inter_project_routing(vfiler) )
-##         cmd_ns['commands'] += """<section>
+##         commands.append("""<section>
 ##         <title>Inter-Project Routing</title>
 ##         <screen>%s</screen>
-##         </section>""" % cmds
+##         </section>""" % cmds)
 
         if filer.is_active_node:
             cmds = '\n'.join( self.command_gen.vfiler_set_allowed_protocols_commands(vfiler) )
-            cmd_ns['commands'] += """<section>
+            commands.append("""<section>
             <title>Allowed Protocols</title>
             <screen>%s</screen>
-            </section>""" % cmds
+            </section>""" % cmds)
 
         # Careful! Quotas file is the verbatim file contents, not a list!
         if filer.is_active_node:
             cmds = '\n'.join( self.command_gen.vfiler_quotas_add_commands(filer, vfiler) )
-            cmd_ns['commands'] += """<section>
+            commands.append("""<section>
             <title>Quota File Contents</title>
             <para>Run the following commands to create the quotas file <filename>/vol/%s_root/etc/quotas</filename>:
             </para>
             <screen>%s</screen>
-            </section>""" % ( ns['vfiler_name'], cmds )
+            </section>""" % ( ns['vfiler_name'], cmds ))
 
             # Quota enablement
             cmds = '\n'.join(self.command_gen.vfiler_quotas_enable_commands(filer, vfiler))
-            cmd_ns['commands'] += """<section>
+            commands.append("""<section>
             <title>Quota Enablement Commands</title>
             <para>Execute the following commands on the filer to enable quotas:
             </para>
             <screen>%s</screen>
-            </section>""" % cmds
+            </section>""" % cmds)
 
         if filer.is_active_node and filer.type == 'filer':
             cmds = '\n'.join( self.command_gen.filer_snapreserve_commands(filer) )
-            cmd_ns['commands'] += """<section>
+            commands.append("""<section>
             <title>Snap Reserve Configuration</title>
             <screen>%s</screen>
-            </section>""" % cmds
+            </section>""" % cmds)
 
         if filer.is_active_node and filer.type == 'filer':
             cmds = '\n'.join( self.command_gen.filer_snapshot_commands(filer) )
-            cmd_ns['commands'] += """<section>
+            commands.append("""<section>
             <title>Snapshot Configuration</title>
             <screen>%s</screen>
-            </section>""" % cmds
+            </section>""" % cmds)
 
         # initialise the snapvaults to the nearstore
         if filer.is_active_node and filer.type == 'nearstore':
             cmds = '\n'.join( self.command_gen.filer_snapvault_init_commands(filer) )
-            cmd_ns['commands'] += """<section>
+            commands.append("""<section>
             <title>SnapVault Initialisation</title>
             <screen><?db-font-size 60%% ?>%s</screen>
-            </section>""" % cmds
+            </section>""" % cmds)
             pass
         
         # Set up the snapvault schedules
         if filer.is_active_node:
             cmds = '\n'.join( self.command_gen.filer_snapvault_commands(filer) )
-            cmd_ns['commands'] += """<section>
+            commands.append("""<section>
             <title>SnapVault Configuration</title>
             <screen>%s</screen>
-            </section>""" % cmds
+            </section>""" % cmds)
 
         # initialise the snapmirrors to the DR site
         if filer.is_active_node:
@@ -2076,10 +2118,10 @@ the host activation guides.
 
             cmds = '\n'.join( self.command_gen.filer_snapmirror_init_commands(filer) )
             if len(cmds) > 0:
-                cmd_ns['commands'] += """<section>
+                commands.append("""<section>
                 <title>SnapMirror Initialisation</title>
                 <screen><?db-font-size 60%% ?>%s</screen>
-                </section>""" % cmds
+                </section>""" % cmds)
             else:
                 log.debug("No SnapMirrors configured to filer '%s' at secondary site." % filer.name)
 
@@ -2087,41 +2129,41 @@ the host activation guides.
         if filer.is_active_node:
             cmds = self.command_gen.filer_etc_snapmirror_conf_commands(filer)
             if len(cmds) > 0:
-                cmd_ns['commands'] += """<section>
+                commands.append("""<section>
                 <title>Filer <filename>/etc/snapmirror.conf</filename></title>
                 <para>Use these commands to append to the Filer's /etc/snapmirror.conf file:</para>
                 <screen><?db-font-size 60%% ?>%s</screen>
-                </section>""" % '\n'.join(cmds)
+                </section>""" % '\n'.join(cmds))
 
         # Add default route
         if filer.is_active_node:                
             title, cmds = self.command_gen.default_route_command(filer, vfiler)
-            cmd_ns['commands'] += """<section>
+            commands.append("""<section>
             <title>%s</title>
             <screen>%s</screen>
-            </section>""" % (title, '\n'.join( cmds ) )
+            </section>""" % (title, '\n'.join( cmds ) ))
 
         # Add services vlan routes if required
         if filer.is_active_node:                
             services_vlans = self.project.get_services_vlans(filer.site)
             if len(services_vlans) > 0:
                 cmds = self.command_gen.services_vlan_route_commands(vfiler)
-                cmd_ns['commands'] += """<section>
+                commands.append("""<section>
                 <title>Services VLAN routes</title>
                 <para>Use these commands to add routes into Services VLANs:</para>
                 <screen>%s</screen>
-                </section>""" % '\n'.join( cmds )
+                </section>""" % '\n'.join( cmds ))
                 pass
             pass
 
         # /etc/hosts additions
         if filer.is_active_node and filer.type == 'filer':
             cmds = self.command_gen.vfiler_etc_hosts_commands(filer, vfiler)
-            cmd_ns['commands'] += """<section>
+            commands.append("""<section>
             <title>vFiler <filename>/etc/hosts</filename></title>
             <para>Use these commands to create the vFiler's /etc/hosts file:</para>
             <screen>%s</screen>
-            </section>""" % '\n'.join(cmds)
+            </section>""" % '\n'.join(cmds))
 
         #
         # The /etc/rc file needs certain pieces of configuration added to it
@@ -2134,11 +2176,11 @@ the host activation guides.
 ##         cmds += cmdlist
 ##         cmds += self.command_gen.services_vlan_route_commands(vfiler)
 
-        cmd_ns['commands'] += """<section>
+        commands.append("""<section>
         <title>Filer <filename>/etc/rc</filename> Additions</title>
         <para>Use these commands to make the new vFiler configuration persistent across reboots:</para>
         <screen>%s</screen>
-        </section>""" % '\n'.join( cmds )
+        </section>""" % '\n'.join( cmds ))
 
         # NFS exports are only configured on primary filers
         # FIXME: defaults configurable
@@ -2159,39 +2201,39 @@ the host activation guides.
                         wrapped_lines.append(line)
 
                 cmds = '\n'.join( wrapped_lines )
-                cmd_ns['commands'] += """<section>
+                commands.append("""<section>
                 <title>NFS Exports Configuration</title>
                 <screen><?db-font-size 60%% ?>%s</screen>
-                </section>""" % cmds
+                </section>""" % cmds)
 
         # CIFS exports are only configured on primary filers
         if 'cifs' in vfiler.get_allowed_protocols():
             if filer.is_active_node:
                 cmds = self.command_gen.vfiler_cifs_dns_commands(vfiler)
-                cmd_ns['commands'] += """<section>
+                commands.append("""<section>
                 <title>CIFS DNS Configuration</title>
                 <para>Use these commands to configure the vFiler for DNS:</para>
                 <screen>%s</screen>
-                </section>""" % '\n'.join(cmds)
+                </section>""" % '\n'.join(cmds))
                 pass
             
             # Set up CIFS in the vFiler
             if filer.is_active_node:
                 cmds = ['vfiler run %s cifs setup' % vfiler.name]
-                cmd_ns['commands'] += """<section>
+                commands.append("""<section>
                 <title>Set Up CIFS</title>
                 <para>Set up CIFS for the vFiler. This is an interactive process.</para>
                 <screen>%s</screen>
-                </section>""" % '\n'.join(cmds)
+                </section>""" % '\n'.join(cmds))
 
             # Set up CIFS shares
             if filer.is_active_node and filer.type == 'filer':
                 cmds = self.command_gen.vfiler_cifs_shares_commands(vfiler)
-                cmd_ns['commands'] += """<section>
+                commands.append("""<section>
                 <title>CIFS Share Configuration</title>
                 <para>Set up CIFS for the vFiler. This is an interactive process.</para>
                 <screen>%s</screen>
-                </section>""" % '\n'.join(cmds)
+                </section>""" % '\n'.join(cmds))
 
         # iSCSI exports are only configured on primary filers
         if 'iscsi' in vfiler.get_allowed_protocols():
@@ -2199,26 +2241,26 @@ the host activation guides.
 
                 # iSCSI CHAP configuration
                 title, cmds = self.command_gen.vfiler_iscsi_chap_enable_commands(filer, vfiler, prefix=ns['iscsi_prefix'])
-                cmd_ns['commands'] += """<section>
+                commands.append("""<section>
                 <title>%s</title>
                 <screen>%s</screen>
-                </section>""" % (title, '\n'.join(cmds) )
+                </section>""" % (title, '\n'.join(cmds) ))
 
                 # iSCSI iGroup configuration
                 title, cmds = self.command_gen.vfiler_igroup_enable_commands(filer, vfiler)
                 if len(cmds) > 0:
-                    cmd_ns['commands'] += """<section>
+                    commands.append("""<section>
                     <title>%s</title>
                     <screen><?db-font-size 60%% ?>%s</screen>
-                    </section>""" % (title, '\n'.join(cmds) )
+                    </section>""" % (title, '\n'.join(cmds) ))
 
                 # iSCSI LUN configuration
                 title, cmds = self.command_gen.vfiler_lun_enable_commands(filer, vfiler)
                 if len(cmds) > 0:
-                    cmd_ns['commands'] += """<section>
+                    commands.append("""<section>
                     <title>%s</title>
                     <screen><?db-font-size 60%% ?>%s</screen>
-                    </section>""" % (title, '\n'.join(cmds) )
+                    </section>""" % (title, '\n'.join(cmds) ))
                     pass
                 pass
             pass
@@ -2227,9 +2269,10 @@ the host activation guides.
         # eg: dns.enable on requires /etc/resolv.conf to exist.
         if filer.is_active_node:
             cmds = '\n'.join( self.command_gen.vfiler_set_options_commands(vfiler, ns) )
-            cmd_ns['commands'] += """<section>
+            commands.append("""<section>
             <title>vFiler Options</title>
             <screen>%s</screen>
-            </section>""" % cmds
+            </section>""" % cmds)
 
-        return section.safe_substitute(cmd_ns)
+        cmd_ns['commands'] = ''.join(commands)
+        return self.filer_activation_section.safe_substitute(cmd_ns)
@@ -9,7 +9,6 @@ import sys
 import os.path
 import zope.interface
 
-from string import Template
 from lxml import etree
 
 from docgen.interfaces import IDocumentGenerator
@@ -18,6 +17,8 @@ import logging
 from docgen import debug
 log = logging.getLogger('docgen')
 
+XINCLUDE_NAMESPACE = 'http://www.w3.org/2001/XInclude'
+
 class ModiPyGenerator:
     """
     An abstract base class that implements some commonly used functions.
@@ -34,31 +35,21 @@ class NetAppModiPyGenerator(ModiPyGenerator):
     NetApp storage design.
     """
 
-    # Define some important Templates
-    config_template = Template("""<config xmlns:xi='http://www.w3.org/2001/XInclude'>
-    <!-- Include change templates -->
-    $includes
-
-    <!-- Define provisioners -->
-    $provisioners
-    
-    <!-- Define devices -->
-    $devices
-
-    <!-- Define iterators that are used by changes -->
-    $iterators
-
-    <!-- Define changes that use pre-defined templates -->
-    $templated_changes
-
-    <!-- Define changes that do not use pre-defined templates -->
-    $non_templated_changes
-
-</config>""")
+    # The sections of a config, in order: the comment that
+    # introduces each one, and the method that builds its elements.
+    config_sections = [
+        ('Include change templates', 'build_includes'),
+        ('Define provisioners', 'build_provisioners'),
+        ('Define devices', 'build_devices'),
+        ('Define iterators that are used by changes', 'build_iterators'),
+        ('Define changes that use pre-defined templates', 'build_templated_changes'),
+        ('Define changes that do not use pre-defined templates', 'build_non_templated_changes'),
+        ]
     
     def emit(self, outfile=None, versioned=True, ns={}):
     #def emit(self, outfile=None, ns={}):
 
+        opened = False
         if outfile is None:
             outfile = sys.stdout
         else:
@@ -66,21 +57,28 @@ class NetAppModiPyGenerator(ModiPyGenerator):
                 outfile = self.version_filename(outfile, self.conf)
                 pass
             outfile = open(outfile, "w")
+            opened = True
             pass
-    
-        ns['includes'] = self.build_includes()
-        ns['provisioners'] = self.build_provisioners()
-        ns['devices'] = self.build_devices()
-        ns['iterators'] = self.build_iterators()
-        ns['templated_changes'] = self.build_templated_changes()
-        ns['non_templated_changes'] = self.build_non_templated_changes()
 
-        output = self.config_template.safe_substitute(ns)
-        output = etree.fromstring( output, parser=etree.XMLParser() )
-        #log.debug("output: %s", output )
-        outfile.write( etree.tostring(output, pretty_print=True) )
-        #outfile.write(output)
+        # Each element is written out as soon as it is built,
+        # rather than building the whole config up first.
+        with etree.xmlfile(outfile) as xf:
+            with xf.element('config', nsmap={'xi': XINCLUDE_NAMESPACE}):
+                for comment, builder in self.config_sections:
+                    xf.write('\n    ')
+                    xf.write(etree.Comment(' %s ' % comment))
+                    xf.write('\n')
+                    for element in getattr(self, builder)():
+                        xf.write(element, pretty_print=True)
+                        pass
+                    pass
+                xf.write('\n')
+                pass
+            pass
         outfile.write('\n')
+        if opened:
+            outfile.close()
+            pass
 
     def build_includes(self):
         """
@@ -89,24 +87,24 @@ class NetAppModiPyGenerator(ModiPyGenerator):
         FIXME: Need to somehow deal with the template location path
         for modipy. May need to patch modipy.
         """
-        retstr = ''
         # A set of the hrefs needed to find the templates
         includes = [
             "netapp-create-volume.zapi.change-template.xml",
             "netapp-set-volume-option.zapi.change-template.xml",            
             ]
 
-        if self.template_path is not None:
-            include_list = [ "<xi:include href='%s'/>" % os.path.join(self.template_path, x) for x in includes ]
-        else:
-            include_list = [ "<xi:include href='%s'/>" % x for x in includes ]
-        return '\n'.join(include_list)
+        for href in includes:
+            if self.template_path is not None:
+                href = os.path.join(self.template_path, href)
+                pass
+            yield etree.Element('{%s}include' % XINCLUDE_NAMESPACE, href=href, nsmap={'xi': XINCLUDE_NAMESPACE})
+            pass
             
     def build_provisioners(self):
         """
         Build the provisioner definition section for a changeset configuration.
         """
-        return """
+        provisioners = etree.fromstring("""<provisioners>
         <!-- A command provisioner for cmdline provisioning -->
         <provisioner name='netapp_provisioner'
                      module='modipy.provisioner_command'
@@ -122,29 +120,29 @@ class NetAppModiPyGenerator(ModiPyGenerator):
                      type='ZAPIProvisioner'
                      command_timeout='30'>
         </provisioner>
-        """
+        </provisioners>""")
+        for element in provisioners:
+            element.tail = None
+            yield element
+            pass
 
     def build_devices(self):
         """
         Build the device definition section for a changeset
         """
-        retstr = ''
         for filer in self.conf.filers.values():
-            retstr += "\n<device name='%s'/>" % filer.name
+            yield etree.Element('device', name=filer.name)
             pass
-        return retstr
 
     def build_iterators(self):
         """
         Build dictionaries of iteration values that can be used with changes
         or change templates.
         """
-        iterator_template = Template("""<iterator name='$itername'>$iterdicts</iterator>""")
-        iterators = []
         # We need an iterator for the volumes to be created on each filer
         for filer in self.conf.filers.values():
-            volumes = []
-            voloptions = []
+            volumes = etree.Element('iterator', name='iter.%s.volumes' % filer.name)
+            voloptions = etree.Element('iterator', name='iter.%s.volume-options' % filer.name)
             for vol in filer.volumes:
                 voldict = {}
                 voldict['volname'] = vol.name
@@ -161,50 +159,53 @@ class NetAppModiPyGenerator(ModiPyGenerator):
                     odict['option_value'] = value
                     voloptions.append( self.dict_to_iterator_dict(odict) )
 
-            iterators.append( iterator_template.substitute(itername='iter.%s.volumes' % filer.name, iterdicts=''.join(volumes)) )
-            iterators.append( iterator_template.substitute(itername='iter.%s.volume-options' % filer.name, iterdicts=''.join(voloptions)) )
-            
-        return '\n'.join(iterators)
+            yield volumes
+            yield voloptions
+            pass
 
     def build_templated_changes(self):
         """
         Build the change definitions that make use of change templates.
         """
-        changes = []
-
         # A change to sync all change implementations to a common root dependency
-        changes.append("""<change name='start' type='CommandChange'><target>ALL_TARGETS</target></change>""")
+        change = etree.Element('change')
+        change.set('name', 'start')
+        change.set('type', 'CommandChange')
+        etree.SubElement(change, 'target').text = 'ALL_TARGETS'
+        yield change
 
         # Do all the stuff on the primary filers first
         for filer in [ x for x in self.conf.filers.values() if x.site == 'primary' and x.type == 'primary' ]:
             vfiler = filer.vfilers.values()[0]
-            changes.extend( self.build_filer_templated_changes(filer, vfiler) )
-        
-        return '\n'.join(changes)
+            for change in self.build_filer_templated_changes(filer, vfiler):
+                yield change
+                pass
+            pass
+
+    def build_filer_templated_change(self, name, template, iterator, prereq, target):
+        change = etree.Element('change')
+        change.set('name', name)
+        change.set('template', template)
+        change.set('iterator', iterator)
+        etree.SubElement(change, 'depends', on=prereq)
+        etree.SubElement(change, 'target').text = target
+        return change
 
     def build_filer_templated_changes(self, filer, vfiler):
         """
-        Build a list of all the templated changes to use for this filer.
+        Build all the templated changes to use for this filer.
         """
-        change_tmpl = Template("""<change name='$name' template='$template' iterator='$iterator'>
-          <depends on='$prereq'/>
-          <target>$target</target>
-        </change>""")
-
-        changes = []
-
         #
         # Create volumes
         # Volumes are not created on secondary filers
         if not filer.type == 'secondary':
             changename = '%s-create-volumes' % filer.name
             itername = 'iter.%s.volumes' % filer.name
-            changes.append( change_tmpl.substitute(name=changename,
-                                                   iterator=itername,
-                                                   target=filer.name,
-                                                   prereq='start',
-                                                   template='create_netapp_volume')
-                            )
+            yield self.build_filer_templated_change(name=changename,
+                                                    iterator=itername,
+                                                    target=filer.name,
+                                                    prereq='start',
+                                                    template='create_netapp_volume')
             # We use the previous changename as a dependency so that we step through changes
             # in the correct order.
             prev_changename = changename
@@ -212,19 +213,16 @@ class NetAppModiPyGenerator(ModiPyGenerator):
             # Set volume options
             changename = '%s-set-volume-options' % filer.name
             itername = 'iter.%s.volume-options' % filer.name
-            changes.append( change_tmpl.substitute(name=changename,
-                                                   iterator=itername,
-                                                   target=filer.name,
-                                                   prereq=prev_changename,
-                                                   template='netapp_set_volume_option')
-                            )
+            yield self.build_filer_templated_change(name=changename,
+                                                    iterator=itername,
+                                                    target=filer.name,
+                                                    prereq=prev_changename,
+                                                    template='netapp_set_volume_option')
             pass
 
         #
         # Create qtrees
         #
-
-        return changes
     
     def build_non_templated_changes(self):
         """
@@ -232,25 +230,19 @@ class NetAppModiPyGenerator(ModiPyGenerator):
         """
         changes = []
 
-##         changes.append("""<change name='dummy' type='CommandChange'>
-##           <target>wibble</target>
-##         </change>
-##         """)
+##         change = etree.Element('change', name='dummy', type='CommandChange')
+##         etree.SubElement(change, 'target').text = 'wibble'
+##         changes.append(change)
         
-        return ''.join(changes)
+        return changes
 
     def dict_to_iterator_dict(self, dict):
         """
         Convert a Python dictionary to a ModiPy iterator
         """
-        dict_template = Template("""<dict>$entries</dict>""")
-        entry_template = Template("""<entry name='$key'>$value</entry>""")
-
-        entries = []
+        iterdict = etree.Element('dict')
         for key in dict:
-            entries.append( entry_template.substitute(key=key, value=dict[key]) )
-            #log.debug("entries is: %s", entries)
+            etree.SubElement(iterdict, 'entry', name=key).text = '%s' % dict[key]
             pass
 
-        return dict_template.substitute(entries=''.join(entries))
-            
+        return iterdict
@@ -3,7 +3,11 @@
 # Dump activation commands out as as plain text
 #
 
+import os
+import os.path
 import sys
+import json
+import multiprocessing
 from zope.interface import implements
 from ConfigParser import NoSectionError, NoOptionError
 
@@ -13,6 +17,12 @@ log = logging.getLogger('docgen')
 
 from docgen.interfaces import IDocumentGenerator
 from docgen.base import FileOutputMixin
+from docgen.defaults import get_defaults
+
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
 
 class CommandGenerator(FileOutputMixin):
     """
@@ -22,7 +32,67 @@ class CommandGenerator(FileOutputMixin):
 
     def __init__(self, project, defaults):
         self.project = project
-        self.defaults = defaults
+        self.defaults = get_defaults(defaults)
+
+    def get_source_name(self, section, filer):
+        """
+        The name a snapvault or snapmirror target uses for its source filer.
+        @param section: 'snapvault' or 'snapmirror'
+        """
+        source_patt = getattr(self.defaults, section).source_name
+        if source_patt is None:
+            return "%s" % filer.name
+        return source_patt % { 'filer_name': filer.name }
+
+# The ways command output can be split into files
+SHARD_MODES = ('filer', 'vfiler')
+MANIFEST_NAME = 'manifest.json'
+
+class CommandShard:
+    """
+    The commands for one filer, or one vFiler, to be written
+    to a file of their own.
+    """
+    def __init__(self, filename, filer, vfiler=None):
+        self.filename = filename
+        self.filer = filer
+        self.vfiler = vfiler
+        self.commands = []
+        # The shards that must be run before this one
+        self.depends = []
+        # Shards in the same stage can be run at the same time
+        self.stage = None
+
+    def get_content(self):
+        return '\n'.join(self.commands) + '\n'
+
+    def get_manifest_entry(self, content):
+        entry = {}
+        entry['file'] = self.filename
+        entry['filer'] = self.filer.name
+        if self.vfiler is not None:
+            entry['vfiler'] = self.vfiler.name
+            pass
+        entry['sha1'] = sha1(content).hexdigest()
+        entry['size'] = len(content)
+        entry['stage'] = self.stage
+        entry['depends'] = [ x.filename for x in self.depends ]
+        return entry
+
+# The generator that worker processes build command blocks for.
+# It is set before the workers are forked, so that they all share
+# the parent's model rather than each being sent a copy of it.
+_worker_generator = None
+
+def _build_filer_block(job):
+    """
+    Build the commands for one filer and vFiler in a worker process.
+    """
+    filer_index, vfiler_index, ns = job
+    filer = _worker_generator.project.get_filers()[filer_index]
+    vfiler = filer.get_vfilers()[vfiler_index]
+    log.debug("Building activation commands for %s:%s", filer, vfiler)
+    return _worker_generator.build_filer_activation_commands(filer, vfiler, ns)
 
 class NetAppCommandsGenerator(CommandGenerator):
     """
@@ -32,7 +102,7 @@ class NetAppCommandsGenerator(CommandGenerator):
 
     def emit(self, outfile=None, ns={}):
 
-        ns['iscsi_prefix'] = self.defaults.get('global', 'iscsi_prefix')
+        ns['iscsi_prefix'] = self.defaults.global_.iscsi_prefix
 
         cmdlist = []
         cmdlist.extend( self.build_activation_commands(ns) )
@@ -54,10 +124,8 @@ class NetAppCommandsGenerator(CommandGenerator):
         # Build the commands for all filers
         # FIXME: Divide them up by type or site later
 
-        for filer in self.project.get_filers():
-            for vfiler in filer.get_vfilers():
-                log.debug("Building activation commands for %s:%s", filer, vfiler)
-                activation_commands.extend( self.build_filer_activation_commands(filer, vfiler, ns) )
+        for filer, vfiler, commands in self.build_filer_blocks(ns):
+            activation_commands.extend(commands)
             
         # Build the commands for all primary filers
 #         for filer in [ x for x in self.project.get_filers() if x.site.type == 'primary' and x.type == 'primary' ]:
@@ -89,6 +157,195 @@ class NetAppCommandsGenerator(CommandGenerator):
 
         return activation_commands
 
+    def build_filer_blocks(self, ns):
+        """
+        Build the activation commands for each filer and vFiler.
+        @returns: a list of (filer, vfiler, commands) tuples
+        """
+        pairs = []
+        for filer in self.project.get_filers():
+            for vfiler in filer.get_vfilers():
+                pairs.append( (filer, vfiler) )
+                pass
+            pass
+
+        workers = self.get_workers()
+        if workers > 1:
+            blocks = self.build_parallel_activation_commands(ns, workers)
+        else:
+            blocks = []
+            for filer, vfiler in pairs:
+                log.debug("Building activation commands for %s:%s", filer, vfiler)
+                blocks.append( self.build_filer_activation_commands(filer, vfiler, ns) )
+                pass
+            pass
+        return [ (filer, vfiler, commands) for (filer, vfiler), commands in zip(pairs, blocks) ]
+
+    def emit_shards(self, directory, per='filer', ns={}):
+        """
+        Write the commands for each filer, or each vFiler, to a file
+        of its own in a directory, along with a manifest that lists
+        the files in the order they must be run, and their checksums.
+        @param per: 'filer' or 'vfiler'
+        @returns: the names of the files written
+        """
+        ns['iscsi_prefix'] = self.defaults.global_.iscsi_prefix
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+            pass
+
+        written = []
+        entries = []
+        for shard in self.build_shards(ns, per):
+            content = shard.get_content()
+            filename = os.path.join(directory, shard.filename)
+            f = open(filename, 'w')
+            f.write(content)
+            f.close()
+            written.append(filename)
+            entries.append(shard.get_manifest_entry(content))
+            pass
+
+        manifest = {}
+        manifest['project'] = getattr(self.project, 'name', '')
+        manifest['per'] = per
+        manifest['files'] = entries
+        filename = os.path.join(directory, MANIFEST_NAME)
+        f = open(filename, 'w')
+        json.dump(manifest, f, indent=2, sort_keys=True, separators=(',', ': '))
+        f.write('\n')
+        f.close()
+        written.append(filename)
+        return written
+
+    def build_shards(self, ns, per='filer'):
+        """
+        Split the activation commands up by filer, or by vFiler.
+        @returns: a list of CommandShards, in an order they can be run in
+        """
+        if per not in SHARD_MODES:
+            raise ValueError("Cannot split commands up by '%s'. Choose from: %s" % (per, ', '.join(SHARD_MODES)))
+
+        shards = []
+        known = {}
+        for filer, vfiler, commands in self.build_filer_blocks(ns):
+            if per == 'filer':
+                key = filer.name
+            else:
+                key = (filer.name, vfiler.name)
+                pass
+            if key not in known:
+                if per == 'filer':
+                    shard = CommandShard('%s.txt' % filer.name, filer)
+                else:
+                    shard = CommandShard('%s-%s.txt' % (filer.name, vfiler.name), filer, vfiler)
+                    pass
+                known[key] = shard
+                shards.append(shard)
+                pass
+            known[key].commands.extend(commands)
+            pass
+
+        for shard in shards:
+            sources = self.get_source_filers(shard.filer)
+            shard.depends = [ x for x in shards if x.filer in sources ]
+            pass
+        return self.order_shards(shards)
+
+    def get_source_filers(self, filer):
+        """
+        Find the other filers whose volumes must be created before
+        the SnapVaults and SnapMirrors to this filer can be initialised.
+        """
+        sources = []
+        for vol in filer.get_volumes():
+            for snap in vol.snapvaults + vol.snapmirrors:
+                if snap.targetvol == vol:
+                    source = snap.sourcevol.get_filer()
+                    if source is not filer and source not in sources:
+                        sources.append(source)
+                        pass
+                    pass
+                pass
+            pass
+        return sources
+
+    def order_shards(self, shards):
+        """
+        Put the shards into stages, so that every shard comes after
+        the ones it depends on. Within a stage, the shards stay in
+        the order they were built in.
+        """
+        ordered = []
+        remaining = list(shards)
+        stage = 1
+        while len(remaining) > 0:
+            ready = [ x for x in remaining if len([ y for y in x.depends if y.stage is None ]) == 0 ]
+            if len(ready) == 0:
+                log.warn("Circular dependency between %s. Putting them in the same stage.",
+                         ', '.join([ x.filename for x in remaining ]))
+                ready = remaining
+                pass
+            for shard in ready:
+                shard.stage = stage
+                pass
+            ordered.extend(ready)
+            remaining = [ x for x in remaining if x.stage is None ]
+            stage += 1
+            pass
+        return ordered
+
+    def get_workers(self):
+        """
+        How many processes to build the filer commands on.
+        Only one, unless the configuration asks for more.
+        """
+        try:
+            workers = self.defaults.getint('commands', 'workers')
+        except (NoSectionError, NoOptionError):
+            return 1
+
+        if workers > 1 and not hasattr(os, 'fork'):
+            log.info("Cannot share the project with worker processes here. Using just one.")
+            return 1
+
+        # Pool workers can't start pools of their own
+        if workers > 1 and multiprocessing.current_process().daemon:
+            return 1
+        return workers
+
+    def build_parallel_activation_commands(self, ns, workers):
+        """
+        Build the commands for each filer and vFiler on a pool of
+        worker processes.
+        @returns: the list of commands for each filer and vFiler,
+        in the same order they are built in one at a time.
+        """
+        global _worker_generator
+
+        jobs = []
+        for filer_index, filer in enumerate(self.project.get_filers()):
+            for vfiler_index, vfiler in enumerate(filer.get_vfilers()):
+                jobs.append( (filer_index, vfiler_index, ns) )
+                pass
+            pass
+
+        _worker_generator = self
+        try:
+            if len(jobs) < 2:
+                return [ _build_filer_block(job) for job in jobs ]
+
+            pool = multiprocessing.Pool(min(workers, len(jobs)))
+            try:
+                # map() hands back the results in the order of the jobs
+                return pool.map(_build_filer_block, jobs, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        finally:
+            _worker_generator = None
+
     def build_filer_activation_commands(self, filer, vfiler, ns):
         """
         Build the various command sections for a specific filer.
@@ -614,13 +871,7 @@ class NetAppCommandsGenerator(CommandGenerator):
                         
                     elif snap.targetvol == vol:
                         # Grab the target address to use for the source
-                        try:
-                            source_patt = self.defaults.get('snapvault', 'source_name')
-                            ns = {}
-                            ns['filer_name'] = snap.sourcevol.get_filer().name
-                            source_name = source_patt % ns
-                        except (NoSectionError, NoOptionError):
-                            source_name = "%s" % snap.sourcevol.get_filer().name
+                        source_name = self.get_source_name('snapvault', snap.sourcevol.get_filer())
                         
                         if snap.sourcevol.name.endswith('root'):
                             if (snap.sourcevol.filer, snap.sourcevol, 'root') not in donelist:
@@ -663,13 +914,7 @@ class NetAppCommandsGenerator(CommandGenerator):
                         log.error("You cannot initialise the snapmirror from the source filer.")
                         
                     elif snap.targetvol == vol:
-                        try:
-                            source_patt = self.defaults.get('snapmirror', 'source_name')
-                            ns = {}
-                            ns['filer_name'] = snap.sourcevol.get_filer().name
-                            source_name = source_patt % ns
-                        except (NoSectionError, NoOptionError):
-                            source_name = "%s" % snap.sourcevol.get_filer().name
+                        source_name = self.get_source_name('snapmirror', snap.sourcevol.get_filer())
 
                         if (snap.sourcevol, snap.targetvol) not in donelist:
                             cmdset.append("vol restrict %s" % snap.targetvol.name)
@@ -699,13 +944,7 @@ class NetAppCommandsGenerator(CommandGenerator):
                     log.warn("/etc/snapmirror not used on the source filer.")
                         
                 elif snap.targetvol == vol:
-                    try:
-                        source_patt = self.defaults.get('snapmirror', 'source_name')
-                        ns = {}
-                        ns['filer_name'] = snap.sourcevol.get_filer().name
-                        source_name = source_patt % ns
-                    except (NoSectionError, NoOptionError):
-                        source_name = "%s" % snap.sourcevol.get_filer().name
+                    source_name = self.get_source_name('snapmirror', snap.sourcevol.get_filer())
                     
                     # Use a transfer schedule
                     cmdset.append("%s:%s %s:%s %s %s" % (source_name, snap.sourcevol.name, snap.targetvol.get_filer().name, snap.targetvol.name, snap.arguments, snap.etc_snapmirror_conf_schedule()))
@@ -928,16 +1167,10 @@ class NetAppCommandsGenerator(CommandGenerator):
         #cmdset.append("vfiler context %s" % vfiler.name)
         log.debug("Finding NFS exports for filer: %s", filer.name)
 
-        try:
-            export_security = self.defaults.getboolean('nfs', 'export_security')
-        except (NoSectionError, NoOptionError):
-            export_security = True
+        export_security = self.defaults.nfs.export_security
         
         # Do we do exports to each IP, or to the entire subnet?
-        try:
-            subnet_exports = self.defaults.getboolean('nfs', 'subnet_exports')
-        except (NoSectionError, NoOptionError):
-            subnet_exports = False
+        subnet_exports = self.defaults.nfs.subnet_exports
         
         for vol in [ x for x in filer.get_volumes() if x.protocol == 'nfs' ]:
             log.debug("Found volume: %s", vol)
@@ -30,6 +30,12 @@ class Export(XMLConfigurable):
         #'ro',
         'toip',
         ]
+
+    slotted_attribs = [
+        'tohost',
+        'fromip',
+        'toip',
+        ]
     
     def __init__(self, type='rw', tohost=None, fromip=None, toip=None):
         """
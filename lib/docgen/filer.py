@@ -3,7 +3,7 @@
 """
 NetApp Filer object
 """
-from base import DynamicNamedXMLConfigurable, LunNumbering
+from base import DynamicNamedXMLConfigurable, LunNumbering, cached_view
 
 import logging
 import debug
@@ -46,7 +46,7 @@ class Filer(DynamicNamedXMLConfigurable, LunNumbering):
         # both cluster nodes?
         self.is_active_node = True
 
-        self.current_lunid = 0
+        self.lunid_allocator = None
         
     def configure_from_node(self, node, defaults, site):
         self.site = site
@@ -85,10 +85,8 @@ class Filer(DynamicNamedXMLConfigurable, LunNumbering):
         retstr += '\n'.join(vfiler_strings)
         return retstr
 
-    def populate_namespace(self, ns={}):
-        ns = self.site.populate_namespace(ns)
-        ns['filer_name'] = self.name
-        return ns
+    def get_namespace_frame(self):
+        return { 'filer_name': self.name }
 
     def get_filer(self):
         return self
@@ -112,6 +110,7 @@ class Filer(DynamicNamedXMLConfigurable, LunNumbering):
             volumes.extend(aggr.get_volumes())
             pass
         return volumes
+    get_volumes = cached_view(get_volumes)
 
     def get_luns(self):
         luns = []
@@ -119,6 +118,7 @@ class Filer(DynamicNamedXMLConfigurable, LunNumbering):
             luns.extend( vol.get_luns() )
             pass
         return luns
+    get_luns = cached_view(get_luns)
 
     def get_aggregates(self):
         """
@@ -131,6 +131,7 @@ class Filer(DynamicNamedXMLConfigurable, LunNumbering):
             aggrlist.extend( vfiler.get_aggregates() )
             pass
         return aggrlist
+    get_aggregates = cached_view(get_aggregates)
 
     def get_allowed_protocols(self):
         """
@@ -152,6 +153,23 @@ class Filer(DynamicNamedXMLConfigurable, LunNumbering):
             pass
         return igroups
 
+    def release_source_node(self):
+        """
+        Drop the references to the definition nodes of my
+        volumes and iGroups, and those of my vFilers.
+        """
+        for vol in self.get_volumes():
+            vol.release_source_node()
+            pass
+        for igroup in self.children['igroup']:
+            igroup.release_source_node()
+            pass
+        for vfiler in self.get_vfilers():
+            for igroup in vfiler.get_igroups():
+                igroup.release_source_node()
+                pass
+            pass
+
     def setup_exports(self):
         """
         Set up the exports from myself and my vfilers
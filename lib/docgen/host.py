@@ -136,12 +136,11 @@ class Host(DynamicNamedXMLConfigurable):
 ##         except IndexError:
 ##             raise ValueError("Host '%s' has no storage IP addresses defined." % self.name)
 
-    def populate_namespace(self, ns={}):
-        ns = self.parent.populate_namespace(ns)
-        ns['host_name'] = self.name
-        ns['host_os'] = self.operatingsystem
-        ns['host_platform'] = self.platform
-        return ns
+    def get_namespace_frame(self):
+        return { 'host_name': self.name,
+                 'host_os': self.operatingsystem,
+                 'host_platform': self.platform,
+                 }
 
 class Filesystem:
 
@@ -3,6 +3,8 @@
 """
 NetApp iGroup object
 """
+from lxml import etree
+
 from base import DynamicNamedXMLConfigurable
 
 import logging
@@ -39,12 +41,95 @@ class iGroup(DynamicNamedXMLConfigurable):
         # Find igroup members
         self.children['member'] = node.findall('member')
 
+    def configure_from_attributes(self, attribs, defaults, parent):
+        DynamicNamedXMLConfigurable.configure_from_attributes(self, attribs, defaults, parent)
+        self.children['member'] = []
+
+    def release_source_node(self):
+        """
+        Keep the names of my members, rather than their nodes.
+        """
+        members = []
+        for member in self.children['member']:
+            if etree.iselement(member):
+                member = member.attrib.get('name')
+                pass
+            members.append(member)
+            pass
+        self.children['member'] = members
+
     def get_luns(self):
         return self.luns
         
     def get_exports(self):
         return self.exports
 
+def create_igroup(defaults, parent, **attribs):
+    """
+    Create an iGroup directly, without a definition node.
+    The keyword arguments are its attributes, as they would
+    be given in a node.
+    """
+    obj = iGroup()
+    obj.configure_from_attributes(attribs, defaults, parent)
+    return obj
+
+def export_signature(exports):
+    """
+    A hashable signature for a list of exports. Two export lists
+    have the same signature if their exports compare equal.
+    """
+    return tuple([ (x.type, x.tohost, x.fromip, x.toip) for x in exports ])
+
+class ExportGrouping:
+    """
+    Finds the iGroup that a LUN belongs in from its exports.
+
+    A LUN belongs in the first iGroup created whose export list
+    matches the LUN's, export by export, for as many exports as the
+    shorter of the two lists has. So a LUN with no exports matches any
+    iGroup, and an iGroup exporting to hosts A and B matches a LUN
+    exported to A, B and C.
+
+    Rather than comparing a LUN against every iGroup, the groups are
+    indexed by their export signatures, and by every leading part of
+    their signatures, so finding a LUN's group only depends on how
+    many exports the LUN has.
+    """
+    def __init__(self):
+        self.groups = []
+        # The first group with exactly this signature
+        self.exact = {}
+        # The first group whose signature starts with this one
+        self.leading = {}
+
+    def find_group(self, signature):
+        """
+        Find the first group that matches a signature, or None.
+        """
+        # Groups that start with the whole of the signature
+        found = self.leading.get(signature)
+
+        # Groups that the signature starts with
+        for i in range(len(signature) + 1):
+            index = self.exact.get(signature[:i])
+            if index is not None and (found is None or index < found):
+                found = index
+                pass
+            pass
+
+        if found is None:
+            return None
+        return self.groups[found]
+
+    def add_group(self, signature, group):
+        index = len(self.groups)
+        self.groups.append(group)
+        self.exact.setdefault(signature, index)
+        for i in range(len(signature) + 1):
+            self.leading.setdefault(signature[:i], index)
+            pass
+
 def create_igroup_from_node(node, defaults, parent):
     obj = iGroup()
     obj.configure_from_node(node, defaults, parent)
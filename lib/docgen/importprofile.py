@@ -0,0 +1,144 @@
+# $Id$
+#
+
+"""
+Import time profiling for DocGen.
+
+Much of the time a short create_document.py run takes is spent
+importing modules. Setting DOCGEN_IMPORTTIME in the environment
+makes the docgen package time every import done from then on, and
+print a report to STDERR when the program exits, in the same format
+as Python 3's -X importtime:
+
+  import time: self [us] | cumulative | imported package
+
+The report only covers docgen's own modules, and the modules they
+import directly, so that what each part of DocGen costs to start
+up can be followed over time without the noise of everything else.
+"""
+import sys
+import time
+import atexit
+import __builtin__
+
+ENVIRONMENT_VARIABLE = 'DOCGEN_IMPORTTIME'
+
+class ImportProfiler:
+    """
+    Time imports by replacing the builtin __import__.
+    """
+    def __init__(self, scope='docgen'):
+        self.scope = scope
+        # (depth, module name, self time, cumulative time, in scope),
+        # in the order the imports finished
+        self.records = []
+        # The time spent in nested imports, for each import in progress
+        self.stack = []
+        self.original_import = None
+
+    def install(self):
+        if self.original_import is None:
+            self.original_import = __builtin__.__import__
+            __builtin__.__import__ = self.timed_import
+            pass
+
+    def uninstall(self):
+        if self.original_import is not None:
+            __builtin__.__import__ = self.original_import
+            self.original_import = None
+            pass
+
+    def in_scope(self, name):
+        return name == self.scope or name.startswith(self.scope + '.')
+
+    def get_candidates(self, name, importer, fromlist):
+        """
+        The modules an import statement might load, allowing for
+        implicit relative imports and 'from package import module'.
+        """
+        candidates = []
+        if importer is not None and '.' in importer:
+            candidates.append('%s.%s' % (importer.rsplit('.', 1)[0], name))
+            pass
+        candidates.append(name)
+        if fromlist:
+            candidates.extend([ '%s.%s' % (name, x) for x in fromlist if x != '*' ])
+            pass
+        return candidates
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=None, level=-1):
+        importer = None
+        if globals is not None:
+            importer = globals.get('__name__')
+            pass
+
+        # Only imports that load something are worth timing.
+        # Failed implicit relative imports leave None in sys.modules.
+        candidates = [ x for x in self.get_candidates(name, importer, fromlist) if sys.modules.get(x) is None ]
+        if len(candidates) == 0:
+            return self.original_import(name, globals, locals, fromlist, level)
+
+        self.stack.append(0)
+        start = time.time()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.time() - start
+            nested = self.stack.pop()
+            if self.stack:
+                self.stack[-1] += elapsed
+                pass
+            loaded = [ x for x in candidates if sys.modules.get(x) is not None ]
+            if len(loaded) > 0:
+                modname = loaded[0]
+                in_scope = self.in_scope(modname) or (importer is not None and self.in_scope(importer))
+                self.records.append( (len(self.stack), modname, elapsed - nested, elapsed, in_scope) )
+                pass
+            pass
+
+    def get_total(self):
+        """
+        The cumulative time of the outermost imports in scope.
+        """
+        total = 0.0
+        depth = None
+        for record in self.records:
+            if record[4] and (depth is None or record[0] <= depth):
+                depth = record[0]
+                pass
+            pass
+        for record in self.records:
+            if record[4] and record[0] == depth:
+                total += record[3]
+                pass
+            pass
+        return total
+
+    def format_report(self):
+        lines = [ "import time: self [us] | cumulative | imported package" ]
+        for depth, name, selftime, cumulative, in_scope in self.records:
+            if not in_scope:
+                continue
+            lines.append("import time: %9d | %10d | %s%s" % (selftime * 1e6, cumulative * 1e6, '  ' * depth, name))
+            pass
+        lines.append("import time: %9s | %10d | total for %s" % ('', self.get_total() * 1e6, self.scope))
+        return '\n'.join(lines)
+
+    def report(self, outfile=None):
+        if outfile is None:
+            outfile = sys.stderr
+            pass
+        outfile.write(self.format_report() + '\n')
+
+profiler = None
+
+def install_from_environment(environ):
+    """
+    Start profiling imports if the environment asks for it.
+    """
+    global profiler
+    if not environ.get(ENVIRONMENT_VARIABLE) or profiler is not None:
+        return
+    profiler = ImportProfiler()
+    profiler.install()
+    atexit.register(profiler.report)
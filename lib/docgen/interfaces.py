@@ -46,13 +46,18 @@ class IXMLConfigurable(Interface):
         
 class IDynamicNaming(Interface):
 
-    def populate_namespace(self, ns={}):
+    def populate_namespace(self, ns=None):
         """
         Take a namespace passed in (or a blank one)
         and add any extra bits to be found at this
         level to the namespace.
         """
 
+    def get_namespace_frame(self):
+        """
+        The names this object adds to its parent's namespace.
+        """
+
 class IDocumentGenerator(Interface):
     """
     The IDocumentGenerator is an interface that should be implemented by
@@ -30,6 +30,10 @@ class IPAddress(XMLConfigurable):
         'vlan_number',
         ]
 
+    slotted_attribs = [
+        'vlan',
+        ]
+
     known_types = [
         'primary',
         'alias',
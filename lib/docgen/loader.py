@@ -0,0 +1,274 @@
+# $Id$
+#
+
+"""
+Streaming project definition loader.
+
+Loading a definition with etree.parse() keeps the whole parsed
+tree in memory until the document has been generated. For very
+large projects, load_project() uses iterparse() instead, and
+configures each child of the <project/> as soon as its end tag
+has been read. Once a site has been configured, its part of the
+definition is thrown away, so the parsed tree never holds much
+more than one site at a time.
+
+Things that refer to other parts of the project, such as drhosts,
+snapvaultsets and snapmirrorsets, are linked together by the
+project's setup pass once the whole definition has been read.
+
+Some things have to be known before any site is configured: the
+exports given at the project level, whose mountoptions apply to every
+qtree wherever they are in the definition, and, if LUNs are numbered
+across the whole project, the ids of those numbered by hand anywhere
+in it. So the definition is read through once beforehand to find
+them, throwing it away a child of the project at a time.
+
+load_definition() is what the command line programs use to get a
+project, either from the cache, the streaming loader or a plain parse.
+"""
+import time
+from lxml import etree
+
+from docgen.project import Project
+from docgen.modelcache import cache_from_config, find_dependencies
+from docgen.registry import lookup_factory
+from docgen.base import add_child_accessor
+from docgen.defaults import get_defaults
+from docgen.lunid import is_project_scope, get_manual_lunids
+from docgen.context import get_streamed_context
+
+import debug
+import logging
+log = logging.getLogger('docgen')
+
+def load_project(source, defaults, timings=None):
+    """
+    Load a project definition one top level element at a time.
+    @param source: a filename or file object to read the definition from
+    @param timings: a list to add (phase, seconds) tuples to, for how
+    long parsing, configuring and setting up the project took
+    @returns: a configured L{Project}
+    """
+    defaults = get_defaults(defaults)
+    project = None
+    depth = 0
+    start = time.time()
+    configure_time = 0.0
+
+    scan = scan_definition(source)
+    if scan is None:
+        log.warn("Definition can't be read twice, so project level exports and LUNs numbered by hand are only found one site at a time")
+        manual_lunids = None
+        exports = None
+    else:
+        manual_lunids, exports = scan
+        pass
+    project_scope = is_project_scope(defaults.lun.lun_numbering)
+
+    context = None
+    position = -1
+    for event, elem in etree.iterparse(source, events=('start', 'end'), resolve_entities=True):
+        if event == 'start':
+            depth += 1
+            if depth == 1:
+                configure_start = time.time()
+                project = start_project(elem, defaults)
+                if project_scope and manual_lunids:
+                    project.get_lunid_allocator(defaults).reserve(manual_lunids)
+                    pass
+                if exports is not None:
+                    context = get_streamed_context(elem, exports)
+                    project.ancestor_context = context
+                    pass
+                configure_time += time.time() - configure_start
+            elif depth == 2:
+                position += 1
+                pass
+            continue
+
+        depth -= 1
+        if depth != 1:
+            continue
+
+        # A child of the project has been read in full
+        if elem.tag in project.children:
+            configure_start = time.time()
+            if project_scope and manual_lunids is None:
+                project.get_lunid_allocator(defaults).reserve(get_manual_lunids(elem))
+                pass
+            if context is not None:
+                context.layout.positions[elem] = position
+                pass
+            create_func = lookup_factory(elem.tag, project)
+            child = create_func(elem, defaults, project)
+            project.children[elem.tag].append(child)
+            if hasattr(child, 'release_source_node'):
+                child.release_source_node()
+            if context is not None:
+                del context.layout.positions[elem]
+                pass
+            configure_time += time.time() - configure_start
+            pass
+
+        # Throw away the element, and anything before it. Without
+        # the exports found beforehand, those read so far are kept,
+        # so they at least apply to the sites after them.
+        if context is None and elem.tag == 'export':
+            continue
+        elem.clear()
+        for previous in list(elem.itersiblings(preceding=True)):
+            if context is None and previous.tag == 'export':
+                continue
+            elem.getparent().remove(previous)
+            pass
+        pass
+
+    if project is None:
+        raise ValueError("No project found in definition")
+
+    # Reading the file and parsing it happens in between configuring
+    add_timing(timings, 'parse', time.time() - start - configure_time)
+    add_timing(timings, 'configure', configure_time)
+
+    start = time.time()
+    project.ancestor_context = None
+    project.setup(defaults)
+    project.release_source_nodes()
+    add_timing(timings, 'setup', time.time() - start)
+    return project
+
+def scan_definition(source):
+    """
+    Read through a definition for what has to be known before any
+    site is configured, throwing away each child of the project
+    once it has been read.
+    @returns: a list of the ids of the LUNs numbered by hand, and
+    a list of (position, hostname, mountoptions) for the exports among
+    the children of the project, or None if the definition is a file
+    object that can't be read again afterwards
+    """
+    if not isinstance(source, basestring):
+        try:
+            offset = source.tell()
+        except (AttributeError, IOError):
+            return None
+        pass
+
+    lunids = []
+    exports = []
+    depth = 0
+    position = -1
+    for event, elem in etree.iterparse(source, events=('start', 'end'), resolve_entities=True):
+        if event == 'start':
+            depth += 1
+            if depth == 2:
+                position += 1
+                pass
+            continue
+
+        depth -= 1
+        if elem.tag == 'lun' and 'lunid' in elem.attrib:
+            lunids.append(int(elem.attrib['lunid']))
+            pass
+        if depth != 1:
+            continue
+
+        if elem.tag == 'export' and 'to' in elem.attrib:
+            mountoptions = [ x.text for x in elem.iterchildren('mountoption') ]
+            if len(mountoptions) > 0:
+                exports.append( (position, elem.attrib['to'], mountoptions) )
+                pass
+            pass
+
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+            pass
+        pass
+
+    if not isinstance(source, basestring):
+        source.seek(offset)
+        pass
+    return lunids, exports
+
+def add_timing(timings, phase, elapsed):
+    if timings is not None:
+        timings.append( (phase, elapsed) )
+        pass
+
+def start_project(node, defaults):
+    """
+    Create the project from its start tag, which has all the
+    attributes but none of the children yet.
+    """
+    if node.tag != Project.xmltag:
+        raise ValueError("Definition root is '%s', not '%s'" % (node.tag, Project.xmltag))
+
+    project = Project()
+    project.parent = None
+    project.configure_mandatory_attributes(node, defaults)
+    project.configure_optional_attributes(node, defaults)
+    project.name_dynamically(defaults)
+
+    project.children = {}
+    for tag in project.get_child_tags(defaults):
+        project.children[tag] = []
+        add_child_accessor(Project, tag)
+        pass
+    return project
+
+def load_definition(definitionfile, defaults, configfiles=[], streaming=False, use_cache=True, cache=None, timings=None):
+    """
+    Load a project definition file the way the command line
+    programs do.
+    @param configfiles: the configuration files defaults was read from
+    @param streaming: use load_project() rather than parsing the whole file
+    @param use_cache: look for the project in the model cache first,
+    and save it there if it isn't
+    @param cache: the L{ModelCache} to use, instead of the one
+    set in the configuration
+    @param timings: a list to add (phase, seconds) tuples to, for
+    each phase of loading the project: 'parse', 'configure' and
+    'setup', and 'cache' for looking it up in the cache, and
+    storing it there if it wasn't found
+    """
+    # Use a previously configured copy of the project, if there is one
+    if use_cache:
+        start = time.time()
+        if cache is None:
+            cache = cache_from_config(defaults)
+            pass
+        cachekey = cache.get_key(definitionfile, configfiles)
+        proj = cache.load(cachekey)
+        cache_time = time.time() - start
+        if proj is not None:
+            add_timing(timings, 'cache', cache_time)
+            return proj
+        pass
+
+    if streaming:
+        proj = load_project(definitionfile, defaults, timings)
+    else:
+        defaults = get_defaults(defaults)
+        start = time.time()
+        # Definitions can include other files as external entities,
+        # which newer versions of lxml don't load unless asked to.
+        tree = etree.parse(definitionfile, etree.XMLParser(resolve_entities=True))
+        add_timing(timings, 'parse', time.time() - start)
+
+        start = time.time()
+        proj = Project()
+        proj.configure_model(tree.getroot(), defaults, None)
+        add_timing(timings, 'configure', time.time() - start)
+
+        start = time.time()
+        proj.setup(defaults)
+        add_timing(timings, 'setup', time.time() - start)
+        pass
+
+    if use_cache:
+        start = time.time()
+        cache.store(cachekey, proj, find_dependencies(definitionfile))
+        add_timing(timings, 'cache', cache_time + time.time() - start)
+        pass
+    return proj
@@ -35,6 +35,10 @@ class Lun(DynamicNamedXMLConfigurable):
         'restartnumbering',
         ]
 
+    slotted_attribs = [
+        'igroup',
+        ]
+
     def __init__(self):
         self.igroup = None
 
@@ -46,55 +50,47 @@ class Lun(DynamicNamedXMLConfigurable):
         Configure optional Lun attributes
         """
         DynamicNamedXMLConfigurable.configure_optional_attributes(self, node, defaults)        
+        allocator = self.parent.get_lunid_allocator(defaults)
+
         # Check to see if we need to restart the lunid numbering
         if self.restartnumbering is not None:
-            self.parent.set_current_lunid( int(self.restartnumbering), defaults)
+            allocator.restart( int(self.restartnumbering) )
             pass
         
         # Check to see if the lunid is specified for this lun
         if self.lunid is not None:
             self.lunid = int(self.lunid)
             log.debug("lunid manually specified: %d", self.lunid)
+            allocator.reserve( [ self.lunid ] )
         else:
-            self.lunid = self.parent.get_next_lunid(defaults)
+            self.lunid = allocator.allocate()
+            pass
+        allocator.assign(self.lunid, self)
             
         try:
             self.size = float(self.size)
         except TypeError:
             log.debug("No LUN size specified. Figuring it out...")
 
-            # If you specify LUN sizes, the system will use exactly
-            # what you define in the config file.
-            # If you don't specify the LUN size, then the system will
-            # divide up however much storage is left in the volume evenly
-            # between the number of LUNs that don't have a size specified.
-
-            # Count the number of LUNs with no size specified. Available
-            # usable storage will be divided evenly between them
-            nosize_luns = len(node.xpath("parent::*/descendant-or-self::lun[not(@size)]"))
-            log.debug("unsized luns are: %s", nosize_luns)
-            # total the number of sized luns
-            sized_luns = node.xpath("parent::*/descendant-or-self::lun[(@size)]")
-
-            sized_total = sum([ int(lun.attrib['size']) for lun in sized_luns ])
-            log.debug("sized total is: %s", sized_total)
-
-            log.debug("Available for allocation: %s", self.parent.get_iscsi_usable() - sized_total)
-
-            self.size = float(self.parent.get_iscsi_usable() - sized_total) / nosize_luns
+            # My container works out how to share its space between
+            # the LUNs in it that don't have a size.
+            sizing = getattr(self.parent, 'lun_sizing', None)
+            if sizing is None:
+                # I'm being configured outside of my container
+                sizing = LunSizing(node.getparent())
+                pass
+            self.size = sizing.get_unsized_lun_size(self.parent.get_iscsi_usable())
             log.debug("calculated lun size of: %s", self.size)
             pass
         
         log.debug("Allocating %sg storage to LUN", self.size)
         self.parent.add_to_lun_total(self.size)
 
-    def populate_namespace(self, ns={}):
+    def get_namespace_frame(self):
         """
         Add my own namespace pieces
         """
-        ns = self.parent.populate_namespace(ns)
-        ns['lunid'] = self.lunid
-        return ns
+        return { 'lunid': self.lunid }
         
     def full_path(self):
         """
@@ -105,6 +101,62 @@ class Lun(DynamicNamedXMLConfigurable):
     def get_create_size(self):
         return util.get_create_size(self.size)
 
+class LunSizing:
+    """
+    How the storage in a LUN container, a volume or qtree, is shared
+    out between the LUNs in it.
+
+    If you specify LUN sizes, the system will use exactly
+    what you define in the config file.
+    If you don't specify the LUN size, then the system will
+    divide up however much storage is left in the container evenly
+    between the number of LUNs that don't have a size specified.
+
+    The LUNs in the container are only counted once, the first time
+    an unsized LUN needs to know its size.
+    """
+    def __init__(self, node):
+        """
+        @param node: the container's definition node
+        """
+        self.node = node
+        self.sized_total = None
+        self.unsized_count = None
+
+    def count_luns(self):
+        """
+        Total the sizes of the sized LUNs, and count the unsized ones.
+        """
+        sized_total = 0
+        unsized_count = 0
+        if self.node is not None:
+            for lunnode in self.node.iter('lun'):
+                size = lunnode.attrib.get('size')
+                if size is None:
+                    unsized_count += 1
+                else:
+                    sized_total += int(size)
+                    pass
+                pass
+            pass
+        self.sized_total = sized_total
+        self.unsized_count = unsized_count
+        # No need to hang on to the definition any more
+        self.node = None
+        log.debug("unsized luns are: %s", self.unsized_count)
+        log.debug("sized total is: %s", self.sized_total)
+
+    def get_unsized_lun_size(self, usable):
+        """
+        Find the size of each LUN that doesn't have a size specified.
+        @param usable: the usable storage in the container
+        """
+        if self.unsized_count is None:
+            self.count_luns()
+            pass
+        log.debug("Available for allocation: %s", usable - self.sized_total)
+        return float(usable - self.sized_total) / self.unsized_count
+
 def create_lun_from_node(node, defaults, parent):
 
     lun = Lun()
@@ -0,0 +1,105 @@
+# $Id$
+#
+
+"""
+Handing out LUN ids.
+
+LUNs are numbered in sequence within a scope: the whole project,
+or each site, filer, vfiler, aggregate or volume, as set by the
+lun_numbering option in the [lun] section of the defaults.
+
+Each object that can be a scope finds the allocator its LUNs are
+numbered by the first time it is asked, either making its own if
+it is the scope, or using its parent's, and keeps it. After that,
+a LUN gets its id straight from the allocator, rather than going
+up through every level above it to see which one numbers it.
+
+The ids of LUNs that are numbered by hand, with lunid, are reserved
+in bulk when an allocator is made from the definition of its
+scope, so LUNs numbered automatically never get them. Each LUN is
+recorded against the id it gets, so ids used more than once in a
+scope, by hand or after restartnumbering, can be found and reported
+for the whole project.
+"""
+import debug
+import logging
+log = logging.getLogger('docgen')
+
+# The objects that LUNs can be numbered within
+LUN_NUMBERING_SCOPES = ( 'project', 'site', 'filer', 'vfiler', 'aggregate', 'volume' )
+
+class LunIdAllocator:
+    """
+    Hands out the LUN ids in one numbering scope.
+    """
+    def __init__(self, scope):
+        """
+        @param scope: the object LUNs are numbered within
+        """
+        self.scope = scope
+        self.next_lunid = 0
+        # Ids numbered by hand, that aren't handed out
+        self.reserved = {}
+        # The LUNs given each id
+        self.assigned = {}
+
+    def __repr__(self):
+        return '<LunIdAllocator: %s, next %d>' % (self.scope, self.next_lunid)
+
+    def reserve(self, lunids):
+        """
+        Keep some ids from being handed out.
+        @param lunids: a list of the ids of LUNs numbered by hand
+        """
+        for lunid in lunids:
+            self.reserved[lunid] = True
+            pass
+
+    def restart(self, lunid):
+        """
+        Carry on handing out ids from this one.
+        """
+        self.next_lunid = lunid
+
+    def allocate(self):
+        """
+        Get the next id that hasn't been reserved.
+        """
+        while self.next_lunid in self.reserved:
+            self.next_lunid += 1
+            pass
+        lunid = self.next_lunid
+        self.next_lunid += 1
+        return lunid
+
+    def assign(self, lunid, lun):
+        """
+        Record the id a LUN has been given, noting
+        if another LUN in my scope already has it.
+        """
+        luns = self.assigned.setdefault(lunid, [])
+        if len(luns) > 0:
+            log.warn("LUN id %d is used more than once in %s", lunid, self.scope)
+            pass
+        luns.append(lun)
+
+    def get_collisions(self):
+        """
+        @returns: a list of (lunid, luns) for each id
+        given to more than one LUN, in id order
+        """
+        return [ (lunid, self.assigned[lunid]) for lunid in sorted(self.assigned.keys())
+                 if len(self.assigned[lunid]) > 1 ]
+
+def is_project_scope(lun_numbering):
+    """
+    Whether LUNs are numbered across the whole project, for a
+    lun_numbering setting. Unknown settings number them that way too.
+    """
+    return lun_numbering not in LUN_NUMBERING_SCOPES[1:]
+
+def get_manual_lunids(node):
+    """
+    Find the ids of the LUNs numbered by hand in a definition node.
+    """
+    return [ int(x) for x in node.xpath('.//lun/@lunid') ]
@@ -0,0 +1,242 @@
+# $Id$
+#
+
+"""
+On-disk cache of configured projects.
+
+Configuring a project means parsing its definition and running all
+the setup passes, and bin/build_project_docs.sh does it again for
+every document it creates. The ModelCache keeps the configured
+Project on disk instead, pickled, under a key made from the
+contents of the definition file, the configuration files and the
+DocGen code itself. Any external entity files the definition
+includes are recorded with the cached project, and checked again
+before it is used.
+
+The cache is kept below a size limit by throwing away the entries
+that were used least recently.
+"""
+import os
+import os.path
+import glob
+import tempfile
+import cPickle
+from ConfigParser import NoSectionError, NoOptionError
+
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+from lxml import etree
+
+import debug
+import logging
+log = logging.getLogger('docgen')
+
+# Change this when cached projects are no longer compatible,
+# in ways a change to the code signature won't catch.
+CACHE_FORMAT = 1
+
+DEFAULT_DIRECTORY = '~/.docgen/cache'
+DEFAULT_MAX_SIZE = 100
+
+def file_digest(filename):
+    """
+    The hex SHA-1 digest of a file's contents.
+    """
+    f = open(filename, 'rb')
+    try:
+        return sha1(f.read()).hexdigest()
+    finally:
+        f.close()
+
+def code_signature():
+    """
+    Something that changes when the DocGen modules change, so that
+    projects pickled by an older version aren't used by a newer one.
+    """
+    docgendir = os.path.dirname(os.path.abspath(__file__))
+    filenames = glob.glob(os.path.join(docgendir, '*.py'))
+    # Plugins can replace the core model objects
+    filenames.extend(glob.glob(os.path.join(docgendir, 'plugins', '*.py')))
+    parts = []
+    for filename in sorted(filenames):
+        st = os.stat(filename)
+        parts.append('%s:%d:%d' % (os.path.basename(filename), st.st_size, st.st_mtime))
+        pass
+    return ','.join(parts)
+
+def find_dependencies(definitionfile):
+    """
+    Find the local files a definition includes as external entities.
+    Only the prolog of the definition is read, up to its root tag.
+    """
+    basedir = os.path.dirname(os.path.abspath(definitionfile))
+    depends = []
+    parser = etree.iterparse(definitionfile, events=('start',), resolve_entities=False)
+    try:
+        for event, elem in parser:
+            dtd = elem.getroottree().docinfo.internalDTD
+            if dtd is not None:
+                for entity in dtd.iterentities():
+                    url = entity.system_url
+                    if url is None or '://' in url:
+                        continue
+                    depends.append(os.path.join(basedir, url))
+                    pass
+                pass
+            break
+    except etree.XMLSyntaxError:
+        # The definition can't be read, so let the real load report it
+        pass
+    return depends
+
+class ModelCache:
+    """
+    A directory of pickled, configured projects.
+    """
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_size=DEFAULT_MAX_SIZE):
+        """
+        @param directory: where to keep cached projects
+        @param max_size: the most the cache may hold, in megabytes
+        """
+        self.directory = os.path.expanduser(directory)
+        self.max_size = max_size * 1024 * 1024
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, definitionfile, configfiles):
+        """
+        Work out the cache key for a definition loaded with
+        a set of configuration files.
+        """
+        digest = sha1()
+        digest.update('%s\n' % CACHE_FORMAT)
+        digest.update(code_signature())
+        digest.update(file_digest(definitionfile))
+        for configfile in configfiles:
+            digest.update(file_digest(configfile))
+            pass
+        return digest.hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.directory, '%s.pickle' % key)
+
+    def load(self, key):
+        """
+        Fetch a cached project, or None if there isn't a
+        usable one for this key.
+        """
+        path = self.get_path(key)
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            self.misses += 1
+            return None
+
+        try:
+            try:
+                depends = cPickle.load(f)
+                for filename, digest in depends:
+                    if file_digest(filename) != digest:
+                        log.info("Cached project is out of date: '%s' has changed", filename)
+                        self.misses += 1
+                        return None
+                    pass
+                project = cPickle.load(f)
+            finally:
+                f.close()
+        except Exception, e:
+            log.warn("Discarding unreadable cached project %s: %s", path, e)
+            self.remove(path)
+            self.misses += 1
+            return None
+
+        # Mark this entry as recently used
+        os.utime(path, None)
+        self.hits += 1
+        log.debug("Using cached project %s", path)
+        return project
+
+    def store(self, key, project, depends=[]):
+        """
+        Save a configured project in the cache.
+        The project lets go of its definition nodes first, as they
+        can't be saved, so it should be fully set up.
+        @param depends: files the project was loaded from, besides
+        the definition and configuration files.
+        """
+        project.release_source_nodes()
+        project.clear_views()
+
+        # Not being able to cache the project, even for want of
+        # somewhere to put it, doesn't stop it being used.
+        tmppath = None
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+                pass
+
+            fd, tmppath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            f = os.fdopen(fd, 'wb')
+            try:
+                cPickle.dump([ (x, file_digest(x)) for x in depends ], f, 2)
+                cPickle.dump(project, f, 2)
+            finally:
+                f.close()
+            os.rename(tmppath, self.get_path(key))
+        except (cPickle.PicklingError, TypeError, IOError, OSError), e:
+            log.warn("Cannot cache project: %s", e)
+            if tmppath is not None:
+                self.remove(tmppath)
+                pass
+            return
+
+        self.evict()
+
+    def evict(self):
+        """
+        Throw away the least recently used entries until the
+        cache is no bigger than its size limit.
+        """
+        entries = []
+        total = 0
+        for path in glob.glob(os.path.join(self.directory, '*.pickle')):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append( (st.st_mtime, path, st.st_size) )
+            total += st.st_size
+            pass
+
+        entries.sort()
+        while total > self.max_size and len(entries) > 0:
+            mtime, path, size = entries.pop(0)
+            log.debug("Evicting cached project %s", path)
+            self.remove(path)
+            total -= size
+            pass
+
+    def remove(self, path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+def cache_from_config(defaults):
+    """
+    Create a ModelCache using the [cache] settings in the
+    configuration file, if there are any.
+    """
+    try:
+        directory = defaults.get('cache', 'directory')
+    except (NoSectionError, NoOptionError):
+        directory = DEFAULT_DIRECTORY
+    try:
+        max_size = defaults.getint('cache', 'max_size')
+    except (NoSectionError, NoOptionError):
+        max_size = DEFAULT_MAX_SIZE
+    return ModelCache(directory, max_size)
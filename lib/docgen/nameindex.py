@@ -0,0 +1,99 @@
+# $Id$
+#
+
+"""
+Name index for a project.
+
+Hosts, filers, vFilers, aggregates and replication sets refer to
+each other by name in project definitions. Rather than searching
+through every object in the project each time one of those names
+has to be resolved, the project keeps a NameIndex of them, which is
+kept up to date as objects are added to the project with add_child().
+"""
+import debug
+import logging
+log = logging.getLogger('docgen')
+
+class NameIndex:
+    """
+    Lookup tables of project objects, keyed by name.
+    If more than one object has the same name, the first one
+    found in the project is the one that is indexed.
+    """
+    def __init__(self):
+        self.hosts = {}
+        self.filers = {}
+        # vFilers and aggregates are only unique within a filer,
+        # so they are indexed by filer, then by name.
+        self.vfilers = {}
+        self.aggregates = {}
+        self.snapvaultsets = {}
+        self.snapmirrorsets = {}
+
+    def add_project(self, project):
+        """
+        Index everything in a project.
+        """
+        for site in project.get_sites():
+            self.add(site)
+            pass
+        for setobj in project.get_snapvaultsets():
+            self.add(setobj)
+            pass
+        for setobj in project.get_snapmirrorsets():
+            self.add(setobj)
+            pass
+
+    def add(self, obj):
+        """
+        Index an object, and any indexed objects it contains.
+        Objects that aren't indexed are ignored.
+        """
+        tag = obj.xmltag
+        if tag == 'site':
+            for host in obj.get_hosts():
+                self.add(host)
+                pass
+            for filer in obj.get_filers():
+                self.add(filer)
+                pass
+
+        elif tag == 'filer':
+            self.filers.setdefault(obj.name, obj)
+            for aggr in obj.get_aggregates():
+                self.add(aggr)
+                pass
+            for vfiler in obj.get_vfilers():
+                self.add(vfiler)
+                pass
+
+        elif tag == 'vfiler':
+            self.vfilers.setdefault(obj.get_filer(), {}).setdefault(obj.name, obj)
+            for aggr in obj.get_aggregates():
+                self.add(aggr)
+                pass
+
+        elif tag == 'aggregate':
+            self.aggregates.setdefault(obj.get_filer(), {}).setdefault(obj.name, obj)
+
+        elif tag == 'host':
+            self.hosts.setdefault(obj.name, obj)
+
+        elif tag == 'snapvaultset':
+            self.snapvaultsets.setdefault(obj.name, obj)
+
+        elif tag == 'snapmirrorset':
+            self.snapmirrorsets.setdefault(obj.name, obj)
+        pass
+
+    def get_vfiler(self, filer, name):
+        """
+        Find a vFiler on a filer.
+        """
+        return self.vfilers.get(filer, {})[name]
+
+    def get_aggregate(self, filer, name):
+        """
+        Find an aggregate on a filer, or any of its vFilers.
+        """
+        return self.aggregates.get(filer, {})[name]
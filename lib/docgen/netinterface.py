@@ -31,6 +31,10 @@ class NetInterface(XMLConfigurable):
         'switchport',
         'mtu',
         ]
+
+    slotted_attribs = [
+        'vlans',
+        ]
     
     def _depr__init__(self, type, mode, switchname=None, switchport=None, hostport=None, ipaddress=None, mtu=9000, vlans=[]):
 
@@ -10,10 +10,11 @@ import logging
 import debug
 log = logging.getLogger('docgen')
 
-class Network:
+class Network(object):
     """
     A Network object encapsulates an IP network.
     """
+    __slots__ = ( 'number', 'netmask', 'maskbits', 'gateway' )
 
     def __init__(self, number, netmask, maskbits, gateway):
         """
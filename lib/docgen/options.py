@@ -32,8 +32,13 @@ class BaseOptions(optparse.OptionParser):
         help_definition_file = "XML project definition file"
         help_outfile = "Write output to this file, instead of STDOUT"
         help_versioned = "Enable auto-versioning of output filenames"
-        help_doctype = "What sort of document to create"
+        help_doctype = "What sort of document to create, optionally followed by ':' and a file to write it to. Can be given more than once, and 'all' creates every sort of document."
         help_modipy_templates = "Path to ModiPy templates"
+        help_streaming = "Read the definition file one site at a time, to save memory"
+        help_no_cache = "Don't use or update the cache of configured projects"
+        help_watch = "Keep running, and create the documents again whenever the definition, its included files or the configuration file change"
+        help_shard = "Write NetApp commands to one file per filer, or per vfiler, in the directory given as the output file, along with a manifest of the order to run them in. Not available with --watch"
+        help_workers = "Build the NetApp commands for each filer on this many processes. Overrides 'workers' in the [commands] section of the configuration file."
 
         self.add_option('', '--license',       dest='license', action='store_true', help=help_license)    
         self.add_option('', '--debug',         dest='debug', type='choice', choices=('debug', 'info', 'warn', 'error', 'critical'), metavar='LEVEL', default='info', help=help_debug)
@@ -46,7 +51,12 @@ class BaseOptions(optparse.OptionParser):
         self.add_option('', '--versioned',     dest='versioned', action='store_true', default=False, help=help_versioned)
         #self.add_option('', '--not-versioned', dest='versioned', action='store_false', default=True, help=help_not_versioned)
         self.add_option('', '--modipy-templates',     dest='modipy_templates', type='string', help=help_modipy_templates)
-        self.add_option('-d', '--doctype',     dest='doctype', type='string', default='ipsan-storage-design', help=help_doctype)
+        self.add_option('', '--streaming',     dest='streaming', action='store_true', default=False, help=help_streaming)
+        self.add_option('', '--no-cache',      dest='no_cache', action='store_true', default=False, help=help_no_cache)
+        self.add_option('', '--watch',         dest='watch', action='store_true', default=False, help=help_watch)
+        self.add_option('', '--workers',       dest='workers', type='int', help=help_workers)
+        self.add_option('', '--shard',         dest='shard', type='choice', choices=('filer', 'vfiler'), help=help_shard)
+        self.add_option('-d', '--doctype',     dest='doctypes', type='string', action='append', metavar='DOCTYPE[:OUTFILE]', help=help_doctype)
         
         self.addOptions()
 
@@ -84,3 +94,111 @@ class BaseOptions(optparse.OptionParser):
             except IndexError:
                 self.error("No definition file specified")
 
+        if not self.options.doctypes:
+            self.options.doctypes = ['ipsan-storage-design']
+            pass
+        # The first document asked for, for programs that only create one
+        self.options.doctype = self.options.doctypes[0].split(':', 1)[0]
+
+    def get_documents(self, available):
+        """
+        Work out which documents to create, and where to write them.
+        A doctype with no output file given uses the --outfile, if
+        there is only one document to create. 'all' creates every
+        available doctype, with the doctype added to the end of its
+        output file name.
+        @param available: the names of the doctypes that can be created
+        @returns: a list of (doctype, outfile) tuples, where outfile
+        is None for documents to be written to STDOUT.
+        """
+        documents = []
+        for target in self.options.doctypes:
+            if ':' in target:
+                doctype, outfile = target.split(':', 1)
+            else:
+                doctype, outfile = target, None
+                if len(self.options.doctypes) == 1:
+                    outfile = self.options.outfile
+                    pass
+                pass
+
+            if doctype == 'all':
+                for doctype in sorted(available):
+                    if outfile is None:
+                        documents.append( (doctype, None) )
+                    else:
+                        documents.append( (doctype, '%s.%s' % (outfile, doctype)) )
+                        pass
+                    pass
+                continue
+
+            if doctype not in available:
+                self.error("Unknown doctype '%s'. Choose from: %s" % (doctype, ', '.join(sorted(available))))
+            documents.append( (doctype, outfile) )
+            pass
+        return documents
+
+
+class BatchOptions(BaseOptions):
+    """
+    Options for building many project definitions at once.
+    The arguments are directories, files or glob patterns to
+    find definitions in, and each -d is just a doctype, as the
+    output file names are worked out from the definition name.
+    """
+    def addOptions(self):
+        help_jobs = "How many projects to build at once. Defaults to the number of processors."
+        self.add_option('-j', '--jobs',        dest='jobs', type='int', help=help_jobs)
+
+    def postOptions(self):
+        log.setLevel(logging._levelNames.get(self.options.debug.upper(), logging.INFO))
+
+        if len(self.args) == 0:
+            self.error("No definition files or directories specified")
+
+        if not self.options.doctypes:
+            self.options.doctypes = ['ipsan-storage-design', 'netapp-commands']
+            pass
+
+    def get_doctypes(self, available):
+        """
+        The doctypes to create for each project.
+        """
+        doctypes = []
+        for doctype in self.options.doctypes:
+            if doctype == 'all':
+                doctypes.extend(sorted(available))
+                continue
+            if doctype not in available:
+                self.error("Unknown doctype '%s'. Choose from: %s" % (doctype, ', '.join(sorted(available))))
+            doctypes.append(doctype)
+            pass
+        return doctypes
+
+class ServerOptions(BaseOptions):
+    """
+    Options for the resident document server.
+    Definitions and doctypes come with each request, so
+    there are no arguments.
+    """
+    def addOptions(self):
+        help_port = "Serve documents on this local TCP port"
+        help_address = "Address to listen on for TCP connections"
+        help_socket = "Serve documents on this Unix socket, instead of a TCP port"
+        help_max_active = "How many documents to create at once"
+        help_max_waiting = "How many requests may wait for their turn before others are turned away"
+        help_max_projects = "How many configured projects to keep in memory"
+        help_max_definition_size = "The largest definition that may be sent with a request, in megabytes"
+        help_definition_root = "Serve definition files asked for by name from under this directory. If not set, definitions must be sent with each request"
+
+        self.add_option('-p', '--port',        dest='port', type='int', default=8040, help=help_port)
+        self.add_option('', '--address',       dest='address', type='string', default='127.0.0.1', help=help_address)
+        self.add_option('-s', '--socket',      dest='socket', type='string', help=help_socket)
+        self.add_option('', '--max-active',    dest='max_active', type='int', default=4, help=help_max_active)
+        self.add_option('', '--max-waiting',   dest='max_waiting', type='int', default=16, help=help_max_waiting)
+        self.add_option('', '--max-projects',  dest='max_projects', type='int', default=20, help=help_max_projects)
+        self.add_option('', '--max-definition-size', dest='max_definition_size', type='int', default=16, help=help_max_definition_size)
+        self.add_option('', '--definition-root', dest='definition_root', type='string', help=help_definition_root)
+
+    def postOptions(self):
+        log.setLevel(logging._levelNames.get(self.options.debug.upper(), logging.INFO))
@@ -1 +1,8 @@
 #$Id$
+#
+# Plugin modules placed in this package named after a tag, eg: volume.py,
+# override the core module for that tag. A plugin package can also
+# register a factory function for a tag up front, eg:
+#
+#   from docgen.registry import register_factory
+#   register_factory('volume', create_my_volume_from_node)
@@ -8,18 +8,19 @@ The <project/> node is the root of all DocGen projects,
 and is used to dynamically configure and build the project
 definition.
 """
-from ConfigParser import NoSectionError, NoOptionError
-from base import DynamicNamedXMLConfigurable, LunNumbering
-
-from lxml import etree
+from base import DynamicNamedXMLConfigurable, LunNumbering, cached_view
 
 # FIXME: Doing it this way means we can't override this in
 # a user defined plugin. Need the lookup table instead.
-from volume import Volume
-from aggregate import Aggregate
+from volume import create_volume
+from aggregate import create_aggregate
 from snapmirror import SnapMirror
 from snapvault import SnapVault
-from igroup import iGroup
+from igroup import iGroup, ExportGrouping, create_igroup, export_signature
+from nameindex import NameIndex
+from context import get_tree_context
+from defaults import get_defaults
+from lunid import LUN_NUMBERING_SCOPES
 
 import debug
 import logging
@@ -45,23 +46,49 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
         ]
 
     def __init__(self):
-        self.current_lunid = 0
+        self.lunid_allocator = None
+        self.name_index = None
 
-    def populate_namespace(self, ns={}):
+    def get_namespace_frame(self):
         """
         Add my namespace pieces to the namespace
         """
-        ns['project_name'] = self.name
-        ns['project_code'] = self.code
-        return ns
+        return { 'project_name': self.name,
+                 'project_code': self.code,
+                 }
 
-    def get_next_lunid(self, defaults):
-        value = self.current_lunid
-        self.current_lunid += 1
-        return value
+    def get_lunid_allocator(self, defaults):
+        """
+        LUNs not numbered within anything else are
+        numbered across the whole project.
+        """
+        if self.lunid_allocator is None:
+            scope = get_defaults(defaults).lun.lun_numbering
+            if scope is not None and scope not in LUN_NUMBERING_SCOPES:
+                log.warn("Unknown lun_numbering '%s'. Numbering LUNs across the whole project.", scope)
+                pass
+            self.lunid_allocator = self.make_lunid_allocator()
+            pass
+        return self.lunid_allocator
 
-    def set_current_lunid(self, value, defaults):
-        self.current_lunid = value        
+    def get_lunid_collisions(self):
+        """
+        Find the LUN ids given to more than one LUN in the
+        same numbering scope, anywhere in the project.
+        @returns: a list of (scope, lunid, luns)
+        """
+        collisions = []
+        seen = {}
+        for vol in self.get_volumes():
+            allocator = vol.lunid_allocator
+            if allocator is None or id(allocator) in seen:
+                continue
+            seen[id(allocator)] = True
+            for lunid, luns in allocator.get_collisions():
+                collisions.append( (allocator.scope, lunid, luns) )
+                pass
+            pass
+        return collisions
     
     def get_hosts(self):
         """
@@ -72,15 +99,34 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
             objs.extend(site.get_hosts())
             pass
         return objs
+    get_hosts = cached_view(get_hosts)
+
+    def get_name_index(self):
+        """
+        Get the index of project objects by name, building it
+        the first time it's needed.
+        """
+        if self.name_index is None:
+            self.name_index = NameIndex()
+            self.name_index.add_project(self)
+        return self.name_index
+
+    def child_added(self, obj):
+        """
+        Keep the name index up to date when objects are added
+        to the project after it has been built.
+        """
+        DynamicNamedXMLConfigurable.child_added(self, obj)
+        if self.name_index is not None:
+            self.name_index.add(obj)
 
     def get_host_byname(self, hostname):
         """
         Find a host using its name
         """
         try:
-            host = [ x for x in self.get_hosts() if x.name == hostname ][0]
-            return host
-        except IndexError:
+            return self.get_name_index().hosts[hostname]
+        except KeyError:
             raise KeyError("Host '%s' is not specified in definition" % hostname)
 
     def get_volumes(self):
@@ -92,6 +138,7 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
             volumes.extend(site.get_volumes())
             pass
         return volumes
+    get_volumes = cached_view(get_volumes)
 
     def get_luns(self):
         luns = []
@@ -99,6 +146,7 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
             luns.extend( vol.get_luns() )
             pass
         return luns
+    get_luns = cached_view(get_luns)
 
     def get_filers(self):
         filers = []
@@ -106,6 +154,7 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
             filers.extend(site.get_filers())
             pass
         return filers
+    get_filers = cached_view(get_filers)
 
     def get_latest_revision(self):
         revlist = [ ('%s.%s' % (x.majornumber, x.minornumber), x) for x in self.get_revisions() ]
@@ -152,11 +201,27 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
         return protolist
 
     def configure_from_node(self, node, defaults, parent):
-        DynamicNamedXMLConfigurable.configure_from_node(self, node, defaults, parent)
+        # Read the defaults once for the whole project
+        defaults = get_defaults(defaults)
+        self.configure_model(node, defaults, parent)
+        self.setup(defaults)
+
+    def configure_model(self, node, defaults, parent):
+        """
+        Configure the project and everything in it from the
+        definition, without the setup() that links them together.
+        """
+        DynamicNamedXMLConfigurable.configure_from_node(self, node, get_defaults(defaults), parent)
+
+    def setup(self, defaults):
+        """
+        Once the project is configured, set up some other bits and pieces.
+        This links together objects that refer to each other from
+        different parts of the project definition.
+        """
+        defaults = get_defaults(defaults)
+        self.clear_views()
 
-        #
-        # Once the project is configured, set up some other bits and pieces
-        #
         self.setup_drhosts(defaults)
         
         self.setup_exports(defaults)
@@ -167,6 +232,38 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
 
         self.setup_snapvaults(defaults)
 
+        # Some setup passes change children directly, rather
+        # than with add_child()
+        self.clear_views()
+
+        if self.is_compact_model(defaults):
+            self.release_source_nodes()
+
+    def is_compact_model(self, defaults):
+        """
+        Whether to throw away the definition nodes once configured.
+        """
+        return get_defaults(defaults).global_.compact_model
+
+    def release_source_nodes(self):
+        """
+        Drop all references from the configured model to the nodes
+        of the project definition, so the parsed tree can be freed
+        once the project is set up. Anything that still needs the
+        definition is worked out from it now, before it goes.
+        """
+        for site in self.get_sites():
+            site.release_source_node()
+            pass
+
+        for background in self.get_backgrounds():
+            background.release_source_node()
+            pass
+
+        # Naming is done by now, and the cached namespaces
+        # needn't be kept around, or saved with the model.
+        self.clear_namespace()
+
     def setup_drhosts(self, defaults):
         """
         Link hosts with their drhosts, if any are defined.
@@ -212,61 +309,36 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
         igroups = []
         # Split the LUNs into per-site lists
         for site in self.get_sites():
-            log.debug("siteluns: %d luns in %s: %s", len(site.get_luns()), site.type, site.get_luns())
+            log.debug("siteluns: %d luns in %s", len(site.get_luns()), site.type)
 
             site_igroups = []
+            grouping = ExportGrouping()
             for lun in site.get_luns():
-                log.debug("Building iGroups for LUN: %s", lun)
-                for ig in site_igroups:
-                    log.debug("checking match of exportlist: %s with %s", ig.get_exports(), lun.get_exports())
-                    pass
+                exports = lun.get_exports()
+                signature = export_signature(exports)
 
                 # Check to see if the exports in both lists are equivalent
                 # This means that all of the exports in the igroup exportlist
                 # are to the same host/ip, with the same permissions as the
                 # lun's exportlist.
-                matchedgroups = []
-                for ig in site_igroups:
-                    match = True
-                    for a, b in zip(ig.get_exports(), lun.get_exports()):
-                        if a != b:
-                            match = False
-                            pass
-                        pass
-                    if match is True:
-                        matchedgroups.append(ig)
-                    pass
-
-                #matchedgroups = [ ig for ig in site_igroups if [ a == b for a,b in zip(ig.exportlist, lun.exportlist)] ]
-                if len(matchedgroups) == 0:
-                    log.debug("exportlist %s has not had a group created for it yet", lun.get_exports())
+                group = grouping.find_group(signature)
+                if group is None:
                     igroup_number = len(site_igroups)
-                    log.debug("site is: %s", site)
                     ns = site.populate_namespace()
                     ns['igroup_number'] = igroup_number
-                    igroup_name = defaults.get('igroup', 'igroup_name') % ns
+                    igroup_name = defaults.igroup.igroup_name % ns
 
                     # Add a list of one LUN to a brand new iGroup with this LUN's exportlist
-                    # The iGroup type defaults the same as the first LUN type that it contains.
-                    xmldata = """<igroup name="%s"/>""" % igroup_name
-                    
-                    #group = iGroup(igroup_name, lun.qtree.volume.filer, lun.exportlist, [lun,], type=lun.ostype)
-                    group = iGroup()
-                    group.configure_from_node( etree.fromstring(xmldata), defaults, site)
+                    group = create_igroup(defaults, site, name=igroup_name)
                     group.luns.append(lun)
-                    group.exports = lun.get_exports()
+                    group.exports = exports
                     lun.igroup = group
                     site_igroups.append(group)
+                    grouping.add_group(signature, group)
 
                 else:
-                    log.debug("Aha! An iGroup with this exportlist already exists!")
-                    if len(matchedgroups) > 1:
-                        log.warning("Multiple iGroups exist for the same exportlist! This is a bug!")
-                        log.warning("groups are: %s", matchedgroups)
-                    group = matchedgroups[0]
-                    log.debug("Appending LUN to iGroup %s", group.name)
                     if group.type != lun.ostype:
-                        log.error("LUN type of '%s' is incompatible with iGroup type '%s'", lun.ostype, igroup.type)
+                        log.error("LUN type of '%s' is incompatible with iGroup type '%s'", lun.ostype, group.type)
                     else:
                         lun.igroup = group
                         group.luns.append(lun)
@@ -309,7 +381,9 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
         # of them, or you'd risk the computer guessing what you meant,
         # and they usually get that wrong.. and then you have to wrestle with
         # the damn thing to get it to do what you mean.
-        if qtree.qtreenode is not None:
+        if qtree.export_mountoptions is not None:
+            mountoptions.extend( qtree.export_mountoptions.get(host.name, []) )
+        elif qtree.qtreenode is not None:
             mountoptions.extend( self.get_extra_mountoptions(qtree.qtreenode, host) )
         elif qtree.volume.volnode is not None:
             mountoptions.extend( self.get_extra_mountoptions(qtree.volume.volnode, host) )
@@ -350,13 +424,10 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
         """
         Find any mountoptions defined at a node for a specific host
         """
-        nodes = node.xpath("ancestor-or-self::*/export[@to = '%s']/mountoption" % host.name)
-        if len(nodes) > 0:
-            log.debug("Found %d manually defined mountoptions: %s", len(nodes), nodes)
+        mountoptions = get_tree_context(node).get_export_mountoptions().get(host.name, [])
+        if len(mountoptions) > 0:
+            log.debug("Found %d manually defined mountoptions: %s", len(mountoptions), mountoptions)
             pass
-        
-        mountoptions = [ x.text for x in nodes ]
-#        log.debug("returning mountoptions: %s", mountoptions)
         return mountoptions
 
     def get_iscsi_chap_password(self, prefix='docgen'):
@@ -401,8 +472,8 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
 
             # Check that the reference refers to a defined snapmirrorset
             try:
-                setobj = [ x for x in self.get_snapmirrorsets() if x.name == ref.name ][0]
-            except IndexError:
+                setobj = self.get_name_index().snapmirrorsets[ref.name]
+            except KeyError:
                 log.error("Cannot find snapmirrorset definition '%s'" % ref)
                 raise KeyError("snapmirrorset not defined: '%s'" % ref)
 
@@ -415,31 +486,23 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
                 pass
 
             try:
-                target_filer = [x for x in self.get_filers() if x.name == target_filername ][0]
+                target_filer = self.get_name_index().filers[target_filername]
                 
-            except IndexError:
+            except KeyError:
                 raise KeyError("Snapmirror target is an unknown filer name: '%s'" % target_filername)
 
             # Find the target aggregate.
             targetaggr = self.find_target_aggr(target_filer, setobj.targetaggregate, defaults)
 
             # target volume name is the src volume name with a 'r' suffix
-            xmldata = """
-<volume name="%s%s" type="snapmirrordst"
-        usable="%s"
-        raw="%s"
-        snapreserve="%s"
-        protocol="%s" />""" % ( srcvol.name,
-                                setobj.targetsuffix,
-                                srcvol.usable,
-                                srcvol.raw,
-                                srcvol.snapreserve,
-                                srcvol.protocol,
-                                )
-
-            node = etree.fromstring(xmldata)
-            targetvol = Volume()
-            targetvol.configure_from_node(node, defaults, targetaggr)
+            targetvol = create_volume(defaults, targetaggr,
+                                      name='%s%s' % (srcvol.name, setobj.targetsuffix),
+                                      type='snapmirrordst',
+                                      usable=srcvol.usable,
+                                      raw=srcvol.raw,
+                                      snapreserve=srcvol.snapreserve,
+                                      protocol=srcvol.protocol,
+                                      )
             targetaggr.add_child(targetvol)
         
             log.debug("Created snapmirror targetvol: %s", targetvol)
@@ -483,18 +546,17 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
         for ref in srcvol.get_snapvault_setrefs():
             log.debug("Found reference: %s", ref.name)
             try:
-                log.debug("snapvaultsets: %s", [x.name for x in self.get_snapvaultsets()] )
-                setobj = [ x for x in self.get_snapvaultsets() if x.name == ref.name ][0]
-            except IndexError:
+                setobj = self.get_name_index().snapvaultsets[ref.name]
+            except KeyError:
                 raise KeyError("Cannot find snapvaultset definition '%s'" % ref.name)
 
             # If a target volume has been pre-defined, we'll use that.
             # Otherwise, we'll invent one based on certain rules and settings.
             target_filername = setobj.targetfiler
             try:
-                target_filer = [x for x in self.get_filers() if x.name == target_filername ][0]
+                target_filer = self.get_name_index().filers[target_filername]
                 
-            except IndexError:
+            except KeyError:
                 raise KeyError("SnapVault target is an unknown filer name: '%s'" % target_filername)
 
             # If the target volume name is specified, use that
@@ -507,6 +569,8 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
 
                 # Set the type of the volume to be a snapvault destination
                 targetvol.type='snapvaultdst'
+                # Names built from its old type are out of date
+                targetvol.clear_namespace()
                 pass
             
             # otherwise, invent a target volume, and use that instead
@@ -526,23 +590,17 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
                     pass
                 
                 # target volume name is the src volume name with a 'b' suffix
-                xmldata = """
-<volume name="%s%s" type="snapvaultdst"
-        usable="%s"
-        raw="%s"
-        snapreserve="%s"
-        protocol="%s" />""" % ( srcvol.name,
-                                setobj.targetsuffix,
-                                setobj.targetusable,
-                                setobj.targetusable,
-                                0,
-                                srcvol.protocol,
-                                )
-        
-            node = etree.fromstring(xmldata)
-            targetvol = Volume()
-            targetvol.configure_from_node(node, defaults, targetaggr)
-            targetaggr.add_child(targetvol)
+                targetvol = create_volume(defaults, targetaggr,
+                                          name='%s%s' % (srcvol.name, setobj.targetsuffix),
+                                          type='snapvaultdst',
+                                          usable=setobj.targetusable,
+                                          raw=setobj.targetusable,
+                                          snapreserve=0,
+                                          protocol=srcvol.protocol,
+                                          )
+                targetaggr.add_child(targetvol)
+                pass
+
             # end determination of target volume
             log.debug("Created snapvault targetvol: %s", targetvol)
 
@@ -578,15 +636,12 @@ class Project(DynamicNamedXMLConfigurable, LunNumbering):
         """
         log.debug("Finding target aggregates...")
         try:
-            targetaggr = [ x for x in targetfiler.get_aggregates() if x.name == aggrname ][0]
-        except IndexError:
-            # An indexerror means the aggregate isn't defined in the
+            targetaggr = self.get_name_index().get_aggregate(targetfiler, aggrname)
+        except KeyError:
+            # A keyerror means the aggregate isn't defined in the
             # project XML, which is ok. We invent an aggregate and
             # add it to the target filer.
-            xmldata = """<aggregate name="%s" />""" % aggrname
-            node = etree.fromstring(xmldata)
-            targetaggr = Aggregate()
-            targetaggr.configure_from_node(node, defaults, targetfiler)
+            targetaggr = create_aggregate(defaults, targetfiler, name=aggrname)
             targetfiler.add_child(targetaggr)
             pass
 
@@ -6,6 +6,8 @@ NetApp Qtree object
 from ConfigParser import NoSectionError, NoOptionError
 
 from docgen.base import DynamicNamedXMLConfigurable
+from docgen.lun import LunSizing
+from docgen.context import get_ancestor_context
 
 import logging
 import debug
@@ -31,6 +33,13 @@ class Qtree(DynamicNamedXMLConfigurable):
         'comment',
         'oplocks',
         ]
+
+    slotted_attribs = [
+        'volume',
+        'qtreenode',
+        'export_mountoptions',
+        'lun_sizing',
+        ]
     
     def _depr__init__(self, volume, qtree_name=None,
                  security='unix',
@@ -73,9 +82,17 @@ class Qtree(DynamicNamedXMLConfigurable):
         DynamicNamedXMLConfigurable.configure_from_node(self, node, defaults, parent)
         self.volume = parent
         self.qtreenode = node
+        # Manually defined mountoptions, per host
+        self.export_mountoptions = get_ancestor_context(node, parent).get_export_mountoptions()
 
         self.children['exportalias'] = [ x.text for x in node.findall('exportalias') ]
             
+    def configure_children(self, node, defaults, parent):
+        # Share out space between unsized LUNs once for the whole qtree
+        self.lun_sizing = LunSizing(node)
+        DynamicNamedXMLConfigurable.configure_children(self, node, defaults, parent)
+        self.lun_sizing = None
+
     def configure_optional_attributes(self, node, defaults):
         DynamicNamedXMLConfigurable.configure_optional_attributes(self, node, defaults)
 
@@ -91,12 +108,18 @@ class Qtree(DynamicNamedXMLConfigurable):
             naming_standard = defaults.get('qtree', 'qtree_name')
             self.name = naming_standard % ns
 
-    def populate_namespace(self, ns={}):
-        ns = self.parent.populate_namespace(ns)
-        ns['qtree_name'] = getattr(self, 'name', None)
-        ns['qtree_security'] = self.security
-        return ns
+    def get_namespace_frame(self):
+        return { 'qtree_name': getattr(self, 'name', None),
+                 'qtree_security': self.security,
+                 }
     
+    def release_source_node(self):
+        """
+        Stop referring to the qtree's definition node, so the
+        parsed definition can be thrown away.
+        """
+        self.qtreenode = None
+
     def full_path(self):
         """
         The full qtree path, including the volume prefix.
@@ -113,6 +136,9 @@ class Qtree(DynamicNamedXMLConfigurable):
             pass
         return retstr
 
+    def get_lunid_allocator(self, defaults):
+        return self.parent.get_lunid_allocator(defaults)
+
     def get_next_lunid(self, defaults):
         """
         Get the next available lunid for the volume
@@ -0,0 +1,130 @@
+# $Id$
+#
+
+"""
+Tag to factory registry.
+
+Each child tag found in a project definition is created by a
+factory function called create_<tag>_from_node(), found in either
+a plugin module (docgen.plugins.<tag>) or a core module (docgen.<tag>).
+The registry resolves each tag to its factory once, and remembers
+the answer for the rest of the process, so that configuring thousands
+of volumes, qtrees and LUNs doesn't go looking for the module again
+every time.
+"""
+from docgen.util import import_module
+
+import debug
+import logging
+log = logging.getLogger('docgen')
+
+class FactoryRegistry:
+    """
+    A process-wide lookup table of XML tag names to the factory
+    functions that create objects from nodes with that tag.
+    """
+    # Where to look for factory modules, in order of preference.
+    module_prefixes = [
+        'docgen.plugins',
+        'docgen',
+        ]
+
+    def __init__(self):
+        self.factories = {}
+
+        # Lookups answered from the table
+        self.hits = 0
+        # Lookups that had to go and find the module
+        self.misses = 0
+        # How many times each tag has been resolved by import.
+        # This should never go above 1 for any tag.
+        self.resolved = {}
+
+    def register(self, tag, factory):
+        """
+        Register a factory function for a tag. This overrides
+        any factory that would otherwise be found by module lookup,
+        so plugin packages can use it to replace core objects.
+        @param tag: the XML tag name, eg: 'volume'
+        @param factory: a callable taking (node, defaults, parent)
+        """
+        log.debug("Registering factory for '%s': %s", tag, factory)
+        self.factories[tag] = factory
+
+    def unregister(self, tag):
+        """
+        Forget about the factory for a tag, so that it will be
+        looked up again the next time it is needed.
+        """
+        try:
+            del self.factories[tag]
+        except KeyError:
+            pass
+
+    def lookup(self, tag, requester=None):
+        """
+        Find the factory function for a tag.
+        @param requester: the object asking, used for error messages
+        """
+        try:
+            factory = self.factories[tag]
+            self.hits += 1
+            return factory
+        except KeyError:
+            pass
+
+        self.misses += 1
+        factory = self.resolve(tag, requester)
+        self.resolved[tag] = self.resolved.get(tag, 0) + 1
+        # Importing a plugin module may have registered an override
+        # for this tag, which takes precedence.
+        return self.factories.setdefault(tag, factory)
+
+    def resolve(self, tag, requester=None):
+        """
+        Find the module that defines a tag and return its factory function.
+        Plugin modules are tried first, then the core modules.
+        """
+        for prefix in self.module_prefixes:
+            module_name = '%s.%s' % (prefix, tag)
+            try:
+                module = import_module(module_name)
+            except (AttributeError, ImportError):
+                #log.debug("Module load failed: %s, trying next...", module_name)
+                continue
+
+            return getattr(module, 'create_%s_from_node' % tag)
+
+        if requester is not None:
+            raise ImportError("Can't find module %s for %s child tag '%s'" % ( module_name, requester.__class__.__name__, tag) )
+        raise ImportError("Can't find module %s for child tag '%s'" % ( module_name, tag) )
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+        self.resolved = {}
+
+    def get_stats(self):
+        """
+        Return a dictionary of lookup statistics.
+        """
+        return { 'hits': self.hits,
+                 'misses': self.misses,
+                 'tags': len(self.factories),
+                 'max_resolutions': max([0] + self.resolved.values()),
+                 }
+
+# The process-wide registry
+registry = FactoryRegistry()
+
+def register_factory(tag, factory):
+    """
+    Register a factory function for a tag with the process-wide registry.
+    """
+    registry.register(tag, factory)
+
+def lookup_factory(tag, requester=None):
+    """
+    Find the factory function for a tag using the process-wide registry.
+    """
+    return registry.lookup(tag, requester)
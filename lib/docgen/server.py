@@ -0,0 +1,455 @@
+# $Id$
+#
+
+"""
+Resident document server.
+
+Running create_document.py once for every document means paying for
+the Python startup, the lxml and docgen imports, reading the
+configuration and configuring the project every time. The server
+does all but the last of those once, and keeps recently used
+projects in memory as well, so that asking for a document only costs
+generating it.
+
+Documents are requested over HTTP, on a local TCP port or a Unix
+socket:
+
+  - GET /document?doctype=netapp-commands&definition=/path/to/project.xml
+    creates a document from a definition file under the directory
+    the server was told to serve definitions from, if any.
+  - POST /document?doctype=netapp-commands, with the definition as the
+    request body, creates a document from a definition sent with the
+    request.
+  - GET /status reports what the server has done so far.
+
+Requests are handled in threads, but only a limited number of
+documents are created at once, and only a limited number of requests
+are allowed to wait for their turn. Others are turned away with a
+503 (Service Unavailable) response, rather than piling up.
+"""
+import os
+import sys
+import time
+import socket
+import threading
+import traceback
+import urlparse
+import cgi
+from StringIO import StringIO
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn, UnixStreamServer
+
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+from lxml import etree
+
+from docgen.util import load_doc_plugins
+from docgen.project import Project
+from docgen.loader import load_definition
+from docgen.modelcache import cache_from_config, file_digest, find_dependencies, code_signature
+
+import debug
+import logging
+log = logging.getLogger('docgen')
+
+DEFAULT_MAX_ACTIVE = 4
+DEFAULT_MAX_WAITING = 16
+DEFAULT_MAX_PROJECTS = 20
+# The largest definition that may be sent with a request, in megabytes
+DEFAULT_MAX_DEFINITION_SIZE = 16
+
+# Definitions sent with a request are parsed the same way whatever
+# the lxml version: entities are left alone, and nothing is fetched.
+REQUEST_PARSER_OPTIONS = dict(resolve_entities=False, no_network=True, load_dtd=False)
+
+class ServerBusy(Exception):
+    """
+    Raised when too many requests are already waiting.
+    """
+
+class RequestError(Exception):
+    """
+    Raised when a request doesn't make sense.
+    """
+
+class RequestLimiter:
+    """
+    Limit how many requests are worked on at once, and how
+    many may wait for their turn.
+    """
+    def __init__(self, max_active=DEFAULT_MAX_ACTIVE, max_waiting=DEFAULT_MAX_WAITING):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Wait for a turn to work on a request.
+        @raises ServerBusy: if too many requests are already waiting
+        """
+        self.condition.acquire()
+        try:
+            if self.active >= self.max_active:
+                if self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise ServerBusy("%d requests active, %d waiting" % (self.active, self.waiting))
+                self.waiting += 1
+                try:
+                    while self.active >= self.max_active:
+                        self.condition.wait()
+                        pass
+                finally:
+                    self.waiting -= 1
+                pass
+            self.active += 1
+        finally:
+            self.condition.release()
+
+    def release(self):
+        self.condition.acquire()
+        try:
+            self.active -= 1
+            self.condition.notify()
+        finally:
+            self.condition.release()
+
+class CachedProject:
+    """
+    A configured project held in memory, along with what is needed
+    to tell if it is still up to date.
+    """
+    def __init__(self, project, depends):
+        self.project = project
+        # (filename, digest) of each included file
+        self.depends = [ (x, file_digest(x)) for x in depends ]
+        # Generators can update cached parts of the project, so
+        # only one document is created from a project at a time.
+        self.lock = threading.Lock()
+
+    def is_current(self):
+        for filename, digest in self.depends:
+            try:
+                if file_digest(filename) != digest:
+                    return False
+            except IOError:
+                return False
+            pass
+        return True
+
+class DocumentService:
+    """
+    Creates documents, using configuration, plugins and projects
+    that are kept in memory between requests.
+    """
+    def __init__(self, defaults, configfiles, use_cache=True, max_projects=DEFAULT_MAX_PROJECTS, definition_root=None,
+                 max_definition_size=DEFAULT_MAX_DEFINITION_SIZE):
+        """
+        @param defaults: the parsed configuration
+        @param configfiles: the files the configuration was read from
+        @param use_cache: also use the on-disk model cache
+        @param max_projects: how many projects to keep in memory
+        @param definition_root: the directory definition files may be
+        read from. If None, definitions must be sent with the request.
+        @param max_definition_size: the largest definition that may be
+        sent with a request, in megabytes
+        """
+        self.defaults = defaults
+        self.max_definition_size = max_definition_size * 1024 * 1024
+        if definition_root is not None:
+            definition_root = os.path.realpath(definition_root)
+            pass
+        self.definition_root = definition_root
+        self.configfiles = configfiles
+        self.doc_plugins = load_doc_plugins(defaults)
+        self.max_projects = max_projects
+
+        if use_cache:
+            self.diskcache = cache_from_config(defaults)
+        else:
+            self.diskcache = None
+            pass
+
+        # Everything besides the definition that a project depends on
+        digest = sha1(code_signature())
+        for configfile in configfiles:
+            digest.update(file_digest(configfile))
+            pass
+        self.config_digest = digest.hexdigest()
+
+        # Projects in memory, keyed on a digest of their definition,
+        # and the order they were last used in, most recent last.
+        self.projects = {}
+        self.recent = []
+        self.lock = threading.Lock()
+
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.started = time.time()
+
+    def get_key(self, content):
+        return sha1(self.config_digest + content).hexdigest()
+
+    def get_project(self, definitionfile=None, content=None):
+        """
+        Find a project in memory, or configure it.
+        The definition is either the name of a definition file,
+        or the contents of one.
+        @returns: a L{CachedProject}
+        """
+        if definitionfile is not None:
+            definitionfile = self.check_definition_path(definitionfile)
+            try:
+                f = open(definitionfile, 'rb')
+            except IOError, e:
+                raise RequestError("Cannot read definition '%s': %s" % (definitionfile, e))
+            try:
+                key = self.get_key(f.read())
+            finally:
+                f.close()
+        else:
+            key = self.get_key(content)
+            pass
+
+        self.lock.acquire()
+        try:
+            cached = self.projects.get(key)
+            if cached is not None and cached.is_current():
+                self.hits += 1
+                self.recent.remove(key)
+                self.recent.append(key)
+                return cached
+            self.misses += 1
+        finally:
+            self.lock.release()
+
+        # Configure the project without holding the lock, so
+        # that other requests can carry on in the meantime.
+        if definitionfile is not None:
+            cached = CachedProject(self.load_definition(definitionfile), find_dependencies(definitionfile))
+        else:
+            node = parse_request_definition(content)
+            project = Project()
+            project.configure_from_node(node, self.defaults, None)
+            project.release_source_nodes()
+            cached = CachedProject(project, [])
+            pass
+
+        self.lock.acquire()
+        try:
+            if key not in self.projects:
+                self.recent.append(key)
+                pass
+            self.projects[key] = cached
+            while len(self.recent) > self.max_projects:
+                del self.projects[self.recent.pop(0)]
+                pass
+        finally:
+            self.lock.release()
+        return cached
+
+    def check_definition_path(self, definitionfile):
+        """
+        Make sure a definition file asked for by name is
+        under the directory definitions are served from.
+        @returns: the real path of the definition file
+        """
+        if self.definition_root is None:
+            raise RequestError("Definition files are not served. Send the definition with the request.")
+        path = os.path.realpath(os.path.join(self.definition_root, definitionfile))
+        if not path.startswith(os.path.join(self.definition_root, '')):
+            raise RequestError("Definition '%s' is not under %s" % (definitionfile, self.definition_root))
+        return path
+
+    def load_definition(self, definitionfile):
+        """
+        Configure a project from a definition file, using
+        the on-disk cache if there is one.
+        """
+        project = load_definition(definitionfile, self.defaults, self.configfiles,
+                                  use_cache=self.diskcache is not None, cache=self.diskcache)
+        project.release_source_nodes()
+        return project
+
+    def create_document(self, doctype, definitionfile=None, content=None):
+        """
+        Create a document, and return it as a string.
+        """
+        self.lock.acquire()
+        try:
+            self.requests += 1
+        finally:
+            self.lock.release()
+        if doctype not in self.doc_plugins:
+            raise RequestError("Unknown doctype '%s'. Choose from: %s" % (doctype, ', '.join(sorted(self.doc_plugins.keys()))))
+        if definitionfile is None and not content:
+            raise RequestError("No definition given")
+
+        cached = self.get_project(definitionfile, content)
+        outf = StringIO()
+        cached.lock.acquire()
+        try:
+            docgen = self.doc_plugins[doctype](cached.project, self.defaults)
+            docgen.emit(outf, ns={})
+        finally:
+            cached.lock.release()
+        return outf.getvalue()
+
+    def get_status(self):
+        lines = [
+            "uptime: %.0f" % (time.time() - self.started),
+            "requests: %d" % self.requests,
+            "projects: %d" % len(self.projects),
+            "project hits: %d" % self.hits,
+            "project misses: %d" % self.misses,
+            ]
+        if self.diskcache is not None:
+            lines.append("disk cache hits: %d" % self.diskcache.hits)
+            lines.append("disk cache misses: %d" % self.diskcache.misses)
+            pass
+        return '\n'.join(lines) + '\n'
+
+def parse_request_definition(content):
+    """
+    Parse a definition sent with a request. Definitions that
+    declare external entities are refused, rather than have the
+    server read files or fetch URLs for them. The external DTD
+    definitions name is never loaded.
+    @returns: the root node of the definition
+    """
+    parser = etree.XMLParser(**REQUEST_PARSER_OPTIONS)
+    try:
+        node = etree.fromstring(content, parser)
+    except etree.XMLSyntaxError, e:
+        raise RequestError("Cannot parse definition: %s" % e)
+    dtd = node.getroottree().docinfo.internalDTD
+    if dtd is not None:
+        for entity in dtd.iterentities():
+            if entity.system_url:
+                raise RequestError("Definition refers to an external entity '%s': %s" % (entity.name, entity.system_url))
+            pass
+        pass
+    return node
+
+class DocumentRequestHandler(BaseHTTPRequestHandler):
+    """
+    Turn HTTP requests into calls on the server's L{DocumentService}.
+    """
+    def do_GET(self):
+        path, query = self.parse_path()
+        if path == '/status':
+            status = self.server.service.get_status()
+            status += "active: %d\nwaiting: %d\nrejected: %d\n" % (self.server.limiter.active,
+                                                                    self.server.limiter.waiting,
+                                                                    self.server.limiter.rejected)
+            self.respond(200, status)
+        elif path == '/document':
+            self.handle_document(query, None)
+        else:
+            self.respond(404, "No such resource: %s\n" % path)
+            pass
+
+    def do_POST(self):
+        path, query = self.parse_path()
+        if path != '/document':
+            self.respond(404, "No such resource: %s\n" % path)
+            return
+        # Check the length before reading anything, so a bad or
+        # huge request doesn't tie up the thread or fill memory.
+        try:
+            length = int(self.headers.get('content-length', 0))
+        except ValueError:
+            self.respond(400, "Bad Content-Length\n")
+            return
+        if length < 0:
+            self.respond(400, "Bad Content-Length\n")
+            return
+        if length > self.server.service.max_definition_size:
+            self.respond(413, "Definition is larger than %d bytes\n" % self.server.service.max_definition_size)
+            return
+        self.handle_document(query, self.rfile.read(length))
+
+    def parse_path(self):
+        parts = urlparse.urlsplit(self.path)
+        query = dict([ (k, v[0]) for k, v in cgi.parse_qs(parts[3]).items() ])
+        return parts[2], query
+
+    def handle_document(self, query, content):
+        try:
+            self.server.limiter.acquire()
+        except ServerBusy, e:
+            self.respond(503, "Server busy: %s\n" % e)
+            return
+
+        try:
+            try:
+                document = self.server.service.create_document(query.get('doctype'),
+                                                               definitionfile=query.get('definition'),
+                                                               content=content)
+            except RequestError, e:
+                self.respond(400, "%s\n" % e)
+                return
+            except Exception, e:
+                log.error("Cannot create document: %s", traceback.format_exc())
+                self.respond(500, "Cannot create document: %s\n" % e)
+                return
+        finally:
+            self.server.limiter.release()
+        self.respond(200, document)
+
+    def respond(self, code, body):
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients don't have a host address
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return 'unix'
+
+    def log_message(self, format, *args):
+        log.info("%s %s", self.address_string(), format % args)
+
+class DocumentServer(ThreadingMixIn, HTTPServer):
+    """
+    Serve documents on a TCP port.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    # Let the RequestLimiter decide who waits, not the listen queue
+    request_queue_size = 128
+
+    def __init__(self, address, service, limiter):
+        HTTPServer.__init__(self, address, DocumentRequestHandler)
+        self.service = service
+        self.limiter = limiter
+
+class UnixDocumentServer(ThreadingMixIn, UnixStreamServer):
+    """
+    Serve documents on a Unix socket.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, path, service, limiter):
+        if os.path.exists(path):
+            os.unlink(path)
+            pass
+        UnixStreamServer.__init__(self, path, DocumentRequestHandler)
+        self.service = service
+        self.limiter = limiter
+
+    def server_bind(self):
+        UnixStreamServer.server_bind(self)
+        # BaseHTTPRequestHandler expects these to be set
+        self.server_name = 'localhost'
+        self.server_port = 0
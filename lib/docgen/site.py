@@ -6,7 +6,7 @@ Physical site and related design objects
 
 from ConfigParser import NoSectionError
 
-from base import DynamicNamedXMLConfigurable, LunNumbering
+from base import DynamicNamedXMLConfigurable, LunNumbering, cached_view
 
 import logging
 import debug
@@ -33,7 +33,7 @@ class Site(DynamicNamedXMLConfigurable, LunNumbering):
                          ]
 
     def __init__(self):
-        self.current_lunid = 0
+        self.lunid_allocator = None
     
     # Deprecated, as we use auto-config now.
     def _depr__init__(self, name, type, location='', nameservers=[], winsservers=[]):
@@ -72,11 +72,10 @@ class Site(DynamicNamedXMLConfigurable, LunNumbering):
         """
         return '<Site: %s, type: %s, location: %s>' % (self.name, self.type, self.location)
 
-    def populate_namespace(self, ns={}):
-        ns = self.parent.populate_namespace(ns)
-        ns['site_name'] = self.name
-        ns['site_type'] = self.type
-        return ns
+    def get_namespace_frame(self):
+        return { 'site_name': self.name,
+                 'site_type': self.type,
+                 }
 
     def name_dynamically(self, defaults):
         if getattr(self, 'location', None) is None:
@@ -91,6 +90,7 @@ class Site(DynamicNamedXMLConfigurable, LunNumbering):
             volumes.extend(filer.get_volumes())
             pass
         return volumes
+    get_volumes = cached_view(get_volumes)
 
     def get_luns(self):
         luns = []
@@ -98,18 +98,32 @@ class Site(DynamicNamedXMLConfigurable, LunNumbering):
             luns.extend( vol.get_luns() )
             pass
         return luns
+    get_luns = cached_view(get_luns)
     
+    def release_source_node(self):
+        """
+        Drop the references to the definition nodes of all my filers.
+        """
+        for filer in self.get_filers():
+            filer.release_source_node()
+            pass
+
     def link_filer_clusters(self):
         """
         Once we've loaded all our children, link filer clusters
         together, if they've been marked as being clustered.
         """
+        filers = {}
+        for filer in self.get_filers():
+            filers.setdefault(filer.name, filer)
+            pass
+
         for filer in self.get_filers():
             if filer.partner is not None:
                 # Find the partner by name
                 try:
-                    filer.cluster_partner = [ x for x in self.get_filers() if x.name == filer.partner ][0]
-                except IndexError:
+                    filer.cluster_partner = filers[filer.partner]
+                except KeyError:
                     raise ValueError("Filer '%s' partner '%s' not defined!" % (filer.name, filer.partner) )
                 pass
             pass
@@ -7,11 +7,15 @@ import debug
 import logging
 log = logging.getLogger('docgen')
 
-class SnapMirror:
+class SnapMirror(object):
     """
     An abstract representation of a SnapMirror relationship.
     Volume snapmirror only.
     """
+    __slots__ = ( 'sourcevol', 'targetvol',
+                  'minute', 'hour', 'dayofmonth', 'dayofweek',
+                  'arguments' )
+
     type = 'volume'
     
     def __init__(self, sourcevol, targetvol, minute='*', hour='*', dayofmonth='*', dayofweek='*', arguments='-'):
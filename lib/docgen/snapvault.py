@@ -7,7 +7,7 @@ import debug
 import logging
 log = logging.getLogger('docgen')
         
-class SnapVault:
+class SnapVault(object):
     """
     A SnapVault is a special kind of snapshot that requires a baseline
     to be taken on the source volume, which is then transferred to a
@@ -19,6 +19,8 @@ class SnapVault:
     SnapVault is the mechanism recommended in the NetApp Best Practices Guide
     for doing weekly snapshots when you transfer data daily.
     """
+    __slots__ = ( 'sourcevol', 'targetvol', 'basename', 'src_schedule', 'dst_schedule' )
+
     def __init__(self, sourcevol, targetvol, basename, src_schedule=None, dst_schedule=None):
 
         self.sourcevol = sourcevol
@@ -4,9 +4,8 @@
 """
 SnapVault set definitions
 """
-from ConfigParser import NoSectionError, NoOptionError
-
 from docgen.base import DynamicNamedXMLConfigurable
+from docgen.defaults import get_defaults
 
 import debug
 import logging
@@ -48,11 +47,7 @@ class SnapVaultSet(DynamicNamedXMLConfigurable):
 
         # Use a default multiplier if one isn't specified
         if self.multiplier is None:
-            try:
-                self.multiplier = defaults.getfloat(self.defaults_section, 'multiplier')
-            except (NoSectionError, NoOptionError):
-                self.multiplier = 2.5
-            pass
+            self.multiplier = getattr(get_defaults(defaults), self.defaults_section).multiplier
         else:
             self.multiplier = float(self.multiplier)
 
@@ -62,11 +57,7 @@ class SnapVaultSet(DynamicNamedXMLConfigurable):
             pass
 
         if self.targetsuffix is None:
-            try:
-                self.targetsuffix = defaults.get(self.defaults_section, 'volsuffix')
-            except (NoSectionError, NoOptionError):
-                self.targetsuffix = 'b'
-                pass
+            self.targetsuffix = getattr(get_defaults(defaults), self.defaults_section).volsuffix
             pass
 
 def create_snapvaultset_from_node(node, defaults, parent):
@@ -0,0 +1,164 @@
+# $Id$
+#
+
+"""
+Precompiled templates for the document plugins.
+
+The document plugins build their output from string.Template
+sections. A string.Template scans all of its text every time it is
+substituted, and most sections were also created anew every time
+they were built. A SectionTemplate is parsed once, when it is
+created, into the literal text and the names to fill in between
+them, so creating them at import time means rendering one is just
+a matter of writing out the pieces.
+
+SectionTemplates substitute exactly the way string.Template's
+safe_substitute() does, so they can be used wherever a Template was.
+
+Tables are built with a row_template() for the rows, and a Loop to
+render it once for each row. A Loop can be used as the value of a
+name in another template, and is written straight into the output
+of that template, rather than being built up as a string first.
+"""
+from string import Template
+
+import debug
+import logging
+log = logging.getLogger('docgen')
+
+class Fragment:
+    """
+    Something that writes itself out as part of a template.
+    """
+    def render(self, write):
+        """
+        Write out this fragment.
+        @param write: a function to call with each piece of text
+        """
+        raise NotImplementedError
+
+    def __str__(self):
+        chunks = []
+        self.render(chunks.append)
+        return ''.join(chunks)
+
+class SectionTemplate:
+    """
+    A string.Template that is parsed when it is created.
+    """
+    delimiter = Template.delimiter
+    pattern = Template.pattern
+
+    def __init__(self, template):
+        self.template = template
+        self.parts = self.compile(template)
+
+    def compile(self, template):
+        """
+        Split the template into (literal text, name, placeholder)
+        parts. Where a part has no name, the literal text is all
+        there is. The placeholder is written out in place of a name
+        that isn't in the namespace, as safe_substitute() does.
+        """
+        parts = []
+        literal = []
+        pos = 0
+        for mo in self.pattern.finditer(template):
+            literal.append(template[pos:mo.start()])
+            pos = mo.end()
+            name = mo.group('named') or mo.group('braced')
+            if name is None:
+                # An escaped delimiter, or one that isn't followed
+                # by a name, is just a delimiter.
+                literal.append(self.delimiter)
+                continue
+            parts.append( (''.join(literal), name, mo.group()) )
+            literal = []
+            pass
+        literal.append(template[pos:])
+        parts.append( (''.join(literal), None, None) )
+        return parts
+
+    def render(self, write, mapping={}, **kws):
+        """
+        Write out the template, filling in names from the mapping
+        and keyword arguments.
+        @param write: a function to call with each piece of text
+        """
+        if kws:
+            if mapping:
+                ns = dict(mapping)
+                ns.update(kws)
+            else:
+                ns = kws
+                pass
+        else:
+            ns = mapping
+            pass
+
+        for literal, name, placeholder in self.parts:
+            if literal:
+                write(literal)
+                pass
+            if name is None:
+                continue
+            try:
+                value = ns[name]
+            except KeyError:
+                write(placeholder)
+                continue
+            if isinstance(value, Fragment):
+                value.render(write)
+            else:
+                write('%s' % (value,))
+                pass
+            pass
+
+    def safe_substitute(self, mapping={}, **kws):
+        chunks = []
+        self.render(chunks.append, mapping, **kws)
+        return ''.join(chunks)
+
+    def names(self):
+        """
+        The names the template fills in.
+        """
+        return [ x[1] for x in self.parts if x[1] is not None ]
+
+class Loop(Fragment):
+    """
+    Render a template once for each of a list of namespaces.
+    """
+    def __init__(self, template, items, separator=''):
+        """
+        @param template: the SectionTemplate to render
+        @param items: a namespace for each time it is rendered
+        @param separator: text to write between each one
+        """
+        self.template = template
+        self.items = items
+        self.separator = separator
+
+    def render(self, write):
+        first = True
+        for item in self.items:
+            if not first and self.separator:
+                write(self.separator)
+                pass
+            first = False
+            self.template.render(write, item)
+            pass
+
+    def __len__(self):
+        return len(self.items)
+
+def row_template(columns, row='<row>%s</row>', entry='<entry><para>%s</para></entry>', separator=''):
+    """
+    Compile a template for a table row, with an entry for each column.
+    @param columns: the name to fill in for each column
+    @param row: the row markup, with %s where the entries go
+    @param entry: the entry markup, with %s where the value goes
+    @param separator: text between each entry
+    """
+    entries = separator.join([ entry % ('${%s}' % x) for x in columns ])
+    return SectionTemplate(row % entries)
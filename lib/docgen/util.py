@@ -5,6 +5,7 @@
 Utility functions.
 """
 import sys
+from UserDict import DictMixin
 
 import debug
 import logging
@@ -38,6 +39,41 @@ def import_class(mod_name):
         pass
     return mod
 
+class DocumentPlugins(DictMixin):
+    """
+    The document generator classes, by doctype.
+    Each class is only imported the first time it is asked for,
+    so that creating one sort of document doesn't pay for importing
+    the code for all the others.
+    """
+    def __init__(self, classnames):
+        """
+        @param classnames: the full dotted name of each
+        doctype's class, keyed by doctype
+        """
+        self.classnames = dict(classnames)
+        self.classes = {}
+
+    def __getitem__(self, name):
+        try:
+            return self.classes[name]
+        except KeyError:
+            cls = import_class(self.classnames[name])
+            self.classes[name] = cls
+            return cls
+
+    def keys(self):
+        return self.classnames.keys()
+
+    def __contains__(self, name):
+        return name in self.classnames
+
+    def __iter__(self):
+        return iter(self.classnames)
+
+    def __len__(self):
+        return len(self.classnames)
+
 def load_doc_plugins(defaults):
     """
     Load modules that will generate output documents.
@@ -46,14 +82,20 @@ def load_doc_plugins(defaults):
     DocGen IDocumentGenerator interface.
 
     Which modules to load is defined in the configuration file,
-    which is passed to this function as an argument.
+    which is passed to this function as an argument. A module
+    isn't actually imported until its doctype is used.
     """
-    plugins = {}
-    items = defaults.items('document_plugins')
-    for name, modclass in items:
-        plugins[name] = import_class(modclass)
+    return DocumentPlugins(defaults.items('document_plugins'))
 
-    return plugins
+def set_command_workers(defaults, workers):
+    """
+    Override the number of processes the NetApp commands
+    are built on, set in the [commands] section.
+    """
+    if not defaults.has_section('commands'):
+        defaults.add_section('commands')
+        pass
+    defaults.set('commands', 'workers', str(workers))
 
 def get_create_size(size):
     """
@@ -5,15 +5,12 @@
 VFiler object definition
 
 """
-from ConfigParser import NoSectionError, NoOptionError
-
-from lxml import etree
-
-from base import DynamicNamedXMLConfigurable, LunNumbering
+from base import DynamicNamedXMLConfigurable, LunNumbering, cached_view
+from defaults import get_defaults
 # FIXME: Doing it this way means we can't override this in
 # a user defined plugin. Need the lookup table instead.
-from volume import Volume
-from aggregate import Aggregate
+from volume import create_volume
+from aggregate import create_aggregate
 from export import Export
 
 import debug
@@ -62,7 +59,7 @@ class VFiler(DynamicNamedXMLConfigurable, LunNumbering):
         # Which vlan I belong to, if any
         self.vlan = None
 
-        self.current_lunid = 0
+        self.lunid_allocator = None
         
     def _depr__init__(self):
         self.name = ''
@@ -124,6 +121,7 @@ class VFiler(DynamicNamedXMLConfigurable, LunNumbering):
         """
         self.filer = filer
         self.site = filer.site
+        defaults = get_defaults(defaults)
 
         DynamicNamedXMLConfigurable.configure_from_node(self, node, defaults, filer)
         # Attempt to create a root aggregate if one hasn't
@@ -152,22 +150,17 @@ class VFiler(DynamicNamedXMLConfigurable, LunNumbering):
             pass
 
         if self.dns_domain is None:
-            try:
-                self.dns_domain = defaults.get('vfiler', 'default_dns_domain')
-            except (NoSectionError, NoOptionError):
-                pass
+            self.dns_domain = get_defaults(defaults).vfiler.default_dns_domain
 
     def name_dynamically(self, defaults):
         if getattr(self, 'name', None) is None:
             # Name via naming convention
             ns = self.populate_namespace()
-            naming_convention = defaults.get('vfiler', 'vfiler_name')
+            naming_convention = get_defaults(defaults).vfiler.vfiler_name
             self.name = naming_convention % ns
         
-    def populate_namespace(self, ns={}):
-        ns = self.filer.populate_namespace(ns)
-        ns['vfiler_name'] = self.name
-        return ns
+    def get_namespace_frame(self):
+        return { 'vfiler_name': self.name }
 
     def get_filer(self):
         return self.filer
@@ -242,6 +235,7 @@ class VFiler(DynamicNamedXMLConfigurable, LunNumbering):
             volumes.extend(aggr.get_volumes())
             pass
         return volumes
+    get_volumes = cached_view(get_volumes)
 
     def get_qtrees(self):
         """
@@ -252,6 +246,7 @@ class VFiler(DynamicNamedXMLConfigurable, LunNumbering):
             qtrees.extend( vol.get_qtrees() )
             pass
         return qtrees
+    get_qtrees = cached_view(get_qtrees)
     
     def get_root_aggregate(self):
         """
@@ -273,16 +268,11 @@ class VFiler(DynamicNamedXMLConfigurable, LunNumbering):
             aggr = self.get_root_aggregate()
             return
         except ValueError, valerr:
-            try:
-                root_aggr_name = defaults.get('vfiler', 'default_root_aggregate')
-                xmldata = """<aggregate type="root" name="%s"/>""" % root_aggr_name
-                node = etree.fromstring(xmldata)
-                aggr = Aggregate()
-                aggr.configure_from_node(node, defaults, self)
-                self.add_child(aggr)
-                
-            except (NoSectionError, NoOptionError), e:
+            root_aggr_name = get_defaults(defaults).vfiler.default_root_aggregate
+            if root_aggr_name is None:
                 raise valerr
+            aggr = create_aggregate(defaults, self, type='root', name=root_aggr_name)
+            self.add_child(aggr)
         
     def create_root_volume(self, defaults):
         """
@@ -290,27 +280,24 @@ class VFiler(DynamicNamedXMLConfigurable, LunNumbering):
         been manually defined
         """
         log.debug("No manually defined root volume. Creating one...")
+        defaults = get_defaults(defaults)
         ns = self.populate_namespace()
-        try:
-            volname = defaults.get('vfiler', 'root_volume_name') % ns
-        except (NoSectionError, NoOptionError):
+        if defaults.vfiler.root_volume_name is not None:
+            volname = defaults.vfiler.root_volume_name % ns
+        else:
             volname = '%s_root' % self.name
             pass
 
         # FIXME: This can probably be improved somehow
-        usable = float(defaults.get('vfiler', 'root_volume_usable'))
+        usable = defaults.vfiler.root_volume_usable
         aggr = self.get_root_aggregate()
         log.debug("got root aggr")
-        xmldata = """<volume type="root" name="%s" usable="%s" raw="%s" />
-        """ % ( volname, usable, usable )
-        node = etree.fromstring(xmldata)
-        vol = Volume()
-        vol.configure_from_node(node, defaults, aggr)
+        vol = create_volume(defaults, aggr, type='root', name=volname, usable=usable, raw=usable)
 
-        vol.snapreserve = int(defaults.get('vfiler', 'root_volume_snapreserve'))
+        vol.snapreserve = defaults.vfiler.root_volume_snapreserve
         vol.space_guarantee = 'volume'
 
-        if defaults.getboolean('vfiler', 'backup_root_volume'):
+        if defaults.vfiler.backup_root_volume:
             log.warn("Request to back up vfiler root volume")
 
         log.debug("Root volume: %s", vol)
@@ -3,17 +3,38 @@
 """
 NetApp Volumes
 """
-from ConfigParser import NoSectionError, NoOptionError
 from lxml import etree
 
-from docgen.base import DynamicNamedXMLConfigurable, LunNumbering
+from docgen.base import DynamicNamedXMLConfigurable, LunNumbering, cached_view
 from docgen import util
 from docgen.qtree import Qtree
+from docgen.lun import LunSizing
+from docgen.context import get_ancestor_context
+from docgen.defaults import get_defaults
 
 import logging
 import debug
 log = logging.getLogger('docgen')
 
+class VolumeOptions(dict):
+    """
+    The options set on a volume.
+    Documents list the options in dictionary order, so a pickled
+    copy adds them back in the order they were first set, which
+    gives the same order again when it is loaded.
+    """
+    def __init__(self):
+        dict.__init__(self)
+        self.setorder = []
+
+    def __setitem__(self, name, value):
+        if name not in self:
+            self.setorder.append(name)
+        dict.__setitem__(self, name, value)
+
+    def __reduce__(self):
+        return (VolumeOptions, (), None, None, iter([ (x, self[x]) for x in self.setorder ]))
+
 class Volume(DynamicNamedXMLConfigurable, LunNumbering):
     """
     A NetApp volume object
@@ -49,12 +70,28 @@ class Volume(DynamicNamedXMLConfigurable, LunNumbering):
         'oplocks',
         ]
 
+    # Other attributes a volume has once it's configured
+    slotted_attribs = [
+        'volnum',
+        'iscsi_usable',
+        'space_guarantee',
+        'lunid_allocator',
+        'lun_total',
+        'snaps',
+        'snapvaults',
+        'snapmirrors',
+        'volnode',
+        'autosize',
+        'autodelete',
+        'lun_sizing',
+        ]
+
     # FIXME: May not need the parent_type_names feature
 #     parent_type_names = [ 'Aggregate',
 #                           ]
 
     def __init__(self):
-        self.current_lunid = 0
+        self.lunid_allocator = None
         self.lun_total = 0
         self.snapvaults = []
         self.snapmirrors = []
@@ -83,15 +120,36 @@ class Volume(DynamicNamedXMLConfigurable, LunNumbering):
         defaults and various overrides.
         """
         self.parent = parent
+        defaults = get_defaults(defaults)
         DynamicNamedXMLConfigurable.configure_from_node(self, node, defaults, parent)
+        self.volnode = node
+        self.configure_volume(defaults)
+
+    def configure_from_attributes(self, attribs, defaults, parent):
+        """
+        Configure a volume from a dictionary of attributes.
+        A volume made this way has no protocol of its own unless
+        one is given, because it has no vfiler above it in the
+        definition, so it uses the default protocol.
+        """
+        defaults = get_defaults(defaults)
+        DynamicNamedXMLConfigurable.configure_from_attributes(self, attribs, defaults, parent)
+        self.volnode = None
+        self.lun_sizing = None
+        self.configure_volume(defaults)
 
+    def configure_volume(self, defaults):
+        """
+        Finish configuring a volume, once its attributes and
+        children have been set up.
+        """
         # Check if iscsi is an enabled protocol. If so, use 'iscsi_snapspace' instead
         # of snapreserve
         #if 'iscsi' in [ x.name for x in self.get_protocols() ]:
         if 'iscsi' == self.protocol:
             self.snapreserve = 0
             if getattr(self, 'iscsi_snapspace', None):
-                self.iscsi_snapspace = defaults.getint('volume', 'default_iscsi_snapspace')
+                self.iscsi_snapspace = defaults.volume.default_iscsi_snapspace
             else:
                 self.iscsi_snapspace = int(self.iscsi_snapspace)
                 pass
@@ -142,11 +200,9 @@ class Volume(DynamicNamedXMLConfigurable, LunNumbering):
         #self.qtrees = {}
 
         # Set volume options as a dictionary
-        options = {}
+        options = VolumeOptions()
         if len(self.children['option']) == 0:
-            # FIXME: deal with user errors in the config file better
-            for opt in defaults.get('volume', 'default_options').split(','):
-                name, value = opt.split('=')
+            for name, value in defaults.volume.default_options:
                 options[name] = value
                 pass
         else:
@@ -157,8 +213,6 @@ class Volume(DynamicNamedXMLConfigurable, LunNumbering):
             pass
         self.children['option'] = options
 
-        self.volnode = node
-
         # If volume export is not allowed, check that qtrees exist in the
         # volume. If not, create a single default data qtree.
         self.check_volume_export_allowed(defaults)
@@ -168,9 +222,26 @@ class Volume(DynamicNamedXMLConfigurable, LunNumbering):
 
         log.debug("volume usable is: %f", self.usable)
 
+    def configure_children(self, node, defaults, parent):
+        # Share out space between unsized LUNs once for the whole volume
+        self.lun_sizing = LunSizing(node)
+        DynamicNamedXMLConfigurable.configure_children(self, node, defaults, parent)
+        self.lun_sizing = None
+
     def configure_optional_attributes(self, node, defaults):
         DynamicNamedXMLConfigurable.configure_optional_attributes(self, node, defaults)
-        
+
+        # The volume protocol is either a protocol set in the volume definition
+        # using the 'protocol' attribute, or it will be the first protocol in
+        # the list of possible protocols for the vfiler.
+        if self.protocol is None:
+            self.protocol = get_ancestor_context(node, self.parent).get_vfiler_protocol()
+            pass
+        self.configure_defaults(defaults)
+
+    def configure_defaults(self, defaults):
+        defaults = get_defaults(defaults)
+
         # Set volume name prefix
         self.prefix = getattr(self, 'prefix', '')
 
@@ -179,7 +250,7 @@ class Volume(DynamicNamedXMLConfigurable, LunNumbering):
 
         # Set volume name suffix
         if self.type is None:
-            self.type = defaults.get('volume', 'default_vol_type')
+            self.type = defaults.volume.default_vol_type
 
         # Check to see if we want to restart the volume numbering
         # FIXME: Get the current volume numbering thing from parent
@@ -195,42 +266,28 @@ class Volume(DynamicNamedXMLConfigurable, LunNumbering):
 
         # Set usable storage
         if getattr(self, 'usable', None) is None:
-            self.usable = defaults.getfloat('volume', 'default_size')
+            self.usable = defaults.volume.default_size
         else:
             self.usable = float(self.usable)
 
         # Set allowable protocols for the volume
-        # The volume protocol is either a protocol set in the volume definition
-        # using the 'proto' attribute, or it will be the first protocol in
-        # the list of possible protocols for the vfiler.
-        # If neither of these are set, it will be set to the default
-        try:
-            self.protocol = node.attrib['protocol'].lower()
-            log.debug("Proto defined for volume: %s", self.protocol)
-
-        except KeyError:
-            try:
-                self.protocol = node.xpath("ancestor::*/vfiler/protocol/text()")[0].lower()
-                #log.debug("Found proto in vfiler ancestor: %s", self.protocol)
-            except IndexError:
-                self.protocol = defaults.get('protocol', 'default_storage_protocol')
-                log.debug("Proto set to default: %s", self.protocol)
+        # If no protocol has been found, it will be set to the default
+        if self.protocol is not None:
+            self.protocol = self.protocol.lower()
+        else:
+            self.protocol = defaults.get('protocol', 'default_storage_protocol')
+            log.debug("Proto set to default: %s", self.protocol)
+            pass
             
         # Set snapreserve and iSCSI snapspace
         if getattr(self, 'snapreserve', None) is None:
 
             # If the volume is a type that we know has a high rate of change,
             # we set a different snapreserve.
-            try:
-                highdelta_types = defaults.get('volume', 'high_delta_types')
-            except (NoSectionError, NoOptionError):
-                highdelta_types = []
-                pass
-            
-            if self.type in highdelta_types:
-                self.snapreserve = defaults.getint('volume', 'default_highdelta_snapreserve')
+            if self.type in defaults.volume.high_delta_types:
+                self.snapreserve = defaults.volume.default_highdelta_snapreserve
             else:
-                self.snapreserve = defaults.getint('volume', 'default_snapreserve')
+                self.snapreserve = defaults.volume.default_snapreserve
         else:
             self.snapreserve = float(self.snapreserve)
             pass
@@ -241,10 +298,7 @@ class Volume(DynamicNamedXMLConfigurable, LunNumbering):
         # A special kind of usable that is used for the actual iscsi LUN space
         # iSCSI really is a pain to allocate on WAFL
         self.iscsi_usable = self.usable
-        try:
-            self.iscsi_snapspace = defaults.get('volume', 'iscsi_snapspace')
-        except (NoOptionError, NoSectionError):
-            self.iscsi_snapspace = 0
+        self.iscsi_snapspace = defaults.volume.iscsi_snapspace
 
         if getattr(self, 'raw', None) is None:
             try:
@@ -262,7 +316,7 @@ class Volume(DynamicNamedXMLConfigurable, LunNumbering):
         if getattr(self, 'space_guarantee', None) is None:
             log.debug("space_guarantee not set. Using default.")
             option_name = "%s_space_guarantee_default" % self.parent.get_filer().type
-            self.space_guarantee = defaults.get('volume', option_name)
+            self.space_guarantee = getattr(defaults.volume, option_name)
             pass
         
     def name_dynamically(self, defaults):
@@ -272,25 +326,24 @@ class Volume(DynamicNamedXMLConfigurable, LunNumbering):
             # Set up a namespace for use in naming
             ns = self.populate_namespace()
 
-            volname_convention = defaults.get('volume', 'volume_name')
+            volname_convention = get_defaults(defaults).volume.volume_name
             #log.debug("volume naming convention: %s", volname_convention)
             try:
                 self.name = volname_convention % ns
             except KeyError, e:
                 raise KeyError("Unknown variable %s for volume naming convention" % e)
         
-    def populate_namespace(self, ns={}):
+    def get_namespace_frame(self):
         """
         Add my own namespace pieces
         """
-        ns = self.parent.populate_namespace(ns)
-        ns['volume_name'] = self.name
-        ns['volume_type'] = self.type
-        ns['voltype'] = self.type
-        ns['volprefix'] = self.prefix
-        ns['volsuffix'] = self.suffix
-        ns['volnum'] = self.volnum
-        return ns
+        return { 'volume_name': self.name,
+                 'volume_type': self.type,
+                 'voltype': self.type,
+                 'volprefix': self.prefix,
+                 'volsuffix': self.suffix,
+                 'volnum': self.volnum,
+                 }
 
     def get_filer(self):
         return self.parent.get_filer()
@@ -346,13 +399,7 @@ class Volume(DynamicNamedXMLConfigurable, LunNumbering):
         If not, check that qtrees exist in the volume. If they don't,
         then we create a default data qtree that can be exported.
         """
-        try:
-            vol_export_allowed = defaults.getboolean('volume', 'allow_volume_export')
-        except (NoOptionError, NoSectionError), e:
-            # assume no
-            vol_export_allowed = False
-            pass
-
+        vol_export_allowed = get_defaults(defaults).volume.allow_volume_export
         if not vol_export_allowed and not self.type in ['root', 'snapvaultdst', 'snapmirrordst' ]:
             log.debug("volume export not allowed. checking for qtrees...")
             if len(self.get_qtrees()) == 0:
@@ -365,6 +412,15 @@ class Volume(DynamicNamedXMLConfigurable, LunNumbering):
                 self.add_child(qtree)
                 log.debug("Added a default qtree for export: %s, %s", qtree, self.get_qtrees())
 
+    def release_source_node(self):
+        """
+        Drop the references to my definition node, and those of my qtrees.
+        """
+        for qtree in self.get_qtrees():
+            qtree.release_source_node()
+            pass
+        self.volnode = None
+
     def get_luns(self):
         """
         Fetch all the LUNs defined in the volume and any
@@ -379,6 +435,7 @@ class Volume(DynamicNamedXMLConfigurable, LunNumbering):
             pass
 
         return luns
+    get_luns = cached_view(get_luns)
 
     def get_snapmirror_setrefs(self):
         return [ x for x in self.get_setrefs() if x.type == 'snapmirror' ]
@@ -519,6 +576,16 @@ def create_volume_from_node(node, defaults, parent):
     vol = Volume()
     vol.configure_from_node(node, defaults, parent)
     return vol
+
+def create_volume(defaults, parent, **attribs):
+    """
+    Create a volume directly, without a definition node.
+    The keyword arguments are its attributes, as they would
+    be given in a node, such as name, type or usable.
+    """
+    vol = Volume()
+    vol.configure_from_attributes(attribs, defaults, parent)
+    return vol
     
 def _depr_create_volume_from_node(node, defaults, parent):
     """
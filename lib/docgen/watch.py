@@ -0,0 +1,393 @@
+# $Id$
+#
+
+"""
+Watch a project definition and regenerate its documents
+when it changes.
+
+The definition file, any external entity files it includes and
+the configuration file are all watched. On Linux, inotify is used
+to find out about changes as soon as they happen. Elsewhere, the
+files are checked every so often instead.
+
+Editors often save a file in several steps, so once a change is
+seen, the watcher waits until things have been quiet for a moment
+before it regenerates anything. A save that doesn't change what is
+in a file is ignored, and a document is only written out again if
+it is different to the last time, so that anything depending on
+the output files' timestamps doesn't redo its work for nothing.
+"""
+import os
+import os.path
+import sys
+import time
+import struct
+import select
+import traceback
+from StringIO import StringIO
+from ConfigParser import RawConfigParser
+
+from docgen.util import load_doc_plugins, set_command_workers
+from docgen.loader import load_definition
+from docgen.modelcache import file_digest, find_dependencies
+
+import debug
+import logging
+log = logging.getLogger('docgen')
+
+DEFAULT_DEBOUNCE = 0.2
+DEFAULT_POLL_INTERVAL = 0.5
+
+class PollingWatcher:
+    """
+    Find changed files by checking their size and modification
+    time every so often.
+    """
+    def __init__(self, filenames, interval=DEFAULT_POLL_INTERVAL):
+        self.filenames = [ os.path.abspath(x) for x in filenames ]
+        self.interval = interval
+        self.state = dict([ (x, self.get_state(x)) for x in self.filenames ])
+
+    def get_state(self, filename):
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size, st.st_ino)
+
+    def wait(self, timeout=None):
+        """
+        Wait for files to change.
+        @param timeout: how long to wait, in seconds, or forever if None
+        @returns: the set of files that changed, which is
+        empty if none did before the timeout
+        """
+        start = time.time()
+        while True:
+            changed = set()
+            for filename in self.filenames:
+                state = self.get_state(filename)
+                if state != self.state[filename]:
+                    self.state[filename] = state
+                    changed.add(filename)
+                    pass
+                pass
+            if len(changed) > 0:
+                return changed
+
+            if timeout is None:
+                delay = self.interval
+            else:
+                delay = min(self.interval, start + timeout - time.time())
+                if delay <= 0:
+                    return changed
+                pass
+            time.sleep(delay)
+            pass
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    """
+    Find changed files using Linux inotify.
+    The directories the files are in are watched, rather than the
+    files themselves, so that files which editors save by writing
+    a new file and renaming it over the old one are still seen.
+    """
+    # From <sys/inotify.h>
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+
+    EVENT_HEADER = 'iIII'
+
+    def __init__(self, filenames):
+        """
+        @raises OSError: if inotify can't be used here
+        """
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        try:
+            inotify_init = libc.inotify_init
+            self.inotify_add_watch = libc.inotify_add_watch
+        except AttributeError:
+            raise OSError("inotify is not available")
+        self.inotify_add_watch.argtypes = [ ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32 ]
+
+        self.fd = inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+
+        self.filenames = set([ os.path.abspath(x) for x in filenames ])
+        self.directories = {}
+        mask = self.IN_MODIFY | self.IN_ATTRIB | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+        for dirname in set([ os.path.dirname(x) for x in self.filenames ]):
+            wd = self.inotify_add_watch(self.fd, dirname, mask)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), "Cannot watch %s" % dirname)
+            self.directories[wd] = dirname
+            pass
+
+    def wait(self, timeout=None):
+        """
+        Wait for files to change.
+        @param timeout: how long to wait, in seconds, or forever if None
+        @returns: the set of files that changed, which is
+        empty if none did before the timeout
+        """
+        start = time.time()
+        changed = set()
+        while len(changed) == 0:
+            if timeout is None:
+                remaining = None
+            else:
+                remaining = start + timeout - time.time()
+                if remaining <= 0:
+                    break
+                pass
+            readable = select.select([self.fd], [], [], remaining)[0]
+            if len(readable) == 0:
+                break
+            changed.update(self.read_events())
+            pass
+        return changed
+
+    def read_events(self):
+        """
+        Read the waiting events, and return the watched
+        files they are about.
+        """
+        data = os.read(self.fd, 65536)
+        headersize = struct.calcsize(self.EVENT_HEADER)
+        changed = set()
+        offset = 0
+        while offset + headersize <= len(data):
+            wd, mask, cookie, namelen = struct.unpack_from(self.EVENT_HEADER, data, offset)
+            offset += headersize
+            name = data[offset:offset + namelen].rstrip('\0')
+            offset += namelen
+            if wd in self.directories:
+                filename = os.path.join(self.directories[wd], name)
+                if filename in self.filenames:
+                    changed.add(filename)
+                    pass
+                pass
+            pass
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+def make_watcher(filenames, polling=False):
+    """
+    Create a watcher for some files, using inotify if it
+    can be used, and checking the files every so often if not.
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(filenames)
+        except OSError, e:
+            log.info("Cannot use inotify, checking for changes every %.1fs instead: %s", DEFAULT_POLL_INTERVAL, e)
+            pass
+        pass
+    return PollingWatcher(filenames)
+
+class DocumentWatcher:
+    """
+    Keep a set of documents up to date with a project
+    definition, and the configuration it is created with.
+    """
+    def __init__(self, definitionfile, configfile, doctypes, outfiles,
+                 streaming=False, use_cache=True, debounce=DEFAULT_DEBOUNCE, polling=False, workers=None):
+        """
+        @param doctypes: the names of the doctypes to create
+        @param outfiles: the file to write each doctype to
+        @param workers: how many processes to build NetApp commands on,
+        instead of the number set in the configuration file
+        @param debounce: how long things must be quiet for after a
+        change before the documents are regenerated
+        """
+        self.definitionfile = os.path.abspath(definitionfile)
+        self.configfile = os.path.abspath(configfile)
+        self.documents = zip(doctypes, outfiles)
+        self.streaming = streaming
+        self.use_cache = use_cache
+        self.debounce = debounce
+        self.polling = polling
+        self.workers = workers
+
+        self.digests = {}
+        self.outputs = {}
+        self.watcher = None
+
+        # Edit to output latency of each regeneration, in seconds
+        self.latencies = []
+
+    def get_watched_files(self):
+        return [ self.definitionfile, self.configfile ] + find_dependencies(self.definitionfile)
+
+    def update_digests(self):
+        """
+        Work out which of the watched files have different
+        contents to last time.
+        """
+        changed = set()
+        for filename in self.get_watched_files():
+            try:
+                digest = file_digest(filename)
+            except IOError:
+                digest = None
+                pass
+            if self.digests.get(filename) != digest:
+                self.digests[filename] = digest
+                changed.add(filename)
+                pass
+            pass
+        return changed
+
+    def load_defaults(self):
+        """
+        Read the configuration file again, as it may have changed.
+        @returns: the parsed configuration, and the files it was read from
+        """
+        defaults = RawConfigParser()
+        parsedfiles = defaults.read(self.configfile)
+        if len(parsedfiles) == 0:
+            raise ValueError("Cannot load configuration file: %s" % self.configfile)
+        if self.workers is not None:
+            set_command_workers(defaults, self.workers)
+            pass
+        return defaults, parsedfiles
+
+    def build(self):
+        """
+        Load the project, and write out any documents
+        that have changed.
+        @returns: the output files that were written
+        """
+        defaults, parsedfiles = self.load_defaults()
+        doc_plugins = load_doc_plugins(defaults)
+        proj = load_definition(self.definitionfile, defaults, parsedfiles,
+                               streaming=self.streaming, use_cache=self.use_cache)
+
+        written = []
+        for doctype, outfile in self.documents:
+            outf = StringIO()
+            doc_plugins[doctype](proj, defaults).emit(outf, ns={})
+            output = outf.getvalue()
+            if self.outputs.get(outfile) == output:
+                log.debug("%s is unchanged", outfile)
+                continue
+            f = open(outfile, 'w')
+            f.write(output)
+            f.close()
+            self.outputs[outfile] = output
+            written.append(outfile)
+            pass
+        return written
+
+    def start_watching(self):
+        if self.watcher is not None:
+            self.watcher.close()
+            pass
+        self.watched = self.get_watched_files()
+        self.watcher = make_watcher(self.watched, self.polling)
+        log.info("Watching %s", ', '.join(self.watched))
+
+    def wait_for_change(self):
+        """
+        Wait until a watched file changes, and then until things
+        have been quiet for a while.
+        @returns: the time of the first change that was seen
+        """
+        changed = self.watcher.wait()
+        first_seen = time.time()
+        edit_time = self.get_edit_time(changed, first_seen)
+        while len(changed) > 0:
+            changed = self.watcher.wait(self.debounce)
+            pass
+        return edit_time
+
+    def get_edit_time(self, changed, default):
+        """
+        When the files were edited, as near as can be told.
+        """
+        mtimes = []
+        for filename in changed:
+            try:
+                mtimes.append(os.stat(filename).st_mtime)
+            except OSError:
+                pass
+            pass
+        if len(mtimes) == 0:
+            return default
+        return min(min(mtimes), default)
+
+    def regenerate(self, edit_time):
+        """
+        Rebuild the documents after a change, if anything
+        that matters has changed.
+        """
+        changed = self.update_digests()
+        if len(changed) == 0:
+            log.debug("Nothing has really changed")
+            return
+
+        log.info("Changed: %s", ', '.join(sorted(changed)))
+        try:
+            written = self.build()
+        except Exception, e:
+            log.error("Cannot regenerate documents: %s", traceback.format_exc())
+            return
+
+        latency = time.time() - edit_time
+        self.latencies.append(latency)
+        if len(written) > 0:
+            log.info("Wrote %s, %.3fs after the edit", ', '.join(written), latency)
+        else:
+            log.info("No documents changed, %.3fs after the edit", latency)
+            pass
+
+        # Included files may have been added or removed
+        if self.get_watched_files() != self.watched:
+            self.start_watching()
+            pass
+
+    def run(self, changes=None):
+        """
+        Build the documents, then rebuild them whenever
+        the project changes.
+        @param changes: stop after this many changes. The default
+        is to keep going until interrupted.
+        """
+        self.update_digests()
+        try:
+            self.build()
+        except Exception, e:
+            # Carry on, so that it can be fixed while we watch
+            log.error("Cannot create documents: %s", traceback.format_exc())
+            pass
+
+        self.start_watching()
+        try:
+            while changes is None or changes > 0:
+                edit_time = self.wait_for_change()
+                self.regenerate(edit_time)
+                if changes is not None:
+                    changes -= 1
+                    pass
+                pass
+        finally:
+            self.watcher.close()
+            if len(self.latencies) > 0:
+                log.info("Regenerated %d times, edit to output mean %.3fs, max %.3fs",
+                         len(self.latencies), sum(self.latencies) / len(self.latencies), max(self.latencies))
+                pass
+            pass
@@ -67,3 +67,13 @@ class AggregateTest(unittest.TestCase):
         node = etree.fromstring(xmldata)
         self.failUnlessRaises(KeyError, aggregate.create_aggregate_from_node, node, self.defaults, self.vfiler1)
 
+
+    def test_direct_aggregate(self):
+        """
+        Aggregates can be made without a node
+        """
+        aggr = aggregate.create_aggregate(self.defaults, self.vfiler1, name='aggr02')
+        self.failUnlessEqual(aggr.name, 'aggr02')
+        self.failUnlessEqual(aggr.type, 'data')
+        self.failUnlessEqual(aggr.get_volumes(), [])
+        self.failUnlessRaises(KeyError, aggregate.create_aggregate, self.defaults, self.vfiler1, type='root')
@@ -0,0 +1,84 @@
+#
+# $Id$
+#
+"""
+Test building many project definitions at once
+"""
+import os
+import os.path
+import shutil
+
+from twisted.trial import unittest, runner, reporter
+from twisted.internet import reactor
+from twisted.python.util import sibpath
+
+from docgen.batch import find_definitions, get_outfile, build_projects, format_summary
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+
+XML_FILE_LOCATION = sibpath(__file__, "xml")
+TESTCONF = sibpath(__file__, "docgen_test.conf")
+
+DOCTYPES = [ 'ipsan-storage-design', 'netapp-commands' ]
+
+class BatchTest(unittest.TestCase):
+    """
+    Test the batch builder
+    """
+    def setUp(self):
+        self.workdir = os.path.abspath(self.mktemp())
+        os.makedirs(self.workdir)
+        for name in [ 'simple_single_site', 'clustered_nearstore' ]:
+            shutil.copy(os.path.join(XML_FILE_LOCATION, '%s.xml' % name),
+                        os.path.join(self.workdir, '%s.project-definition.xml' % name))
+            pass
+        f = open(os.path.join(self.workdir, 'broken.project-definition.xml'), 'w')
+        f.write('<project name="broken"')
+        f.close()
+
+    def test_find_definitions(self):
+        definitions = find_definitions([ self.workdir, os.path.join(self.workdir, 'simple*') ])
+        self.failUnlessEqual([ os.path.basename(x) for x in definitions ],
+                             [ 'broken.project-definition.xml',
+                               'clustered_nearstore.project-definition.xml',
+                               'simple_single_site.project-definition.xml' ])
+
+    def test_outfile(self):
+        self.failUnlessEqual(get_outfile('/a/b/PROJ.project-definition.xml', 'netapp-commands'),
+                             '/a/b/PROJ.IPSAN-storage-commands.txt')
+        self.failUnlessEqual(get_outfile('PROJ.xml', 'activation-advice'),
+                             'PROJ.activation-advice')
+
+    def test_build(self):
+        """
+        A broken definition doesn't stop the others being built
+        """
+        definitions = find_definitions([ self.workdir ])
+        results = build_projects(definitions, TESTCONF, DOCTYPES, processes=2, use_cache=False)
+        self.failUnlessEqual([ x.definitionfile for x in results ], definitions)
+        self.failUnlessEqual([ x.failed() for x in results ], [ True, False, False ])
+        self.failUnless('XMLSyntaxError' in results[0].error)
+
+        for result in results[1:]:
+            self.failUnlessEqual([ x[0] for x in result.timings ], [ 'parse', 'configure', 'setup' ] + DOCTYPES)
+            for outfile in result.outfiles:
+                self.failUnless(os.path.getsize(outfile) > 0)
+                pass
+            pass
+
+        summary = format_summary(results, DOCTYPES, 1.0)
+        self.failUnless('2 projects built, 1 failed' in summary)
+        for phase in [ 'parse', 'configure', 'setup' ]:
+            self.failUnless(phase in summary.splitlines()[0])
+            pass
+
+    def test_streaming_phases(self):
+        """
+        The streaming loader times the same phases
+        """
+        definitions = find_definitions([ os.path.join(self.workdir, 'simple*') ])
+        results = build_projects(definitions, TESTCONF, DOCTYPES, processes=1, streaming=True, use_cache=False)
+        self.failIf(results[0].failed())
+        self.failUnlessEqual([ x[0] for x in results[0].timings ], [ 'parse', 'configure', 'setup' ] + DOCTYPES)
@@ -0,0 +1,160 @@
+#
+# $Id$
+#
+"""
+Test that ancestor contexts give the same answers as XPath
+"""
+import os.path
+from lxml import etree
+
+from twisted.trial import unittest, runner, reporter
+from twisted.python.util import sibpath
+
+from docgen.context import AncestorContext, get_tree_context, get_ancestor_context
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+
+XML_FILE_LOCATION = sibpath(__file__, "xml")
+EXAMPLES_LOCATION = sibpath(__file__, os.path.join("..", "doc", "examples"))
+
+PROTOCOL_XPATH = "ancestor::*/vfiler/protocol/text()"
+MOUNTOPTION_XPATH = "ancestor-or-self::*/export[@to]/mountoption"
+
+tricky_definition = """<project name="tricky">
+  <export to="hosta"><mountoption>project-before</mountoption></export>
+  <site name="sitea">
+    <export to="hostb"><mountoption>site-before</mountoption></export>
+    <filer name="filera">
+      <vfiler name="first">
+        <aggregate name="aggr01">
+          <volume name="vol01">
+            <export to="hosta">
+              <mountoption>vol-a1</mountoption>
+              <mountoption>vol-a2</mountoption>
+            </export>
+            <qtree name="q01">
+              <export to="hosta"><mountoption>qtree-a</mountoption></export>
+              <lun/>
+            </qtree>
+            <qtree name="q02"/>
+            <export to="hostb"><mountoption>vol-after</mountoption></export>
+            <export to="hostc"/>
+            <export><mountoption>nobody</mountoption></export>
+          </volume>
+        </aggregate>
+        <protocol>nfs</protocol>
+      </vfiler>
+      <vfiler name="second">
+        <protocol name="iscsi"/>
+        <protocol><!-- comment -->ISCSI</protocol>
+        <aggregate name="aggr02">
+          <volume name="vol02"/>
+        </aggregate>
+      </vfiler>
+      <vfiler name="third">
+        <protocol>cifs</protocol>
+      </vfiler>
+    </filer>
+    <filer name="filerb">
+      <vfiler>
+        <aggregate name="aggr03">
+          <volume name="vol03"/>
+        </aggregate>
+      </vfiler>
+    </filer>
+    <export to="hosta"><mountoption>site-after</mountoption></export>
+  </site>
+  <site name="siteb">
+    <filer name="filerc">
+      <vfiler>
+        <aggregate name="aggr04">
+          <volume name="vol04"/>
+        </aggregate>
+      </vfiler>
+    </filer>
+  </site>
+  <vfiler><protocol>project-vfiler</protocol></vfiler>
+  <export to="hostb"><mountoption>project-after</mountoption></export>
+</project>
+"""
+
+def xpath_mountoptions(node):
+    table = {}
+    for mountoption in node.xpath(MOUNTOPTION_XPATH):
+        table.setdefault(mountoption.getparent().attrib['to'], []).append(mountoption.text)
+        pass
+    return table
+
+def xpath_protocol(node):
+    texts = node.xpath(PROTOCOL_XPATH)
+    if len(texts) > 0:
+        return texts[0]
+    return None
+
+class AncestorContextTest(unittest.TestCase):
+
+    def check_tree(self, root):
+        """
+        Descend the tree the way configure_children() does, and
+        check every element against the XPath answers.
+        """
+        count = 0
+        stack = [ AncestorContext(root) ]
+        while stack:
+            context = stack.pop()
+            self.failUnlessEqual(context.get_vfiler_protocol(), xpath_protocol(context.node))
+            self.failUnlessEqual(context.get_export_mountoptions(), xpath_mountoptions(context.node))
+            count += 1
+            for child in context.node.iterchildren(tag=etree.Element):
+                stack.append(context.child_context(child))
+                pass
+            pass
+        return count
+
+    def test_tricky(self):
+        root = etree.fromstring(tricky_definition)
+        self.failUnless(self.check_tree(root) > 40)
+
+        vol01 = root.find('site/filer/vfiler/aggregate/volume')
+        self.failUnlessEqual(get_tree_context(vol01).get_vfiler_protocol(), 'nfs')
+        vol02 = root.findall('site/filer/vfiler/aggregate/volume')[1]
+        self.failUnlessEqual(get_tree_context(vol02).get_vfiler_protocol(), 'nfs')
+        vol04 = root.find('site[@name="siteb"]/filer/vfiler/aggregate/volume')
+        self.failUnlessEqual(get_tree_context(vol04).get_vfiler_protocol(), 'project-vfiler')
+
+        qtree = vol01.find('qtree')
+        self.failUnlessEqual(get_tree_context(qtree).get_export_mountoptions(),
+                             { 'hosta': [ 'project-before', 'vol-a1', 'vol-a2', 'qtree-a', 'site-after' ],
+                               'hostb': [ 'site-before', 'vol-after', 'project-after' ],
+                               })
+
+    def test_protocol_after(self):
+        """
+        A protocol after the volume only counts if there isn't one before it
+        """
+        root = etree.fromstring(tricky_definition)
+        first = root.find('site/filer/vfiler')
+        first.remove(first.find('protocol'))
+        self.check_tree(root)
+        vol01 = root.find('site/filer/vfiler/aggregate/volume')
+        self.failUnlessEqual(get_tree_context(vol01).get_vfiler_protocol(), 'ISCSI')
+
+    def test_detached(self):
+        node = etree.fromstring('<qtree><export to="hosta"><mountoption>a</mountoption></export></qtree>')
+        context = get_ancestor_context(node, None)
+        self.failUnlessEqual(context.get_export_mountoptions(), { 'hosta': [ 'a' ] })
+        self.failUnlessEqual(context.get_vfiler_protocol(), None)
+
+    def test_definitions(self):
+        filenames = [ os.path.join(XML_FILE_LOCATION, x) for x in os.listdir(XML_FILE_LOCATION) if x.endswith('.xml') ]
+        filenames.extend([ os.path.join(EXAMPLES_LOCATION, x) for x in os.listdir(EXAMPLES_LOCATION) if x.endswith('project-definition.xml') ])
+        for filename in filenames:
+            try:
+                tree = etree.parse(filename, etree.XMLParser(resolve_entities=True))
+            except etree.XMLSyntaxError:
+                # Some only parse as part of another definition
+                continue
+            self.check_tree(tree.getroot())
+            pass
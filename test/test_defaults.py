@@ -0,0 +1,92 @@
+#
+# $Id$
+#
+"""
+Test the typed defaults snapshot
+"""
+from StringIO import StringIO
+
+from twisted.trial import unittest, runner, reporter
+from twisted.python.util import sibpath
+
+from ConfigParser import RawConfigParser
+
+from docgen.defaults import Defaults, get_defaults
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+
+TESTCONF = sibpath(__file__, "docgen_test.conf")
+
+def read_config(text):
+    config = RawConfigParser()
+    config.readfp(StringIO(text))
+    return config
+
+class DefaultsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config = RawConfigParser()
+        self.config.read(TESTCONF)
+
+    def test_typed(self):
+        defaults = Defaults(self.config)
+        self.failUnlessEqual(defaults.missing, [])
+        self.failUnlessEqual(defaults.volume.default_size, 100.0)
+        self.failUnlessEqual(defaults.volume.default_snapreserve, 20)
+        self.failUnlessEqual(defaults.volume.allow_volume_export, False)
+        self.failUnlessEqual(defaults.volume.default_options,
+                             [ ('nvfail', 'on'), ('create_ucode', 'on'), ('convert_ucode', 'on') ])
+        self.failUnlessEqual(defaults.vfiler.root_volume_usable, 0.02)
+        self.failUnlessEqual(defaults.vfiler.backup_root_volume, True)
+        self.failUnlessEqual(defaults.lun.lun_numbering, 'site')
+        self.failUnlessEqual(defaults.global_.iscsi_prefix, 'docgen')
+
+    def test_passthrough(self):
+        """
+        Sections without typed options come from the RawConfigParser
+        """
+        defaults = Defaults(self.config)
+        self.failUnlessEqual(defaults.get('filer', 'default_type'), 'filer')
+        self.failUnlessEqual(defaults.items('document_plugins'), self.config.items('document_plugins'))
+
+    def test_get_defaults(self):
+        defaults = get_defaults(self.config)
+        self.failUnless(isinstance(defaults, Defaults))
+        self.failUnless(get_defaults(defaults) is defaults)
+
+    def test_missing(self):
+        """
+        Missing options don't raise, and the required ones are noted
+        """
+        defaults = Defaults(read_config("[volume]\ndefault_size: 50\n"))
+        self.failUnlessEqual(defaults.volume.default_size, 50.0)
+        self.failUnlessEqual(defaults.volume.default_snapreserve, 20)
+        self.failUnlessEqual(defaults.volume.high_delta_types, [])
+        self.failUnlessEqual(defaults.volume.iscsi_snapspace, 0)
+        self.failUnlessEqual(defaults.vfiler.default_root_aggregate, None)
+        self.failUnlessEqual(defaults.lun.lun_numbering, None)
+        self.failUnlessEqual(defaults.nfs.export_security, True)
+        self.failUnlessEqual(defaults.snapmirror.multiplier, 2.5)
+        self.failUnless( ('volume', 'default_snapreserve') in defaults.missing )
+        self.failIf( ('volume', 'default_size') in defaults.missing )
+        self.failIf( ('lun', 'lun_numbering') in defaults.missing )
+
+    def test_high_delta_types(self):
+        """
+        High delta volume types are a list, so only whole types match
+        """
+        defaults = Defaults(read_config("[volume]\nhigh_delta_types: oradata, oraredo,\niscsi_snapspace: 25\n"))
+        self.failUnlessEqual(defaults.volume.high_delta_types, [ 'oradata', 'oraredo' ])
+        self.failIf('ora' in defaults.volume.high_delta_types)
+        self.failUnlessEqual(defaults.volume.iscsi_snapspace, 25)
+
+    def test_invalid(self):
+        """
+        Values that can't be converted fail when the defaults are loaded
+        """
+        self.failUnlessRaises(ValueError, Defaults, read_config("[volume]\ndefault_snapreserve: lots\n"))
+        self.failUnlessRaises(ValueError, Defaults, read_config("[nfs]\nsubnet_exports: maybe\n"))
+        self.failUnlessRaises(ValueError, Defaults, read_config("[volume]\ndefault_options: nvfail\n"))
+        self.failUnlessRaises(ValueError, Defaults, read_config("[volume]\niscsi_snapspace: half\n"))
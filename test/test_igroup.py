@@ -0,0 +1,112 @@
+#
+# $Id$
+#
+"""
+Test automatic iGroup creation
+"""
+import os.path
+import random
+
+from lxml import etree
+
+from twisted.trial import unittest, runner, reporter
+from twisted.internet import reactor
+from twisted.python.util import sibpath
+
+from ConfigParser import RawConfigParser
+
+from docgen.options import BaseOptions
+from docgen.project import Project
+from docgen.export import Export
+from docgen.igroup import ExportGrouping, export_signature
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+log.setLevel(logging.DEBUG)
+
+XML_FILE_LOCATION = sibpath(__file__, "xml")
+TESTCONF = sibpath(__file__, "docgen_test.conf")
+
+def pairwise_groups(exportlists):
+    """
+    Group export lists by comparing each one with every group
+    created so far, the way iGroups used to be built.
+    """
+    groups = []
+    assigned = []
+    for exports in exportlists:
+        matched = None
+        for index, group in enumerate(groups):
+            match = True
+            for a, b in zip(group, exports):
+                if a != b:
+                    match = False
+                    pass
+                pass
+            if match:
+                matched = index
+                break
+            pass
+        if matched is None:
+            matched = len(groups)
+            groups.append(exports)
+            pass
+        assigned.append(matched)
+        pass
+    return assigned
+
+class iGroupTest(unittest.TestCase):
+    """
+    Test grouping LUNs into iGroups
+    """
+    def setUp(self):
+        optparser = BaseOptions()
+        optparser.parseOptions(['dummyfile.xml', '--debug=%s' % logging._levelNames[log.level].lower()])
+        self.defaults = RawConfigParser()
+        configfiles = self.defaults.read(TESTCONF)
+
+    def test_same_as_pairwise(self):
+        """
+        Export signature grouping puts LUNs in the same groups
+        as comparing them pairwise
+        """
+        rand = random.Random(42)
+        hosts = [ object() for i in range(4) ]
+        exportlists = []
+        for i in range(500):
+            exports = [ Export(type=rand.choice(['rw', 'ro']), tohost=rand.choice(hosts), fromip='10.0.0.1') for j in range(rand.randint(0, 3)) ]
+            exportlists.append(exports)
+            pass
+
+        grouping = ExportGrouping()
+        assigned = []
+        for exports in exportlists:
+            signature = export_signature(exports)
+            group = grouping.find_group(signature)
+            if group is None:
+                group = len(grouping.groups)
+                grouping.add_group(signature, group)
+                pass
+            assigned.append(group)
+            pass
+
+        self.failUnlessEqual(assigned, pairwise_groups(exportlists))
+
+    def test_project_igroups(self):
+        """
+        LUNs sharing the same exports share an iGroup
+        """
+        xmlfile = os.path.join(XML_FILE_LOCATION, 'lun_3vols_multiple_luns.xml')
+        tree = etree.parse(xmlfile)
+        project = Project()
+        project.configure_from_node(tree.getroot(), self.defaults, None)
+
+        luns = project.get_luns()
+        self.failIfEqual(len(luns), 0)
+        igroup = luns[0].igroup
+        self.failUnlessEqual(igroup.name, self.defaults.get('igroup', 'igroup_name') % dict(project.get_sites()[0].populate_namespace(), igroup_number=0))
+        for lun in luns:
+            self.failUnless(lun.igroup is igroup)
+            pass
+        self.failUnlessEqual(len(igroup.get_luns()), len(luns))
@@ -6,6 +6,7 @@ Test emitting the NetApp commands required to activate
 a variety of project definitions.
 """
 import os.path
+import re
 from StringIO import StringIO
 from lxml import etree
 
@@ -28,6 +29,14 @@ log.setLevel(logging.DEBUG)
 XML_FILE_LOCATION = sibpath(__file__, "xml")
 TESTCONF = sibpath(__file__, "docgen_test.conf")
 
+def normalise(document):
+    """
+    Some document lines include object addresses, and some
+    things are sorted by them, so take those differences out.
+    """
+    document = re.sub(' object at 0x[0-9a-f]+', '', document)
+    return sorted(document.split('\n'))
+
 class NetAppTestBase(unittest.TestCase):
     """
     Common basecode setup for testing design output
@@ -91,3 +100,54 @@ class NetAppStorageDesign(NetAppTestBase):
         data = self.outfile.read()
         self.failUnlessEqual(data, '')
         
+
+class FragmentRecorder:
+    """
+    A file object that remembers each write separately.
+    """
+    def __init__(self):
+        self.fragments = []
+
+    def write(self, data):
+        self.fragments.append(data)
+
+class StreamingDesignTest(NetAppTestBase):
+    """
+    Test writing out the design a piece at a time
+    """
+    def test_streaming(self):
+        self.load_testfile("clustered_nearstore.xml")
+        self.docgenerator.spool_chunk_size = 4096
+        outf = FragmentRecorder()
+        self.docgenerator.emit(outf, ns={})
+        streamed = ''.join(outf.fragments)
+
+        self.failUnless(len(outf.fragments) > 10)
+        self.failUnless(max([ len(x) for x in outf.fragments[1:-1] ]) <= 4096)
+        self.failUnless(streamed.startswith('<?xml version="1.0" ?>'))
+        self.failUnless(streamed.endswith('</book>\n'))
+
+        # Building the whole book at once gives the same document
+        self.load_testfile("clustered_nearstore.xml")
+        ns = {}
+        ns['copyright_holder'] = self.defaults.get('global', 'copyright_holder')
+        ns['iscsi_prefix'] = self.defaults.get('global', 'iscsi_prefix')
+        book = self.docgenerator.build_book(ns)
+        self.failUnlessEqual(normalise(streamed), normalise(book))
+
+    def test_header_entities(self):
+        """
+        Values builders add to the namespace still make it
+        into the entities declared at the head of the book
+        """
+        self.load_testfile("clustered_nearstore.xml")
+        build_chapters = self.docgenerator.build_chapters
+        def build_chapters_with_vlan(ns):
+            ns['primary_project_vlan'] = 3113
+            return build_chapters(ns)
+        self.docgenerator.build_chapters = build_chapters_with_vlan
+        self.docgenerator.spool_size = 1024
+
+        outf = FragmentRecorder()
+        self.docgenerator.emit(outf, ns={})
+        self.failUnless('<!ENTITY primary.project.vlan "3113">' in outf.fragments[0])
@@ -0,0 +1,206 @@
+#
+# $Id$
+#
+"""
+Test the streaming project loader
+"""
+import os.path
+from StringIO import StringIO
+from ConfigParser import RawConfigParser
+
+from twisted.trial import unittest, runner, reporter
+from twisted.internet import reactor
+from twisted.python.util import sibpath
+
+from lxml import etree
+
+from docgen.options import BaseOptions
+from docgen.project import Project
+from docgen.loader import load_project
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+log.setLevel(logging.DEBUG)
+
+XML_FILE_LOCATION = sibpath(__file__, "xml")
+TESTCONF = sibpath(__file__, "docgen_test.conf")
+EXAMPLES_LOCATION = sibpath(__file__, os.path.join("..", "doc", "examples"))
+
+class StreamReader:
+    """
+    A definition that can only be read once, like a pipe.
+    """
+    def __init__(self, data):
+        self.data = StringIO(data)
+
+    def read(self, size=-1):
+        return self.data.read(size)
+
+class LoaderTest(unittest.TestCase):
+    """
+    Test loading a project one site at a time
+    """
+    def setUp(self):
+        optparser = BaseOptions()
+        optparser.parseOptions(['dummyfile.xml', '--debug=%s' % logging._levelNames[log.level].lower()])
+
+        self.defaults = RawConfigParser()
+        configfiles = self.defaults.read(TESTCONF)
+
+    def load_both(self, filename):
+        xmlfile = os.path.join(XML_FILE_LOCATION, filename)
+        return self.load_file_both(xmlfile)
+
+    def load_file_both(self, xmlfile):
+        tree = etree.parse(xmlfile)
+        project = Project()
+        project.configure_from_node(tree.getroot(), self.defaults, None)
+
+        streamed = load_project(xmlfile, self.defaults)
+        return project, streamed
+
+    def test_same_model(self):
+        """
+        Streaming builds the same model as parsing the whole file
+        """
+        for filename in [ 'simple_single_site.xml', 'clustered_nearstore.xml', 'drhostexport_test.xml' ]:
+            project, streamed = self.load_both(filename)
+            self.failUnlessEqual(streamed.name, project.name)
+            self.failUnlessEqual([ x.name for x in streamed.get_sites() ], [ x.name for x in project.get_sites() ])
+            self.failUnlessEqual([ x.name for x in streamed.get_filers() ], [ x.name for x in project.get_filers() ])
+            self.failUnlessEqual([ x.name for x in streamed.get_volumes() ], [ x.name for x in project.get_volumes() ])
+            self.failUnlessEqual([ x.name for x in streamed.get_luns() ], [ x.name for x in project.get_luns() ])
+            self.failUnlessEqual([ x.name for x in streamed.get_snapvaultsets() ], [ x.name for x in project.get_snapvaultsets() ])
+            self.failUnlessEqual([ x.name for x in streamed.get_snapmirrorsets() ], [ x.name for x in project.get_snapmirrorsets() ])
+            pass
+
+    def test_drhosts_linked(self):
+        project, streamed = self.load_both('drhostexport_test.xml')
+        self.failUnlessEqual([ [ y.name for y in x.get_drhosts() ] for x in streamed.get_hosts() ],
+                             [ [ y.name for y in x.get_drhosts() ] for x in project.get_hosts() ])
+
+    def test_mountoptions(self):
+        project, streamed = self.load_both('clustered_nearstore.xml')
+        self.check_mountoptions(project, streamed)
+
+    def check_mountoptions(self, project, streamed):
+        """
+        Check both projects give each host the same mountoptions
+        for each qtree.
+        @returns: the mountoptions found
+        """
+        found = []
+        for vol, streamed_vol in zip(project.get_volumes(), streamed.get_volumes()):
+            self.failUnlessEqual(streamed_vol.volnode, None)
+            for qtree, streamed_qtree in zip(vol.get_qtrees(), streamed_vol.get_qtrees()):
+                for host, streamed_host in zip(project.get_hosts(), streamed.get_hosts()):
+                    mountoptions = project.get_host_qtree_mountoptions(host, qtree)
+                    self.failUnlessEqual(mountoptions, streamed.get_host_qtree_mountoptions(streamed_host, streamed_qtree))
+                    found.extend(mountoptions)
+                    pass
+                pass
+            pass
+        return found
+
+    def test_project_exports(self):
+        """
+        Exports given at the project level apply to every site,
+        whether they come before or after it in the definition
+        """
+        definition = open(os.path.join(EXAMPLES_LOCATION, 'EXAMPLE.project-definition.xml')).read()
+        first = definition.index("<site ")
+        last = definition.rindex("</site>") + len("</site>")
+        definition = definition[:first] \
+                     + '<export to="primhost01"><mountoption>beforeopt</mountoption></export>\n' \
+                     + definition[first:last] \
+                     + '\n<export to="primhost01"><mountoption>afteropt</mountoption></export>' \
+                     + definition[last:]
+
+        xmlfile = self.mktemp()
+        f = open(xmlfile, 'w')
+        f.write(definition)
+        f.close()
+
+        project, streamed = self.load_file_both(xmlfile)
+        found = self.check_mountoptions(project, streamed)
+        self.failUnless('beforeopt' in found)
+        self.failUnless('afteropt' in found)
+
+        # Without reading the definition beforehand, those before a site still apply
+        streamed = load_project(StreamReader(definition), self.defaults)
+        found = []
+        for qtree in [ x for vol in streamed.get_volumes() for x in vol.get_qtrees() ]:
+            for host in streamed.get_hosts():
+                found.extend(streamed.get_host_qtree_mountoptions(host, qtree))
+                pass
+            pass
+        self.failUnless('beforeopt' in found)
+
+    lunid_definition = """<project name="testproj" code="01">
+  <site name="sitea" type="primary" location="testlab">
+    <filer name="filer1" type="filer">
+      <vfiler name="vftest01">
+        <aggregate type="root" name="aggr0"/>
+        <aggregate name="aggr01">
+          <volume name="vol01">
+            <lun/>
+            <lun/>
+            <lun lunid="1"/>
+          </volume>
+        </aggregate>
+      </vfiler>
+    </filer>
+  </site>
+  <site name="siteb" type="secondary" location="testlab">
+    <filer name="filer2" type="filer">
+      <vfiler name="vftest02">
+        <aggregate type="root" name="aggr0"/>
+        <aggregate name="aggr01">
+          <volume name="vol02">
+            <lun lunid="3"/>
+            <lun/>
+          </volume>
+        </aggregate>
+      </vfiler>
+    </filer>
+  </site>
+</project>
+"""
+
+    def test_manual_lunids(self):
+        """
+        LUNs are numbered the same way by both loaders, however they
+        are numbered, including those numbered by hand in later sites
+        """
+        xmlfile = self.mktemp()
+        f = open(xmlfile, 'w')
+        f.write(self.lunid_definition)
+        f.close()
+
+        def get_lunids(project):
+            return [ [ x.lunid for x in vol.get_luns() ] for vol in project.get_volumes() if vol.type != 'root' ]
+
+        expected = {
+            None: [ [ 0, 2, 1 ], [ 3, 4 ] ],
+            'project': [ [ 0, 2, 1 ], [ 3, 4 ] ],
+            'site': [ [ 0, 2, 1 ], [ 3, 0 ] ],
+            'volume': [ [ 0, 2, 1 ], [ 3, 0 ] ],
+            }
+        for lun_numbering, lunids in expected.items():
+            if lun_numbering is None:
+                self.defaults.remove_option('lun', 'lun_numbering')
+            else:
+                self.defaults.set('lun', 'lun_numbering', lun_numbering)
+                pass
+
+            project = Project()
+            project.configure_from_node(etree.parse(xmlfile).getroot(), self.defaults, None)
+            self.failUnlessEqual(get_lunids(project), lunids)
+            self.failUnlessEqual(get_lunids(load_project(xmlfile, self.defaults)), lunids)
+            self.failUnlessEqual(get_lunids(load_project(StringIO(self.lunid_definition), self.defaults)), lunids)
+            pass
+
+    def test_not_a_project(self):
+        xmlfile = os.path.join(XML_FILE_LOCATION, 'host_named.xml')
+        self.failUnlessRaises(ValueError, load_project, xmlfile, self.defaults)
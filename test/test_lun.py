@@ -99,3 +99,56 @@ class LUNTest(unittest.TestCase):
         xmlfile = os.path.join(XML_FILE_LOCATION, 'lun_3vols_multiple_luns.xml')
         tree = etree.parse(xmlfile)
         self.project.configure_from_node(tree.getroot(), self.defaults, None)
+
+    lunid_definition = """<project name="testproj" code="01">
+  <site name="sitea" type="primary" location="testlab">
+    <filer name="filer1" type="filer">
+      <vfiler name="vftest01">
+        <aggregate type="root" name="aggr0"/>
+        <aggregate name="aggr01">
+          <volume name="vol01">
+            <lun/>
+            <lun/>
+            <lun lunid="1"/>
+          </volume>
+          <volume name="vol02">
+            <lun/>
+            <lun restartnumbering="0"/>
+          </volume>
+        </aggregate>
+      </vfiler>
+    </filer>
+  </site>
+</project>
+"""
+
+    def get_lunids(self):
+        return [ [ x.lunid for x in vol.get_luns() ] for vol in self.project.get_volumes() if vol.type != 'root' ]
+
+    def test_manual_lunids_reserved(self):
+        """
+        LUNs numbered automatically skip the ids of those numbered by hand
+        """
+        self.project.configure_from_node(etree.fromstring(self.lunid_definition), self.defaults, None)
+        self.failUnlessEqual(self.get_lunids(), [ [ 0, 2, 1 ], [ 3, 0 ] ])
+
+        # Restarting the numbering reuses an id in the site
+        collisions = self.project.get_lunid_collisions()
+        self.failUnlessEqual(len(collisions), 1)
+        scope, lunid, luns = collisions[0]
+        self.failUnless(scope is self.project.get_sites()[0])
+        self.failUnlessEqual(lunid, 0)
+        self.failUnlessEqual([ x.name for x in luns ], [ 'vftest01.lun00', 'vftest01.lun00' ])
+
+    def test_lunid_scope(self):
+        """
+        The allocator for the numbering scope is shared by the objects below it
+        """
+        self.defaults.set('lun', 'lun_numbering', 'volume')
+        self.project.configure_from_node(etree.fromstring(self.lunid_definition), self.defaults, None)
+        self.failUnlessEqual(self.get_lunids(), [ [ 0, 2, 1 ], [ 0, 0 ] ])
+
+        vol01, vol02 = [ x for x in self.project.get_volumes() if x.type != 'root' ]
+        self.failUnless(vol01.lunid_allocator.scope is vol01)
+        self.failUnless(vol01.parent.lunid_allocator is None)
+        self.failUnlessEqual([ x[0] for x in self.project.get_lunid_collisions() ], [ vol02 ])
@@ -0,0 +1,189 @@
+#
+# $Id$
+#
+"""
+Test the on-disk cache of configured projects
+"""
+import os
+import os.path
+import re
+import shutil
+from StringIO import StringIO
+from ConfigParser import RawConfigParser
+
+from twisted.trial import unittest, runner, reporter
+from twisted.internet import reactor
+from twisted.python.util import sibpath
+
+from lxml import etree
+
+from docgen.options import BaseOptions
+from docgen.project import Project
+from docgen.modelcache import ModelCache, find_dependencies
+from docgen.docplugins.ipsan_storage import IPSANStorageDesignGenerator
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+log.setLevel(logging.DEBUG)
+
+XML_FILE_LOCATION = sibpath(__file__, "xml")
+TESTCONF = sibpath(__file__, "docgen_test.conf")
+EXAMPLES_LOCATION = sibpath(__file__, os.path.join("..", "doc", "examples"))
+
+ENTITY_DEFINITION = """<?xml version="1.0"?>
+<!DOCTYPE project [
+<!ENTITY sitea SYSTEM "sitea.xml">
+]>
+<project name="cachetest" code="01">
+&sitea;
+</project>
+"""
+
+class ModelCacheTest(unittest.TestCase):
+    """
+    Test caching configured projects
+    """
+    def setUp(self):
+        optparser = BaseOptions()
+        optparser.parseOptions(['dummyfile.xml', '--debug=%s' % logging._levelNames[log.level].lower()])
+
+        self.defaults = RawConfigParser()
+        configfiles = self.defaults.read(TESTCONF)
+
+        self.workdir = os.path.abspath(self.mktemp())
+        os.makedirs(self.workdir)
+        self.cache = ModelCache(os.path.join(self.workdir, 'cache'))
+
+        self.definition = os.path.join(self.workdir, 'project.xml')
+        shutil.copy(os.path.join(XML_FILE_LOCATION, 'clustered_nearstore.xml'), self.definition)
+        self.configfile = os.path.join(self.workdir, 'docgen.conf')
+        shutil.copy(TESTCONF, self.configfile)
+
+    def load(self, filename):
+        tree = etree.parse(filename)
+        project = Project()
+        project.configure_from_node(tree.getroot(), self.defaults, None)
+        return project
+
+    def test_hit(self):
+        """
+        A stored project comes back with the same model
+        """
+        key = self.cache.get_key(self.definition, [self.configfile])
+        self.failUnlessEqual(self.cache.load(key), None)
+        self.failUnlessEqual(self.cache.misses, 1)
+
+        project = self.load(self.definition)
+        volumes = [ x.name for x in project.get_volumes() ]
+        luns = [ (x.name, x.lunid) for x in project.get_luns() ]
+        self.cache.store(key, project)
+
+        cached = self.cache.load(key)
+        self.failUnlessEqual(self.cache.hits, 1)
+        self.failUnlessEqual([ x.name for x in cached.get_volumes() ], volumes)
+        self.failUnlessEqual([ (x.name, x.lunid) for x in cached.get_luns() ], luns)
+        self.failUnless(cached.get_filers()[0].get_volumes()[0].get_filer() is cached.get_filers()[0])
+
+    def test_same_document(self):
+        """
+        A project from the cache gives the same design as a fresh one
+        """
+        for filename in [ os.path.join(XML_FILE_LOCATION, 'project_1_site_3_hosts.xml'),
+                          os.path.join(XML_FILE_LOCATION, 'clustered_nearstore.xml'),
+                          os.path.join(EXAMPLES_LOCATION, 'EXAMPLE.multi-network-vlan.project-definition.xml'),
+                          ]:
+            documents = []
+            for project in [ self.load(filename), self.round_trip(self.load(filename)) ]:
+                outf = StringIO()
+                IPSANStorageDesignGenerator(project, self.defaults).emit(outf, ns={})
+                documents.append(re.sub(' object at 0x[0-9a-f]+', '', outf.getvalue()))
+                pass
+            self.failUnlessEqual(documents[0], documents[1])
+            pass
+
+    def round_trip(self, project):
+        self.cache.store('roundtrip', project)
+        return self.cache.load('roundtrip')
+
+    def test_definition_changed(self):
+        key = self.cache.get_key(self.definition, [self.configfile])
+        self.cache.store(key, self.load(self.definition))
+
+        f = open(self.definition, 'a')
+        f.write('\n<!-- changed -->\n')
+        f.close()
+        self.failIfEqual(self.cache.get_key(self.definition, [self.configfile]), key)
+
+    def test_config_changed(self):
+        key = self.cache.get_key(self.definition, [self.configfile])
+        f = open(self.configfile, 'a')
+        f.write('\n# changed\n')
+        f.close()
+        self.failIfEqual(self.cache.get_key(self.definition, [self.configfile]), key)
+
+    def test_dependency_changed(self):
+        """
+        A change to an included entity file makes the cached project stale
+        """
+        definition = os.path.join(self.workdir, 'entities.xml')
+        f = open(definition, 'w')
+        f.write(ENTITY_DEFINITION)
+        f.close()
+        sitefile = os.path.join(self.workdir, 'sitea.xml')
+        f = open(sitefile, 'w')
+        f.write('<site name="sitea" type="primary" location="somewhere"/>\n')
+        f.close()
+
+        depends = find_dependencies(definition)
+        self.failUnlessEqual(depends, [sitefile])
+
+        key = self.cache.get_key(definition, [self.configfile])
+        self.cache.store(key, self.load(self.definition), depends)
+        self.failIfEqual(self.cache.load(key), None)
+
+        f = open(sitefile, 'w')
+        f.write('<site name="siteb" type="primary" location="somewhere"/>\n')
+        f.close()
+        self.failUnlessEqual(self.cache.load(key), None)
+
+    def test_corrupt_entry(self):
+        """
+        An unreadable entry is a miss, and is removed
+        """
+        key = self.cache.get_key(self.definition, [self.configfile])
+        self.cache.store(key, self.load(self.definition))
+        f = open(self.cache.get_path(key), 'wb')
+        f.write('not a pickle')
+        f.close()
+
+        self.failUnlessEqual(self.cache.load(key), None)
+        self.failIf(os.path.exists(self.cache.get_path(key)))
+
+    def test_unwritable_directory(self):
+        """
+        A project that can't be cached is still usable
+        """
+        notadir = os.path.join(self.workdir, 'notadir')
+        open(notadir, 'w').close()
+        cache = ModelCache(os.path.join(notadir, 'cache'))
+        key = cache.get_key(self.definition, [self.configfile])
+        cache.store(key, self.load(self.definition))
+        self.failUnlessEqual(cache.load(key), None)
+
+    def test_eviction(self):
+        """
+        The least recently used entries are thrown away first
+        """
+        project = self.load(self.definition)
+        self.cache.store('first', project)
+        self.cache.store('second', project)
+        os.utime(self.cache.get_path('first'), (1000, 1000))
+        os.utime(self.cache.get_path('second'), (2000, 2000))
+
+        # Room for one entry only
+        self.cache.max_size = os.path.getsize(self.cache.get_path('second')) + 1
+        self.cache.load('first')
+        self.cache.evict()
+        self.failUnless(os.path.exists(self.cache.get_path('first')))
+        self.failIf(os.path.exists(self.cache.get_path('second')))
@@ -0,0 +1,85 @@
+#
+# $Id$
+#
+"""
+Test writing out ModiPy change configurations
+"""
+from lxml import etree
+
+from twisted.trial import unittest, runner, reporter
+from twisted.internet import reactor
+
+from docgen.docplugins.modipy import NetAppModiPyGenerator, XINCLUDE_NAMESPACE
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+
+class FakeVolume:
+    def __init__(self, name, aggregate, size, voloptions):
+        self.name = name
+        self.aggregate = aggregate
+        self.size = size
+        self.voloptions = voloptions
+
+    def get_create_size(self):
+        return self.size
+
+class FakeFiler:
+    def __init__(self, name, site, type, volumes):
+        self.name = name
+        self.site = site
+        self.type = type
+        self.volumes = volumes
+        self.vfilers = { 'vftest': None }
+
+class FakeConf:
+    def __init__(self, filers):
+        self.filers = dict([ (x.name, x) for x in filers ])
+
+class ModiPyTest(unittest.TestCase):
+    """
+    Test the config is written out one element at a time
+    """
+    def setUp(self):
+        filers = [ FakeFiler('filer1', 'primary', 'primary',
+                             [ FakeVolume('vol1', 'aggr0', '10g', [ 'nosnap=on', 'minra=off' ]),
+                               FakeVolume('vol2', 'aggr0', '20g', []) ]),
+                   FakeFiler('filer2', 'secondary', 'secondary',
+                             [ FakeVolume('vol3', 'aggr1', '30g', [ 'nosnap=on' ]) ]),
+                   ]
+        self.generator = NetAppModiPyGenerator(FakeConf(filers), template_path='/templates')
+
+    def test_emit(self):
+        outfile = self.mktemp()
+        self.generator.emit(outfile, versioned=False)
+        root = etree.parse(outfile).getroot()
+        self.failUnlessEqual(root.tag, 'config')
+
+        includes = root.findall('{%s}include' % XINCLUDE_NAMESPACE)
+        self.failUnlessEqual([ x.get('href') for x in includes ],
+                             [ '/templates/netapp-create-volume.zapi.change-template.xml',
+                               '/templates/netapp-set-volume-option.zapi.change-template.xml' ])
+        self.failUnlessEqual([ x.get('name') for x in root.findall('provisioner') ],
+                             [ 'netapp_provisioner', 'netapp_zapi_provisioner' ])
+        self.failUnlessEqual(sorted([ x.get('name') for x in root.findall('device') ]), [ 'filer1', 'filer2' ])
+
+        volumes = root.find("iterator[@name='iter.filer1.volumes']")
+        self.failUnlessEqual(len(volumes), 2)
+        entries = dict([ (x.get('name'), x.text) for x in volumes[0] ])
+        self.failUnlessEqual(entries, { 'volname': 'vol1', 'volaggr': 'aggr0', 'volsize': '10g' })
+        self.failUnlessEqual(len(root.find("iterator[@name='iter.filer1.volume-options']")), 2)
+
+        # Only primary filers get changes
+        self.failUnlessEqual([ x.get('name') for x in root.findall('change') ],
+                             [ 'start', 'filer1-create-volumes', 'filer1-set-volume-options' ])
+        self.failUnlessEqual(root.find("change[@name='filer1-set-volume-options']/depends").get('on'),
+                             'filer1-create-volumes')
+
+    def test_streamed(self):
+        """
+        Devices are built one at a time, as they are written
+        """
+        devices = self.generator.build_devices()
+        self.failIf(isinstance(devices, list))
+        self.failUnlessEqual(devices.next().tag, 'device')
@@ -0,0 +1,91 @@
+#
+# $Id$
+#
+"""
+Test the project name index
+"""
+import os.path
+from ConfigParser import RawConfigParser
+
+from twisted.trial import unittest, runner, reporter
+from twisted.internet import reactor
+from twisted.python.util import sibpath
+
+from lxml import etree
+
+from docgen.options import BaseOptions
+from docgen.project import Project
+from docgen.aggregate import Aggregate
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+log.setLevel(logging.DEBUG)
+
+XML_FILE_LOCATION = sibpath(__file__, "xml")
+TESTCONF = sibpath(__file__, "docgen_test.conf")
+
+class NameIndexTest(unittest.TestCase):
+    """
+    Test finding project objects by name
+    """
+    def setUp(self):
+        optparser = BaseOptions()
+        optparser.parseOptions(['dummyfile.xml', '--debug=%s' % logging._levelNames[log.level].lower()])
+
+        self.defaults = RawConfigParser()
+        configfiles = self.defaults.read(TESTCONF)
+
+        xmlfile = os.path.join(XML_FILE_LOCATION, "clustered_nearstore.xml")
+        tree = etree.parse(xmlfile)
+        self.project = Project()
+        self.project.configure_from_node(tree.getroot(), self.defaults, None)
+
+    def test_hosts(self):
+        for host in self.project.get_hosts():
+            self.failUnless(self.project.get_host_byname(host.name) is host)
+            pass
+
+    def test_missing_host(self):
+        try:
+            self.project.get_host_byname('nosuchhost')
+        except KeyError, e:
+            self.failUnlessEqual(str(e), str(KeyError("Host 'nosuchhost' is not specified in definition")))
+        else:
+            self.fail("Missing host not detected")
+
+    def test_filers_and_vfilers(self):
+        index = self.project.get_name_index()
+        for filer in self.project.get_filers():
+            self.failUnless(index.filers[filer.name] is filer)
+            for vfiler in filer.get_vfilers():
+                self.failUnless(index.get_vfiler(filer, vfiler.name) is vfiler)
+                pass
+            for aggr in filer.get_aggregates():
+                self.failUnless(index.get_aggregate(filer, aggr.name) is aggr)
+                pass
+            pass
+
+    def test_replication_sets(self):
+        index = self.project.get_name_index()
+        self.failIfEqual(len(self.project.get_snapvaultsets()), 0)
+        for setobj in self.project.get_snapvaultsets():
+            self.failUnless(index.snapvaultsets[setobj.name] is setobj)
+            pass
+        for setobj in self.project.get_snapmirrorsets():
+            self.failUnless(index.snapmirrorsets[setobj.name] is setobj)
+            pass
+
+    def test_add_child(self):
+        """
+        Aggregates added after the index is built can be found
+        """
+        filer = self.project.get_filers()[0]
+        self.failUnlessRaises(KeyError, self.project.get_name_index().get_aggregate, filer, 'aggrnew')
+
+        node = etree.fromstring('<aggregate name="aggrnew"/>')
+        aggr = Aggregate()
+        aggr.configure_from_node(node, self.defaults, filer)
+        filer.add_child(aggr)
+        self.failUnless(self.project.get_name_index().get_aggregate(filer, 'aggrnew') is aggr)
+        self.failUnless(self.project.find_target_aggr(filer, 'aggrnew', self.defaults) is aggr)
@@ -0,0 +1,203 @@
+#
+# $Id$
+#
+"""
+Test dynamic naming and the cached namespaces it uses
+"""
+import os.path
+
+from lxml import etree
+
+from twisted.trial import unittest, runner, reporter
+from twisted.python.util import sibpath
+
+from ConfigParser import RawConfigParser
+
+from docgen.project import Project
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+
+TESTCONF = sibpath(__file__, "docgen_test.conf")
+TEST_LOCATION = os.path.dirname(TESTCONF)
+
+# The names given to everything in some example definitions
+EXPECTED_NAMES = sibpath(__file__, os.path.join("xml", "expected-names.txt"))
+
+def load_expected_names():
+    """
+    @returns: a dictionary of lists of names, keyed by definition
+    filename, relative to the test directory
+    """
+    expected = {}
+    for line in open(EXPECTED_NAMES):
+        if not line.startswith(' '):
+            names = expected[line.strip()] = []
+        else:
+            names.append(line.strip())
+            pass
+        pass
+    return expected
+
+def get_names(obj, names):
+    """
+    List the names of everything below an object, in order.
+    """
+    for tag in sorted(obj.children.keys()):
+        children = obj.children[tag]
+        if type(children) is not list:
+            continue
+        for child in children:
+            if getattr(child, 'parent', None) is not obj:
+                continue
+            name = getattr(child, 'name', None)
+            if isinstance(name, basestring):
+                names.append('%s %s' % (child.__class__.__name__, name))
+                pass
+            get_names(child, names)
+            pass
+        pass
+    return names
+
+def get_objects(obj, objects):
+    """
+    List everything below an object that has a namespace.
+    """
+    for children in obj.children.values():
+        if type(children) is not list:
+            continue
+        for child in children:
+            if getattr(child, 'parent', None) is not obj or not hasattr(child, 'get_namespace'):
+                continue
+            objects.append(child)
+            get_objects(child, objects)
+            pass
+        pass
+    return objects
+
+class NamingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.defaults = RawConfigParser()
+        self.defaults.read(TESTCONF)
+
+    def load(self, filename):
+        tree = etree.parse(os.path.join(TEST_LOCATION, filename), etree.XMLParser(resolve_entities=True))
+        project = Project()
+        project.configure_from_node(tree.getroot(), self.defaults, None)
+        return project
+
+    def test_names_unchanged(self):
+        """
+        Everything is given the same name as it always has been
+        """
+        for filename, expected in load_expected_names().items():
+            project = self.load(filename)
+            names = get_names(project, [])
+            for lun in project.get_luns():
+                names.append('iGroup %s %s' % (lun.name, lun.igroup.name))
+                pass
+            self.failUnlessEqual(names, expected)
+            pass
+
+    def test_namespace_copies(self):
+        """
+        Adding to a namespace doesn't change anyone else's
+        """
+        project = self.load(os.path.join('xml', 'simple_single_site.xml'))
+        site = project.get_sites()[0]
+        ns = site.populate_namespace()
+        ns['igroup_number'] = 3
+        ns['site_name'] = 'changed'
+        ns = site.populate_namespace()
+        self.failIf('igroup_number' in ns)
+        self.failUnlessEqual(ns['site_name'], site.name)
+        self.failIf('igroup_number' in project.populate_namespace())
+
+        # Names passed in don't override those of the objects
+        ns = site.populate_namespace({ 'site_name': 'other', 'extra': 1 })
+        self.failUnlessEqual(ns['site_name'], site.name)
+        self.failUnlessEqual(ns['extra'], 1)
+
+    def test_namespace_cached(self):
+        project = self.load(os.path.join('xml', 'simple_single_site.xml'))
+        volume = [ x for x in project.get_volumes() if x.type != 'root' ][0]
+        self.failUnless(volume.get_namespace() is volume.get_namespace())
+        ns = volume.populate_namespace()
+        self.failUnlessEqual(ns['volume_name'], volume.name)
+        self.failUnlessEqual(ns['vfiler_name'], volume.parent.parent.name)
+        self.failUnlessEqual(ns['project_name'], project.name)
+
+        # Changing a name above the volume shows up once cleared
+        project.name = 'renamed'
+        self.failIfEqual(volume.populate_namespace()['project_name'], 'renamed')
+        project.clear_namespace()
+        self.failUnlessEqual(volume.populate_namespace()['project_name'], 'renamed')
+
+    def test_namespace_current(self):
+        """
+        Cached namespaces match ones built afresh once set up,
+        even where setting up changes something they are built from
+        """
+        node = etree.fromstring("""
+<project name="testproj" code="01">
+  <site name="testprimary" type="primary">
+    <vlan type="project" number="3003">
+      <network number="10.240.4.0/26" gateway="10.240.4.254"/>
+    </vlan>
+    <filer type="filer" name="filer01">
+      <vfiler>
+        <ipaddress type="primary" ip="10.240.4.1"/>
+        <aggregate name="aggr01" type="root"/>
+        <aggregate name="aggr02">
+          <volume>
+            <setref type="snapvault" name="default_primary"/>
+          </volume>
+        </aggregate>
+      </vfiler>
+    </filer>
+    <filer type="nearstore" name="nearstore01">
+      <vfiler>
+        <ipaddress type="primary" ip="10.240.4.2"/>
+        <aggregate name="aggr01" type="root"/>
+        <aggregate name="aggr02">
+          <volume name="backups">
+            <qtree/>
+          </volume>
+        </aggregate>
+      </vfiler>
+    </filer>
+  </site>
+  <snapvaultset name="default_primary" targetfiler="nearstore01" targetvolume="backups">
+    <snapvaultdef basename="sv_daily">
+      <snapschedule>1@1</snapschedule>
+      <snapvaultschedule>8@2</snapvaultschedule>
+    </snapvaultdef>
+  </snapvaultset>
+</project>
+""")
+        project = Project()
+        project.configure_from_node(node, self.defaults, None)
+        volume = [ x for x in project.get_volumes() if x.name == 'backups' ][0]
+        self.failUnlessEqual(volume.type, 'snapvaultdst')
+        qtree = volume.get_qtrees()[0]
+        self.failUnlessEqual(qtree.populate_namespace()['volume_type'], 'snapvaultdst')
+
+        for obj in get_objects(project, [project]):
+            if getattr(obj, 'namespace', None) is not None:
+                cached = obj.populate_namespace()
+                obj.clear_namespace()
+                self.failUnlessEqual(cached, obj.populate_namespace())
+                pass
+            pass
+
+    def test_release_namespaces(self):
+        """
+        Cached namespaces go along with the definition nodes
+        """
+        project = self.load(os.path.join('xml', 'simple_single_site.xml'))
+        objects = get_objects(project, [project])
+        self.failIfEqual([ x for x in objects if x.namespace is not None ], [])
+        project.release_source_nodes()
+        self.failUnlessEqual([ x for x in objects if x.namespace is not None ], [])
@@ -6,6 +6,8 @@ Test emitting the NetApp commands required to activate
 a variety of project definitions.
 """
 import os.path
+import json
+from hashlib import sha1
 from StringIO import StringIO
 from lxml import etree
 
@@ -426,3 +428,75 @@ class NetAppComponentTest(NetAppTestBase):
                               [
 'vfiler run vftest exportfs -p rw=*,root=* /vol/testfiler01_vftest_fs_01/testfiler01_vftest_fs_01_qtree',
                 ])
+
+class ParallelCommandsTest(NetAppTestBase):
+    """
+    Test building the commands for each filer on worker processes
+    """
+    def emit(self, workers):
+        if not self.defaults.has_section('commands'):
+            self.defaults.add_section('commands')
+            pass
+        self.defaults.set('commands', 'workers', str(workers))
+        outfile = StringIO()
+        self.docgenerator.emit(outfile, ns={})
+        return outfile.getvalue()
+
+    def test_same_commands(self):
+        """
+        The commands come out the same, in the same order
+        """
+        self.load_testfile('clustered_nearstore.xml')
+        self.failUnless(len(self.project.get_filers()) > 1)
+        self.failUnlessEqual(self.docgenerator.get_workers(), 1)
+        expected = self.emit(1)
+        self.failUnlessEqual(self.docgenerator.get_workers(), 1)
+        self.failUnlessEqual(self.emit(3), expected)
+        self.failUnlessEqual(self.docgenerator.get_workers(), 3)
+
+    def test_single_filer(self):
+        self.load_testfile('simple_single_site.xml')
+        self.failUnlessEqual(self.emit(2), self.emit(1))
+
+class ShardedCommandsTest(NetAppTestBase):
+    """
+    Test writing the commands for each filer to a file of its own
+    """
+    def setUp(self):
+        NetAppTestBase.setUp(self)
+        self.load_testfile('clustered_nearstore.xml')
+        self.directory = os.path.abspath(self.mktemp())
+
+    def test_per_filer(self):
+        written = self.docgenerator.emit_shards(self.directory, 'filer', ns={})
+        self.failUnlessEqual(len(written), len(self.project.get_filers()) + 1)
+
+        manifest = json.load(open(os.path.join(self.directory, 'manifest.json')))
+        self.failUnlessEqual(manifest['per'], 'filer')
+        files = dict([ (x['file'], x) for x in manifest['files'] ])
+
+        # The nearstore initialises SnapVaults from the primary
+        # filer, so the primary's volumes have to be created first
+        self.failUnlessEqual(files['sitea-fasnst-01.txt']['depends'], [ 'sitea-fashda-01.txt' ])
+        self.failUnlessEqual(files['sitea-fasnst-01.txt']['stage'], 2)
+        self.failUnlessEqual(files['sitea-fashda-01.txt']['stage'], 1)
+        stages = [ x['stage'] for x in manifest['files'] ]
+        self.failUnlessEqual(stages, sorted(stages))
+
+        # Put back together, the files are the usual output
+        contents = []
+        for filer in self.project.get_filers():
+            content = open(os.path.join(self.directory, '%s.txt' % filer.name)).read()
+            self.failUnlessEqual(sha1(content).hexdigest(), files['%s.txt' % filer.name]['sha1'])
+            contents.append(content)
+            pass
+        self.docgenerator.emit(self.outfile, ns={})
+        self.failUnlessEqual(''.join(contents), self.outfile.getvalue())
+
+    def test_per_vfiler(self):
+        shards = self.docgenerator.build_shards({'iscsi_prefix': 'iqn'}, 'vfiler')
+        self.failUnlessEqual(sorted([ x.filename for x in shards ]),
+                             sorted([ '%s-%s.txt' % (x.name, y.name) for x in self.project.get_filers() for y in x.get_vfilers() ]))
+
+    def test_bad_mode(self):
+        self.failUnlessRaises(ValueError, self.docgenerator.build_shards, {}, 'site')
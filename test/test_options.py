@@ -0,0 +1,56 @@
+#
+# $Id$
+#
+"""
+Test command line options
+"""
+from twisted.trial import unittest, runner, reporter
+from twisted.internet import reactor
+
+from docgen.options import BaseOptions
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+
+AVAILABLE = [ 'netapp-commands', 'ipsan-storage-design' ]
+
+class DocumentOptionsTest(unittest.TestCase):
+    """
+    Test choosing which documents to create
+    """
+    def parse(self, argv):
+        optparser = BaseOptions()
+        optparser.parseOptions(argv + ['dummyfile.xml', '--debug=%s' % logging._levelNames[log.level].lower()])
+        return optparser
+
+    def test_default(self):
+        optparser = self.parse([])
+        self.failUnlessEqual(optparser.options.doctype, 'ipsan-storage-design')
+        self.failUnlessEqual(optparser.get_documents(AVAILABLE), [ ('ipsan-storage-design', None) ])
+
+    def test_single_outfile(self):
+        """
+        A single doctype uses the --outfile
+        """
+        optparser = self.parse(['-d', 'netapp-commands', '-o', 'out.txt'])
+        self.failUnlessEqual(optparser.options.doctype, 'netapp-commands')
+        self.failUnlessEqual(optparser.get_documents(AVAILABLE), [ ('netapp-commands', 'out.txt') ])
+
+    def test_multiple(self):
+        optparser = self.parse(['-d', 'netapp-commands:cmds.txt', '-d', 'ipsan-storage-design:design.xml'])
+        self.failUnlessEqual(optparser.options.doctype, 'netapp-commands')
+        self.failUnlessEqual(optparser.get_documents(AVAILABLE), [ ('netapp-commands', 'cmds.txt'),
+                                                                   ('ipsan-storage-design', 'design.xml') ])
+
+    def test_all(self):
+        optparser = self.parse(['-d', 'all', '-o', 'project'])
+        self.failUnlessEqual(optparser.get_documents(AVAILABLE), [ ('ipsan-storage-design', 'project.ipsan-storage-design'),
+                                                                   ('netapp-commands', 'project.netapp-commands') ])
+        optparser = self.parse(['-d', 'all:other'])
+        self.failUnlessEqual(optparser.get_documents(AVAILABLE), [ ('ipsan-storage-design', 'other.ipsan-storage-design'),
+                                                                   ('netapp-commands', 'other.netapp-commands') ])
+
+    def test_unknown_doctype(self):
+        optparser = self.parse(['-d', 'nosuchdoc'])
+        self.failUnlessRaises(SystemExit, optparser.get_documents, AVAILABLE)
@@ -99,3 +99,30 @@ class ProjectTest(unittest.TestCase):
         site = project.get_sites()[0]
         hosts = project.get_sites()[0].get_hosts()
         self.failUnlessEqual( len(hosts), 3)
+
+    def test_compact_model(self):
+        """
+        Releasing the definition nodes doesn't change the mountoptions
+        """
+        xmlfile = os.path.join(XML_FILE_LOCATION, "clustered_nearstore.xml")
+        tree = etree.parse(xmlfile)
+        project = Project()
+        project.configure_from_node(tree.getroot(), self.defaults, None)
+
+        compact_defaults = RawConfigParser()
+        compact_defaults.read(TESTCONF)
+        compact_defaults.set('global', 'compact_model', 'yes')
+        compact = Project()
+        compact.configure_from_node(tree.getroot(), compact_defaults, None)
+
+        for vol, compact_vol in zip(project.get_volumes(), compact.get_volumes()):
+            self.failUnlessEqual(compact_vol.volnode, None)
+            for qtree, compact_qtree in zip(vol.get_qtrees(), compact_vol.get_qtrees()):
+                self.failUnlessEqual(compact_qtree.qtreenode, None)
+                for host, compact_host in zip(project.get_hosts(), compact.get_hosts()):
+                    self.failUnlessEqual(project.get_host_qtree_mountoptions(host, qtree),
+                                         compact.get_host_qtree_mountoptions(compact_host, compact_qtree))
+                    pass
+                pass
+            pass
+
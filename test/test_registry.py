@@ -0,0 +1,97 @@
+#
+# $Id$
+#
+"""
+Test the tag to factory registry
+"""
+import os.path
+
+from lxml import etree
+
+from twisted.trial import unittest, runner, reporter
+from twisted.internet import reactor
+from twisted.python.util import sibpath
+
+from ConfigParser import RawConfigParser
+
+from docgen.options import BaseOptions
+from docgen.project import Project
+from docgen.registry import FactoryRegistry, registry
+from docgen import volume
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+log.setLevel(logging.DEBUG)
+
+XML_FILE_LOCATION = sibpath(__file__, "xml")
+TESTCONF = sibpath(__file__, "docgen_test.conf")
+
+class RegistryTest(unittest.TestCase):
+    """
+    Test the FactoryRegistry lookups
+    """
+    def setUp(self):
+        optparser = BaseOptions()
+        optparser.parseOptions(['dummyfile.xml', '--debug=%s' % logging._levelNames[log.level].lower()])
+
+        self.defaults = RawConfigParser()
+        configfiles = self.defaults.read(TESTCONF)
+
+    def test_core_lookup(self):
+        """
+        Core module tags resolve to their create function
+        """
+        reg = FactoryRegistry()
+        self.failUnlessEqual(reg.lookup('volume'), volume.create_volume_from_node)
+        self.failUnlessEqual(reg.misses, 1)
+        self.failUnlessEqual(reg.hits, 0)
+
+    def test_resolve_once(self):
+        """
+        Repeated lookups of the same tag are answered from the table
+        """
+        reg = FactoryRegistry()
+        for i in range(10):
+            reg.lookup('volume')
+            reg.lookup('qtree')
+            pass
+        self.failUnlessEqual(reg.misses, 2)
+        self.failUnlessEqual(reg.hits, 18)
+        self.failUnlessEqual(reg.get_stats()['max_resolutions'], 1)
+
+    def test_unknown_tag(self):
+        reg = FactoryRegistry()
+        self.failUnlessRaises(ImportError, reg.lookup, 'nosuchtag')
+
+    def test_register_override(self):
+        """
+        A registered factory is used in place of the core one
+        """
+        created = []
+        def create_volume_from_node(node, defaults, parent):
+            vol = volume.create_volume_from_node(node, defaults, parent)
+            created.append(vol)
+            return vol
+
+        registry.register('volume', create_volume_from_node)
+        try:
+            xmlfile = os.path.join(XML_FILE_LOCATION, 'simple_single_site.xml')
+            tree = etree.parse(xmlfile)
+            project = Project()
+            project.configure_from_node(tree.getroot(), self.defaults, None)
+        finally:
+            registry.unregister('volume')
+
+        self.failIfEqual(len(created), 0)
+
+    def test_project_resolves_each_tag_once(self):
+        """
+        Loading a whole project never resolves the same tag twice
+        """
+        registry.reset_counters()
+        xmlfile = os.path.join(XML_FILE_LOCATION, 'simple_single_site.xml')
+        tree = etree.parse(xmlfile)
+        project = Project()
+        project.configure_from_node(tree.getroot(), self.defaults, None)
+        self.failUnless(registry.get_stats()['max_resolutions'] <= 1)
@@ -0,0 +1,180 @@
+#
+# $Id$
+#
+"""
+Test the resident document server
+"""
+import os.path
+import re
+import threading
+import httplib
+from StringIO import StringIO
+from ConfigParser import RawConfigParser
+
+from twisted.trial import unittest, runner, reporter
+from twisted.internet import reactor
+from twisted.python.util import sibpath
+
+from lxml import etree
+
+from docgen.options import BaseOptions
+from docgen.project import Project
+from docgen.docplugins.netapp_commands import NetAppCommandsGenerator
+from docgen.server import DocumentService, RequestLimiter, DocumentServer, RequestError, ServerBusy
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+log.setLevel(logging.DEBUG)
+
+XML_FILE_LOCATION = sibpath(__file__, "xml")
+TESTCONF = sibpath(__file__, "docgen_test.conf")
+
+def normalise(document):
+    """
+    Some document lines include object addresses, and some
+    things are sorted by them, so take those differences out.
+    """
+    document = re.sub(' object at 0x[0-9a-f]+', '', document)
+    return sorted(document.split('\n'))
+
+class DocumentServiceTest(unittest.TestCase):
+    """
+    Test creating documents from projects kept in memory
+    """
+    def setUp(self):
+        optparser = BaseOptions()
+        optparser.parseOptions(['dummyfile.xml', '--debug=%s' % logging._levelNames[log.level].lower()])
+
+        self.defaults = RawConfigParser()
+        self.configfiles = self.defaults.read(TESTCONF)
+        self.service = DocumentService(self.defaults, self.configfiles, use_cache=False,
+                                       definition_root=XML_FILE_LOCATION)
+        self.definition = os.path.join(XML_FILE_LOCATION, 'clustered_nearstore.xml')
+
+    def expected(self):
+        tree = etree.parse(self.definition)
+        project = Project()
+        project.configure_from_node(tree.getroot(), self.defaults, None)
+        outf = StringIO()
+        NetAppCommandsGenerator(project, self.defaults).emit(outf, ns={})
+        return normalise(outf.getvalue())
+
+    def test_same_document(self):
+        """
+        Documents from the server match ones from a fresh project
+        """
+        expected = self.expected()
+        self.failUnlessEqual(normalise(self.service.create_document('netapp-commands', definitionfile=self.definition)), expected)
+        self.failUnlessEqual(normalise(self.service.create_document('netapp-commands', definitionfile=self.definition)), expected)
+        self.failUnlessEqual(self.service.misses, 1)
+        self.failUnlessEqual(self.service.hits, 1)
+
+        content = open(self.definition).read()
+        self.failUnlessEqual(normalise(self.service.create_document('netapp-commands', content=content)), expected)
+
+    def test_project_limit(self):
+        self.service.max_projects = 1
+        self.service.create_document('netapp-commands', definitionfile=self.definition)
+        self.service.create_document('netapp-commands', definitionfile=os.path.join(XML_FILE_LOCATION, 'simple_single_site.xml'))
+        self.failUnlessEqual(len(self.service.projects), 1)
+        self.service.create_document('netapp-commands', definitionfile=self.definition)
+        self.failUnlessEqual(self.service.misses, 3)
+
+    def test_bad_requests(self):
+        self.failUnlessRaises(RequestError, self.service.create_document, 'nosuchdoc', definitionfile=self.definition)
+        self.failUnlessRaises(RequestError, self.service.create_document, 'netapp-commands')
+        self.failUnlessRaises(RequestError, self.service.create_document, 'netapp-commands', definitionfile='/no/such/file.xml')
+        self.failUnlessRaises(RequestError, self.service.create_document, 'netapp-commands', content='<project')
+
+    def test_definition_root(self):
+        """
+        Definition files are only read from under the definition root
+        """
+        self.service.create_document('netapp-commands', definitionfile='clustered_nearstore.xml')
+        self.failUnlessRaises(RequestError, self.service.create_document, 'netapp-commands',
+                              definitionfile=os.path.join(XML_FILE_LOCATION, '..', 'docgen_test.conf'))
+        self.failUnlessRaises(RequestError, self.service.create_document, 'netapp-commands', definitionfile='/etc/passwd')
+
+        service = DocumentService(self.defaults, self.configfiles, use_cache=False)
+        self.failUnlessRaises(RequestError, service.create_document, 'netapp-commands', definitionfile=self.definition)
+
+    def test_external_entities(self):
+        """
+        Definitions sent with a request can't refer to external entities
+        """
+        content = open(self.definition).read()
+        doctype = '<!DOCTYPE project SYSTEM "http://docgen.eigenmagic.com/docgen.dtd">'
+        for entity in [ '<!ENTITY secret SYSTEM "file:///etc/passwd">',
+                        '<!ENTITY % secret SYSTEM "http://localhost/secret">' ]:
+            self.failUnlessRaises(RequestError, self.service.create_document, 'netapp-commands',
+                                  content=content.replace(doctype, '<!DOCTYPE project [%s]>' % entity))
+            pass
+        self.failUnlessEqual(self.service.projects, {})
+
+    def test_http(self):
+        server = DocumentServer(('127.0.0.1', 0), self.service, RequestLimiter())
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            conn = httplib.HTTPConnection('127.0.0.1', server.server_address[1])
+            conn.request('POST', '/document?doctype=netapp-commands', open(self.definition).read())
+            response = conn.getresponse()
+            self.failUnlessEqual(response.status, 200)
+            self.failUnlessEqual(normalise(response.read()), self.expected())
+
+            conn = httplib.HTTPConnection('127.0.0.1', server.server_address[1])
+            conn.request('GET', '/document?doctype=nosuchdoc&definition=%s' % self.definition)
+            self.failUnlessEqual(conn.getresponse().status, 400)
+
+            # Bad lengths are turned away before the body is read
+            conn = httplib.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+            conn.putrequest('POST', '/document?doctype=netapp-commands')
+            conn.putheader('Content-Length', '-1')
+            conn.endheaders()
+            self.failUnlessEqual(conn.getresponse().status, 400)
+
+            self.service.max_definition_size = 1024
+            conn = httplib.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+            conn.putrequest('POST', '/document?doctype=netapp-commands')
+            conn.putheader('Content-Length', str(1024 * 1024))
+            conn.endheaders()
+            self.failUnlessEqual(conn.getresponse().status, 413)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+class RequestLimiterTest(unittest.TestCase):
+
+    def test_busy(self):
+        limiter = RequestLimiter(max_active=1, max_waiting=0)
+        limiter.acquire()
+        self.failUnlessRaises(ServerBusy, limiter.acquire)
+        self.failUnlessEqual(limiter.rejected, 1)
+        limiter.release()
+        limiter.acquire()
+        limiter.release()
+
+    def test_waiting(self):
+        """
+        A waiting request gets its turn when an active one finishes
+        """
+        limiter = RequestLimiter(max_active=1, max_waiting=1)
+        limiter.acquire()
+        done = []
+        def waiter():
+            limiter.acquire()
+            done.append(True)
+            limiter.release()
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        while limiter.waiting == 0:
+            thread.join(0.01)
+            pass
+        self.failUnlessRaises(ServerBusy, limiter.acquire)
+        self.failUnlessEqual(done, [])
+        limiter.release()
+        thread.join()
+        self.failUnlessEqual(done, [True])
+        self.failUnlessEqual(limiter.active, 0)
@@ -0,0 +1,81 @@
+#
+# $Id$
+#
+"""
+Test precompiled document templates
+"""
+from string import Template
+
+from twisted.trial import unittest, runner, reporter
+from twisted.internet import reactor
+
+from docgen.template import SectionTemplate, Loop, row_template
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+
+class SectionTemplateTest(unittest.TestCase):
+    """
+    Test that templates substitute the same way string.Template does
+    """
+    def check_same(self, text, ns={}, **kws):
+        self.failUnlessEqual(SectionTemplate(text).safe_substitute(ns, **kws),
+                             Template(text).safe_substitute(ns, **kws))
+
+    def test_substitute(self):
+        self.check_same('hello $name, ${greeting}ing', {'name': 'world', 'greeting': 'greet'})
+        self.check_same('$name$name', {'name': 1.5})
+        self.check_same('no names at all')
+        self.check_same('')
+
+    def test_missing(self):
+        self.check_same('$missing and ${missing} stay')
+        self.check_same('$name and $other', {'name': 'x'})
+
+    def test_delimiters(self):
+        self.check_same('costs $$5, or $ 6, or $', {'5': 'no'})
+        self.check_same('$$name', {'name': 'x'})
+        self.check_same('${not valid} $1', {'1': 'x'})
+
+    def test_keywords(self):
+        self.check_same('$a $b', {'a': 'mapping', 'b': 'mapping'}, b='keyword')
+        self.check_same('$a', a='keyword')
+
+    def test_values_not_rescanned(self):
+        self.check_same('$a $b', {'a': '$b', 'b': 'x'})
+
+    def test_names(self):
+        self.failUnlessEqual(SectionTemplate('$a ${b} $$c').names(), ['a', 'b'])
+
+    def test_render(self):
+        chunks = []
+        SectionTemplate('<a>$x</a>').render(chunks.append, {'x': 'y'})
+        self.failUnlessEqual(chunks, ['<a>', 'y', '</a>'])
+
+class LoopTest(unittest.TestCase):
+    """
+    Test rendering rows of a table
+    """
+    def test_loop(self):
+        row = row_template([ 'name', 'size' ])
+        rows = Loop(row, [ {'name': 'vol1', 'size': 10}, {'name': 'vol2', 'size': 20} ], '\n')
+        self.failUnlessEqual(len(rows), 2)
+        self.failUnlessEqual(str(rows), '<row><entry><para>vol1</para></entry><entry><para>10</para></entry></row>\n'
+                             '<row><entry><para>vol2</para></entry><entry><para>20</para></entry></row>')
+
+    def test_nested(self):
+        """
+        A Loop is written straight into the template it is used in
+        """
+        row = row_template([ 'name' ], row="<row valign='middle'>%s</row>", entry='<entry>%s</entry>')
+        table = SectionTemplate('<tbody>$rows</tbody>')
+        chunks = []
+        table.render(chunks.append, rows=Loop(row, [ {'name': 'a'}, {'name': 'b'} ]))
+        self.failUnlessEqual(''.join(chunks), "<tbody><row valign='middle'><entry>a</entry></row><row valign='middle'><entry>b</entry></row></tbody>")
+        self.failUnless('a' in chunks)
+
+    def test_empty(self):
+        rows = Loop(row_template([ 'name' ]), [])
+        self.failUnlessEqual(len(rows), 0)
+        self.failUnlessEqual(SectionTemplate('[$rows]').safe_substitute(rows=rows), '[]')
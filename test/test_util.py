@@ -0,0 +1,79 @@
+#
+# $Id$
+#
+"""
+Test plugin loading and import profiling
+"""
+import sys
+from StringIO import StringIO
+from ConfigParser import RawConfigParser
+
+from twisted.trial import unittest, runner, reporter
+from twisted.internet import reactor
+
+from docgen.util import load_doc_plugins
+from docgen.importprofile import ImportProfiler
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+
+config_file_data = """
+[document_plugins]
+activation-advice: docgen.docplugins.activation_advice.IPSANActivationAdvice
+missing: docgen.docplugins.nosuchmodule.NoSuchGenerator
+"""
+
+PLUGIN_MODULE = 'docgen.docplugins.activation_advice'
+
+class LazyPluginsTest(unittest.TestCase):
+    """
+    Test that plugins are only imported when they are used
+    """
+    def setUp(self):
+        self.defaults = RawConfigParser()
+        self.defaults.readfp(StringIO(config_file_data))
+        if PLUGIN_MODULE in sys.modules:
+            del sys.modules[PLUGIN_MODULE]
+            pass
+
+    def test_lazy(self):
+        plugins = load_doc_plugins(self.defaults)
+        self.failUnlessEqual(sorted(plugins.keys()), [ 'activation-advice', 'missing' ])
+        self.failUnless('missing' in plugins)
+        self.failIf(PLUGIN_MODULE in sys.modules)
+
+        cls = plugins['activation-advice']
+        self.failUnless(PLUGIN_MODULE in sys.modules)
+        self.failUnlessEqual(cls.__name__, 'IPSANActivationAdvice')
+        self.failUnless(plugins['activation-advice'] is cls)
+
+    def test_missing_plugin(self):
+        """
+        A plugin that can't be imported only fails when it is used
+        """
+        plugins = load_doc_plugins(self.defaults)
+        self.failUnlessRaises(ImportError, plugins.__getitem__, 'missing')
+        self.failUnlessRaises(KeyError, plugins.__getitem__, 'nosuchdoctype')
+
+class ImportProfilerTest(unittest.TestCase):
+
+    def test_profile(self):
+        if PLUGIN_MODULE in sys.modules:
+            del sys.modules[PLUGIN_MODULE]
+            pass
+        profiler = ImportProfiler()
+        profiler.install()
+        try:
+            __import__(PLUGIN_MODULE)
+            # Already loaded, so not reported again
+            __import__(PLUGIN_MODULE)
+        finally:
+            profiler.uninstall()
+
+        names = [ x[1] for x in profiler.records if x[4] ]
+        self.failUnlessEqual(names.count(PLUGIN_MODULE), 1)
+        self.failUnless(profiler.get_total() > 0)
+        report = profiler.format_report()
+        self.failUnless(report.startswith('import time: self [us] | cumulative | imported package'))
+        self.failUnless(PLUGIN_MODULE in report)
@@ -0,0 +1,95 @@
+#
+# $Id$
+#
+"""
+Test the cached hierarchy views
+"""
+import os.path
+from StringIO import StringIO
+from ConfigParser import RawConfigParser
+
+from twisted.trial import unittest, runner, reporter
+from twisted.internet import reactor
+from twisted.python.util import sibpath
+
+from lxml import etree
+
+from docgen.options import BaseOptions
+from docgen.project import Project
+from docgen.base import get_view_builds, reset_view_builds
+from docgen.docplugins.netapp_commands import NetAppCommandsGenerator
+from docgen.docplugins.ipsan_storage import IPSANStorageDesignGenerator
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+log.setLevel(logging.DEBUG)
+
+XML_FILE_LOCATION = sibpath(__file__, "xml")
+TESTCONF = sibpath(__file__, "docgen_test.conf")
+
+class ViewTest(unittest.TestCase):
+    """
+    Test that views are built once, and kept up to date
+    """
+    def setUp(self):
+        optparser = BaseOptions()
+        optparser.parseOptions(['dummyfile.xml', '--debug=%s' % logging._levelNames[log.level].lower()])
+
+        self.defaults = RawConfigParser()
+        configfiles = self.defaults.read(TESTCONF)
+
+        xmlfile = os.path.join(XML_FILE_LOCATION, "clustered_nearstore.xml")
+        tree = etree.parse(xmlfile)
+        self.project = Project()
+        self.project.configure_from_node(tree.getroot(), self.defaults, None)
+
+    def test_read_only(self):
+        self.failUnlessEqual(type(self.project.get_volumes()), tuple)
+        self.failUnlessEqual(type(self.project.get_filers()[0].get_luns()), tuple)
+
+    def test_built_once(self):
+        self.failUnless(self.project.get_volumes() is self.project.get_volumes())
+
+    def test_add_child(self):
+        """
+        Adding a volume updates the views above it
+        """
+        filer = self.project.get_filers()[0]
+        before = len(self.project.get_volumes())
+        self.project.find_target_aggr(filer, 'aggrnew', self.defaults)
+        aggr = self.project.get_name_index().get_aggregate(filer, 'aggrnew')
+        self.failUnless(aggr in filer.get_aggregates())
+
+        vol = self.project.get_volumes()[0]
+        node = etree.fromstring('<volume name="newvol" usable="10"/>')
+        newvol = vol.__class__()
+        newvol.configure_from_node(node, self.defaults, aggr)
+        aggr.add_child(newvol)
+
+        self.failUnlessEqual(len(self.project.get_volumes()), before + 1)
+        self.failUnless(newvol in filer.get_volumes())
+        self.failUnless(newvol in filer.get_site().get_volumes())
+
+    def test_render_builds(self):
+        """
+        Rendering documents builds each view at most once per object
+        """
+        instances = {
+            'Project': 1,
+            'Site': len(self.project.get_sites()),
+            'Filer': len(self.project.get_filers()),
+            'VFiler': sum([ len(x.get_vfilers()) for x in self.project.get_filers() ]),
+            'Volume': len(self.project.get_volumes()),
+            }
+        reset_view_builds()
+        for generator in [ NetAppCommandsGenerator, IPSANStorageDesignGenerator ]:
+            generator(self.project, self.defaults).emit(StringIO())
+            pass
+
+        builds = get_view_builds()
+        self.failIfEqual(len(builds), 0)
+        for key, count in builds.items():
+            classname = key.split('.')[0]
+            self.failUnless(count <= instances[classname], "%s built %d times" % (key, count))
+            pass
@@ -85,3 +85,68 @@ class VolumeTest(unittest.TestCase):
         node = etree.fromstring(xmldata)
         volnode = node.xpath('*/volume')[0]
         volume.create_volume_from_node(volnode, self.defaults, self.aggr1)
+
+    def test_class_accessors(self):
+        """
+        Convenience accessors are defined on the class, not per volume
+        """
+        xmldata = """
+<volume usable="50">
+  <qtree/>
+</volume>
+"""
+        node = etree.fromstring(xmldata)
+        vol = volume.create_volume_from_node(node, self.defaults, self.aggr1)
+        self.failIf(hasattr(vol, '__dict__'))
+        self.failUnless('get_qtrees' in volume.Volume.__dict__)
+        self.failUnless('get_usable' in volume.Volume.__dict__)
+        self.failUnlessEqual(len(vol.get_qtrees()), 1)
+        self.failUnlessEqual(vol.get_usable(), 50.0)
+        self.failUnlessEqual(vol.get_type(), 'fs')
+
+    def test_unsized_lun_sizes(self):
+        """
+        Unsized LUNs share out what the sized LUNs in their container leave
+        """
+        xmldata = """
+<volume usable="100" proto="iscsi">
+  <lun size="10"/>
+  <lun/>
+  <qtree>
+    <lun size="5"/>
+    <lun/>
+    <lun/>
+  </qtree>
+  <lun/>
+</volume>
+"""
+        node = etree.fromstring(xmldata)
+        vol = volume.create_volume_from_node(node, self.defaults, self.aggr1)
+        usable = vol.get_iscsi_usable()
+
+        # Volume LUNs count every LUN in the volume, qtree LUNs
+        # only those in the qtree.
+        self.failUnlessEqual([ x.size for x in vol.children['lun'] ],
+                             [ 10.0, (usable - 15) / 4.0, (usable - 15) / 4.0 ])
+        self.failUnlessEqual([ x.size for x in vol.get_qtrees()[0].get_luns() ],
+                             [ 5.0, (usable - 5) / 2.0, (usable - 5) / 2.0 ])
+
+    def test_direct_volume(self):
+        """
+        A volume made without a node is the same as one made from a node
+        """
+        node = etree.fromstring('<volume usable="50" snapreserve="0" type="snapvaultdst" protocol="NFS"/>')
+        fromnode = volume.create_volume_from_node(node, self.defaults, self.aggr1)
+        direct = volume.create_volume(self.defaults, self.aggr1, usable=50.0, snapreserve=0,
+                                      type='snapvaultdst', protocol='NFS')
+        for attrib in [ 'type', 'usable', 'raw', 'snapreserve', 'protocol',
+                        'iscsi_usable', 'iscsi_snapspace', 'space_guarantee' ]:
+            self.failUnlessEqual(getattr(direct, attrib), getattr(fromnode, attrib))
+            pass
+        self.failUnlessEqual(direct.get_options(), fromnode.get_options())
+        self.failUnlessEqual(direct.get_qtrees(), [])
+        self.failUnlessEqual(fromnode.name, "filer1_vftest01_snapvaultdst_01")
+        self.failUnlessEqual(direct.name, "filer1_vftest01_snapvaultdst_02")
+
+    def test_direct_volume_unknown_attribute(self):
+        self.failUnlessRaises(KeyError, volume.create_volume, self.defaults, self.aggr1, colour='blue')
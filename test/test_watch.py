@@ -0,0 +1,143 @@
+#
+# $Id$
+#
+"""
+Test watching a project definition for changes
+"""
+import os
+import os.path
+import time
+import shutil
+import threading
+
+from twisted.trial import unittest, runner, reporter
+from twisted.internet import reactor
+from twisted.python.util import sibpath
+
+from docgen.watch import PollingWatcher, InotifyWatcher, DocumentWatcher
+
+from docgen import debug
+import logging
+log = logging.getLogger('docgen')
+
+XML_FILE_LOCATION = sibpath(__file__, "xml")
+TESTCONF = sibpath(__file__, "docgen_test.conf")
+
+ENTITY_DEFINITION = """<?xml version="1.0"?>
+<!DOCTYPE project [
+<!ENTITY hosts SYSTEM "hosts.xml">
+]>
+<project name="watchtest" code="01">
+  <site name="sitea" type="primary" location="somewhere">
+    &hosts;
+  </site>
+</project>
+"""
+
+def write_file(filename, content):
+    f = open(filename, 'w')
+    f.write(content)
+    f.close()
+
+class WatcherTest(unittest.TestCase):
+    """
+    Test finding out about changed files
+    """
+    def setUp(self):
+        self.workdir = os.path.abspath(self.mktemp())
+        os.makedirs(self.workdir)
+        self.filename = os.path.join(self.workdir, 'watched.txt')
+        write_file(self.filename, 'one')
+
+    def check_watcher(self, watcher):
+        try:
+            self.failUnlessEqual(watcher.wait(0.1), set())
+
+            # Replaced by renaming, the way many editors save
+            tmpname = os.path.join(self.workdir, 'watched.txt.new')
+            write_file(tmpname, 'two, and longer')
+            os.rename(tmpname, self.filename)
+            self.failUnlessEqual(watcher.wait(2), set([self.filename]))
+
+            # Other files in the same directory don't count
+            write_file(os.path.join(self.workdir, 'other.txt'), 'other')
+            while len(watcher.wait(0.1)) > 0:
+                pass
+            self.failUnlessEqual(watcher.wait(0.2), set())
+        finally:
+            watcher.close()
+
+    def test_polling(self):
+        self.check_watcher(PollingWatcher([self.filename], interval=0.02))
+
+    def test_inotify(self):
+        try:
+            watcher = InotifyWatcher([self.filename])
+        except OSError, e:
+            raise unittest.SkipTest("inotify not available: %s" % e)
+        self.check_watcher(watcher)
+
+class DocumentWatcherTest(unittest.TestCase):
+    """
+    Test regenerating documents when a definition changes
+    """
+    def setUp(self):
+        self.workdir = os.path.abspath(self.mktemp())
+        os.makedirs(self.workdir)
+        self.definition = os.path.join(self.workdir, 'project.xml')
+        write_file(self.definition, ENTITY_DEFINITION)
+        self.hostsfile = os.path.join(self.workdir, 'hosts.xml')
+        write_file(self.hostsfile, '<host name="hosta" platform="intel" operatingsystem="Linux"/>\n')
+
+        self.outfile = os.path.join(self.workdir, 'project.txt')
+        self.watcher = DocumentWatcher(self.definition, TESTCONF, ['netapp-commands'], [self.outfile],
+                                       use_cache=False, debounce=0.05)
+
+    def test_watched_files(self):
+        self.failUnlessEqual(self.watcher.get_watched_files(), [ self.definition, TESTCONF, self.hostsfile ])
+
+    def test_workers(self):
+        """
+        The number of workers given overrides the configuration file
+        each time it is read
+        """
+        defaults, parsedfiles = self.watcher.load_defaults()
+        self.failUnlessEqual(parsedfiles, [ TESTCONF ])
+        watcher = DocumentWatcher(self.definition, TESTCONF, ['netapp-commands'], [self.outfile],
+                                  use_cache=False, workers=3)
+        defaults, parsedfiles = watcher.load_defaults()
+        self.failUnlessEqual(defaults.getint('commands', 'workers'), 3)
+
+    def run_with_change(self, change):
+        """
+        Run the watcher until it has seen one change.
+        """
+        thread = threading.Thread(target=self.watcher.run, kwargs={'changes': 1})
+        thread.start()
+        while self.watcher.watcher is None:
+            time.sleep(0.01)
+            pass
+        change()
+        thread.join(10)
+        self.failIf(thread.isAlive())
+
+    def test_regenerate(self):
+        """
+        Changing the definition writes the documents again
+        """
+        def change():
+            write_file(self.definition, ENTITY_DEFINITION.replace('watchtest', 'changed'))
+        self.run_with_change(change)
+
+        self.failUnless(os.path.exists(self.outfile))
+        self.failUnlessEqual(len(self.watcher.latencies), 1)
+        self.failUnless(self.watcher.latencies[0] < 10)
+
+    def test_unchanged_contents(self):
+        """
+        Saving the same contents again doesn't regenerate anything
+        """
+        def change():
+            write_file(self.hostsfile, open(self.hostsfile).read())
+        self.run_with_change(change)
+        self.failUnlessEqual(self.watcher.latencies, [])